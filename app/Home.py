@@ -1,6 +1,7 @@
 import streamlit as st
-import pandas as pd
 from sqlite.SQLiteSingleton import SQLiteSingleton
+from utils.data_cache import get_hotels, get_hotel_stats
+from utils.export_stream import available_formats, export_reviews
 
 st.set_page_config(page_title="🏠 Accueil", layout="centered")
 st.title("🏨 Tableau de bord Booking.com")
@@ -21,6 +22,7 @@ uploaded_file = st.file_uploader(
 )
 
 if uploaded_file is not None:
+    import pandas as pd  # chargé uniquement lors d'un import CSV
     try:
         df_csv = pd.read_csv(uploaded_file)
         required_cols = {"name", "town", "id"}
@@ -43,7 +45,9 @@ if uploaded_file is not None:
 # --------------------
 # Statistiques
 # --------------------
-hotels_count = db.get_hotel_count()
+# Servies depuis le cache tant qu'aucune écriture n'est journalisée (data_events)
+df_hotels = get_hotels(db)
+hotels_count = len(df_hotels)
 st.subheader("📊 Statistiques")
 st.write(f"- Nombre d'hôtels dans la base : **{hotels_count}**")
 
@@ -51,7 +55,30 @@ st.write(f"- Nombre d'hôtels dans la base : **{hotels_count}**")
 # Affichage des hôtels
 # --------------------
 if hotels_count > 0:
-    df_hotels = db.get_all_hotels()
-    st.dataframe(df_hotels)
+    df_stats = get_hotel_stats(db)
+    if db.materialized_version() < db.data_version():
+        st.caption("⏳ Statistiques en cours de mise à jour, rechargez la page dans quelques secondes.")
+    st.write(f"- Nombre d'avis : **{int(df_stats['reviews'].fillna(0).sum())}**")
+    st.write(f"- Côtés d'avis tagués : **{int(df_stats['tagged_sides'].fillna(0).sum())}**")
+    st.dataframe(df_hotels.join(df_stats[["reviews", "avg_score", "last_review_date", "tagged_sides"]]))
 else:
     st.info("Aucun hôtel stocké dans la base pour le moment.")
+
+# --------------------
+# Export des avis
+# --------------------
+if hotels_count > 0:
+    st.subheader("📦 Exporter les avis")
+    hotel_labels = {f"{idx} - {row['name']} - {row['town']}": (idx, row["name"]) for idx, row in df_hotels.iterrows()}
+    export_selection = st.multiselect("Hôtels à exporter (vide = tous)", options=list(hotel_labels))
+    export_format = st.selectbox("Format", available_formats())
+    if st.button("📦 Préparer l'export"):
+        hotels = [hotel_labels[label] for label in export_selection] or list(hotel_labels.values())
+        bar = st.progress(0)
+        try:
+            path = export_reviews(db, hotels, export_format, progress=lambda done, total: bar.progress(done / total))
+            with open(path, "rb") as f:
+                st.download_button("📥 Télécharger le ZIP", f, f"avis_{export_format}.zip", mime="application/zip")
+        except ImportError as e:
+            st.error(str(e))
+        bar.empty()
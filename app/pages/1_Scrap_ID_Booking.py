@@ -1,15 +1,8 @@
 import streamlit as st
-import time
-import random
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.firefox.options import Options
-from webdriver_manager.firefox import GeckoDriverManager 
-import platform
+from utils.booking_search import setup_driver, get_hotel_url, get_hotel_id, resolve_hotel_task
+from utils.sharded_scrap import run_sharded
+from utils.hotel_match import match_key, plan_resolution
 
 
 st.set_page_config(page_title="1. Scrap ID Booking", layout="centered")
@@ -20,16 +13,6 @@ st.write("Cette page permet d'extraire automatiquement les URLs des hôtels depu
 # Fonctions utilitaires
 # ==============================
 
-ENDPOINT = "https://www.booking.com/searchresults.fr.html?ss="
-
-def wait():
-    """Pause aléatoire pour éviter d'être détecté comme bot"""
-    time.sleep(random.uniform(1, 3))
-
-def build_query(hotel_name, town):
-    query = ENDPOINT + '+'.join(town.split()) + '+' + '+'.join(hotel_name.split())
-    return query.lower()
-
 def read_file(uploaded_file):
     """Lecture d'un fichier CSV en DataFrame"""
     try:
@@ -39,116 +22,95 @@ def read_file(uploaded_file):
         st.error(f"Erreur de lecture du fichier : {e}")
         return None
 
-def setup_driver():
-    options = Options()
-    options.add_argument("--headless")  # Optionnel : exécuter sans fenêtre
-    options.set_preference("dom.webdriver.enabled", False)
-    options.set_preference("useAutomationExtension", False)
-
-    system = platform.system()
-    machine = platform.machine()
-
-    if system == "Linux" and "arm" in machine.lower():
-        # Probablement Raspberry Pi
-        driver_path = "/usr/bin/geckodriver"  # Assurez-vous qu'il est installé via apt
-        service = Service(driver_path)
-    else:
-        # PC classique : utiliser GeckoDriverManager
-        service = Service(GeckoDriverManager().install())
-
-    driver = webdriver.Firefox(service=service, options=options)
-    return driver
-
-def get_hotel_url(driver, hotel, town):
-    """Retourne l'URL du premier hôtel trouvé"""
-    query = build_query(hotel, town)
-    driver.get(query)
-    wait()
-
-    try:
-        a_tag = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='hotel']"))
-        )
-        href = a_tag.get_attribute("href")
-        return href.split("?")[0]
-    except Exception:
-        return ""
-
-def get_hotel_id(url, timeout=10):
-    """Retourne l'id booking depuis l'URL de l'hôtel"""
-    # Open the page
-    driver.get(url)
-    
-    # Wait a random time to mimic human reading
-    wait()
-    
-    try:
-        # Wait for the input element with name="hotel_id" to appear
-        hotel_input = WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.NAME, "hotel_id"))
-        )
-        # Scroll into view (mimic human behavior)
-        driver.execute_script("arguments[0].scrollIntoView(true);", hotel_input)
-        time.sleep(random.uniform(0.5, 1.5))
-        
-        # Get the value attribute
-        hotel_id = hotel_input.get_attribute("value")
-        hotel_id = int(hotel_id)
-    except Exception as e:
-        print(f"Hotel ID input not found. Error: {e}")
-        hotel_id = None
-
-    return hotel_id
-
-
 # ==============================
 # Interface Streamlit
 # ==============================
 from sqlite.SQLiteSingleton import SQLiteSingleton
+from utils.data_cache import get_hotels, get_hotel_facets
 from utils.filter_hotel_to_select import filter_hotel_to_select
 
 db = SQLiteSingleton()
 
 # Get all hotels from DB
-df_hotels = db.get_all_hotels()  # id as index
+df_hotels = get_hotels(db)  # id as index
 if df_hotels.empty:
     st.info("Aucun hôtel disponible dans la base.")
 else:
     # Call the custom Streamlit module for filtering
     selected_hotels = filter_hotel_to_select(
-        df_hotels,
+        df_hotels, facets=get_hotel_facets(db),
     )
 
     if selected_hotels is not None and not selected_hotels.empty:
         st.write(f"✅ {len(selected_hotels)} hôtels sélectionnés pour le scraping.")
 
-        if st.button("🚀 Lancer le scraping des hôtels sélectionnés"):
-            with st.spinner("Initialisation du navigateur..."):
-                driver = setup_driver()
-
-            results = []
-            total = len(selected_hotels)
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
-            # Iterate over selected hotels
-            for count, (i, row) in enumerate(selected_hotels.iterrows(), start=1):
-                id_ = i  # still use index for DB
-                name = row["name"] if pd.notna(row["name"]) else ""
-                town = row["town"] if pd.notna(row["town"]) else ""
+        skip_resolved = st.checkbox("Ignorer les hôtels ayant déjà une URL", value=True)
+        to_resolve, from_cache, duplicates = plan_resolution(
+            selected_hotels, db.get_hotel_resolutions(), known_hotels=df_hotels, skip_resolved=skip_resolved
+        )
+        st.write(
+            f"🔎 {len(to_resolve)} à rechercher, ♻️ {len(from_cache)} déjà connus dans le cache de résolution."
+        )
+        skip_duplicates = False
+        if duplicates:
+            st.warning(f"⚠️ {len(duplicates)} doublons probables d'hôtels déjà résolus (même ville, nom très proche).")
+            st.dataframe(pd.DataFrame(
+                duplicates, columns=["id", "name", "town", "hôtel proche", "url", "similarité"]
+            ))
+            skip_duplicates = st.checkbox("Ne pas rechercher les doublons probables", value=False)
+        if skip_duplicates:
+            duplicate_ids = {d[0] for d in duplicates}
+            to_resolve = [item for item in to_resolve if item[0] not in duplicate_ids]
+
+        n_workers = st.number_input(
+            "Nombre de navigateurs en parallèle (1 = séquentiel)", min_value=1, max_value=4, value=1
+        )
 
-                status_text.text(f"🔍 Recherche : {name} ({town})")
+        if st.button("🚀 Lancer le scraping des hôtels sélectionnés"):
+            # Hôtels déjà résolus : aucune requête navigateur
+            for id_, url, booking_id in from_cache:
                 try:
-                    url = get_hotel_url(driver, name, town)
-                    booking_id = get_hotel_id(url)
                     db.insert_or_update_hotel(id=id_, url=url, booking_id=booking_id)
                 except Exception as e:
-                    # Log the error but continue
-                    st.error(f"⚠️ Erreur pour {name} ({town}): {e}")
+                    st.error(f"⚠️ Erreur pour l'hôtel {id_}: {e}")
+
+            total = max(len(to_resolve), 1)
+            progress_bar = st.progress(0)
+            status_text = st.empty()
 
-                progress_bar.progress(count / total)
+            if not to_resolve:
+                progress_bar.progress(1.0)
+            elif n_workers == 1:
+                with st.spinner("Initialisation du navigateur..."):
+                    driver = setup_driver()
+
+                # Iterate over hotels to resolve
+                for count, (id_, name, town) in enumerate(to_resolve, start=1):
+                    status_text.text(f"🔍 Recherche : {name} ({town})")
+                    try:
+                        url = get_hotel_url(driver, name, town)
+                        booking_id = get_hotel_id(driver, url)
+                        db.insert_or_update_hotel(id=id_, url=url, booking_id=booking_id)
+                        db.save_hotel_resolution(match_key(name, town), name, town, url, booking_id)
+                    except Exception as e:
+                        # Log the error but continue
+                        st.error(f"⚠️ Erreur pour {name} ({town}): {e}")
+
+                    progress_bar.progress(count / total)
+
+                driver.quit()
+            else:
+                done = []
+
+                def on_done(item, error):
+                    done.append(item)
+                    status_text.text(f"🔍 {len(done)}/{total} : {item[1]} ({item[2]})")
+                    if error:
+                        st.error(f"⚠️ Erreur pour {item[1]} ({item[2]}): {error}")
+                    progress_bar.progress(len(done) / total)
+
+                run_sharded(to_resolve, resolve_hotel_task, n_workers=int(n_workers), db_file=db.db_file, on_done=on_done)
 
-            driver.quit()
             st.success("✅ Scraping terminé et base mise à jour avec succès !")
     else:
         st.info("Veuillez sélectionner au moins un hôtel à scraper.")
\ No newline at end of file
@@ -1,12 +1,14 @@
 import streamlit as st
-import json
-import requests
-import datetime
-import time
-import random
 from pprint import pprint
 from sqlite import SQLiteSingleton
+from utils.data_cache import get_hotels, get_hotel_facets
 from utils.filter_hotel_to_select import filter_hotel_to_select
+from utils.booking_reviews import load_headers, load_payload, scrap_one_hotel, scrap_hotel_task
+from utils.booking_reviews import replay_hotel
+from utils.sharded_scrap import run_sharded
+from utils.response_cache import ResponseCache
+from utils.rate_limiter import RateLimiter
+from utils.scheduler import DAILY_BUDGET, schedule
 
 st.set_page_config(page_title="2. Scrap Avis Booking", layout="centered")
 st.title("💬 Scraping des avis Booking.com")
@@ -18,130 +20,9 @@ st.write("Récupération des **avis clients Booking.com** à partir des identifi
 db = SQLiteSingleton()
 conn = db.get_connection()
 
-GRAPHQL_ENDPOINT = "https://www.booking.com/dml/graphql?lang=fr"
-MAX_LIMIT = 25
 # Charger payload et headers
-with open("scrap_util/header.json", "r", encoding="utf-8") as f:
-    HEADERS = json.load(f)
-with open("scrap_util/payload.json", "r", encoding="utf-8") as f:
-    PAYLOAD_TEMPLATE = json.load(f)
-
-# ========================================
-# Fonctions utilitaires
-# ========================================
-def wait():
-    time.sleep(random.uniform(1, 3))
-
-def post_graphql(payload, headers):
-    response = requests.post(GRAPHQL_ENDPOINT, headers=headers, json=payload)
-    return response.json()
-
-def extract_review_info(card):
-    info = {}
-    
-    # Basic review info
-    info['review_score'] = card.get('reviewScore')
-    info['reviewed_date'] = datetime.datetime.fromtimestamp(card.get('reviewedDate')).strftime('%Y-%m-%d %H:%M:%S') if card.get('reviewedDate') else None
-    info['is_approved'] = card.get('isApproved')
-    info['helpful_votes'] = card.get('helpfulVotesCount')
-    info['review_url'] = card.get('reviewUrl')
-    
-    # Guest details
-    guest = card.get('guestDetails', {})
-    info['guest_username'] = guest.get('username')
-    info['guest_type'] = guest.get('guestTypeTranslation')
-    info['guest_country'] = guest.get('countryName')
-    info['guest_country_code'] = guest.get('countryCode')
-    info['guest_avatar_url'] = guest.get('avatarUrl')
-    info['guest_anonymous'] = guest.get('anonymous')
-    
-    # Review text
-    text = card.get('textDetails', {})
-    info['review_title'] = text.get('title')
-    info['positive_text'] = text.get('positiveText')
-    info['negative_text'] = text.get('negativeText')
-    info['language'] = text.get('lang')
-    
-    # Booking details
-    booking = card.get('bookingDetails', {})
-    info['stay_status'] = booking.get('stayStatus')
-    info['checkin_date'] = booking.get('checkinDate')
-    info['checkout_date'] = booking.get('checkoutDate')
-    info['num_nights'] = booking.get('numNights')
-    room = booking.get('roomType', {})
-    info['room_name'] = room.get('name')
-    info['room_id'] = room.get('id')
-    
-    return info
-
-
-def scrap_one_hotel(hotel_id, booking_id, payload_template, headers, st_container=None):
-    payload = payload_template.copy()
-    payload['variables']['input']['hotelId'] = int(booking_id)
-
-    # First call
-    response = post_graphql(payload, headers)
-
-    # Extract data
-    data = response.get('data', {}).get('reviewListFrontend', {})
-
-    # Add meta review score of hotel
-    scores = data.get('ratingScores', {})
-    meta = {s['name']: s['value'] for s in scores}
-
-    db.insert_or_update_hotel(
-        id=hotel_id,
-        hotel_staff=meta.get('hotel_staff'),
-        hotel_services=meta.get('hotel_services'),
-        hotel_clean=meta.get('hotel_clean'),
-        hotel_comfort=meta.get('hotel_comfort'),
-        hotel_value=meta.get('hotel_value'),
-        hotel_location=meta.get('hotel_location'),
-        hotel_free_wifi=meta.get('hotel_free_wifi')
-    )
-    
-    cards = data.get('reviewCard', [])
-
-    collected = 0
-    # Insert first batch
-    for card in cards:
-        info = extract_review_info(card)
-        review_url = info.pop('review_url', None)  # remove it from kwargs
-        db.insert_or_update_review(hotel_id, review_url, **info)
-    collected += len(cards)
-
-    progress = None
-    if st_container:
-        progress = st_container.progress(0)
-    
-    total_reviews = data.get('reviewsCount', len(cards))
-    skip = MAX_LIMIT
-
-    while skip < total_reviews:
-        wait()
-        
-        end = min(skip + MAX_LIMIT, total_reviews)
-
-        payload['variables']['input']['skip'] = skip
-
-
-        response = post_graphql(payload, headers)
-        cards = response.get('data', {}).get('reviewListFrontend', {}).get('reviewCard', [])
-        for card in cards:
-            info = extract_review_info(card)
-
-            review_url = info.pop('review_url', None)  # remove it from kwargs
-            db.insert_or_update_review(hotel_id, review_url, **info)
-
-        collected += len(cards)
-        if progress:
-            progress.progress(min(collected / total_reviews, 1.0))
-        
-        skip += end
-
-    if progress:
-        progress.empty()
-
+HEADERS = load_headers()
+PAYLOAD_TEMPLATE = load_payload()
 
 # ========================================
 # Interface Streamlit
@@ -149,35 +30,135 @@ def scrap_one_hotel(hotel_id, booking_id, payload_template, headers, st_containe
 
 
 # Récupérer tous les hôtels depuis SQLite
-df_hotels = db.get_all_hotels()
+df_hotels = get_hotels(db)
 
 if df_hotels.empty:
     st.info("Aucun hôtel disponible dans la base.")
 else:
-    # Appel du module de filtrage personnalisé
-    selected_hotels = filter_hotel_to_select(df_hotels)
+    mode = st.radio(
+        "Sélection des hôtels", ["Manuelle", "Planificateur (hôtels dus aujourd'hui)"], horizontal=True,
+        help="Le planificateur estime le rythme d'arrivée des avis de chaque hôtel et "
+             "répartit le budget de requêtes du jour là où de nouveaux avis sont attendus."
+    )
+    if mode == "Manuelle":
+        # Appel du module de filtrage personnalisé
+        selected_hotels = filter_hotel_to_select(df_hotels, facets=get_hotel_facets(db))
+    else:
+        budget = st.number_input("Budget de requêtes du jour", min_value=1, max_value=100000, value=DAILY_BUDGET)
+        selected_hotels = schedule(db, budget=int(budget))
+        st.caption(f"{db.requests_spent()} requêtes déjà envoyées aujourd'hui.")
+        if not selected_hotels.empty:
+            st.dataframe(
+                selected_hotels[["name", "town", "rate", "days_since", "expected_new", "cost"]].round(2),
+                column_config={
+                    "rate": "Avis / jour", "days_since": "Jours depuis la collecte",
+                    "expected_new": "Nouveaux avis attendus", "cost": "Requêtes estimées",
+                }
+            )
+        else:
+            st.info("Aucun hôtel dû : budget épuisé ou aucun nouvel avis attendu.")
 
     if selected_hotels is not None and not selected_hotels.empty:
         st.write(f"✅ {len(selected_hotels)} hôtels sélectionnés pour le scraping.")
 
+        n_workers = st.number_input(
+            "Nombre de processus (1 = séquentiel)", min_value=1, max_value=8, value=1,
+            help="Les hôtels sont répartis entre les processus ; le débit global de requêtes reste plafonné."
+        )
+        max_rps = st.number_input(
+            "Débit global max (requêtes / seconde)", min_value=0.1, max_value=5.0, value=0.5, step=0.1
+        )
+        page_workers = st.number_input(
+            "Pages récupérées en parallèle par hôtel", min_value=1, max_value=8, value=1,
+            help="Toutes les pages sont planifiées depuis le nombre d'avis annoncé ; "
+                 "le débit reste celui du limiteur, les pages manquantes sont redemandées."
+        )
+        keep_raw = st.checkbox(
+            "Conserver les réponses brutes (cache compressé, rejouable hors-ligne)", value=True
+        )
+        tag_after = st.checkbox(
+            "Taguer les nouveaux avis (topics) à la fin du scraping", value=False,
+            help="Seuls les avis nouveaux ou modifiés sont tagués : les avis français via l'API, "
+                 "les autres langues localement avec le modèle multilingue."
+        )
+
         if st.button("🚀 Lancer le scraping des hôtels sélectionnés"):
             global_bar = st.progress(0)
             status_text = st.empty()
             total_hotels = len(selected_hotels)
 
-            for i, row in enumerate(selected_hotels.itertuples()):
-
-                hotel_id = row.Index
-                booking_id = row.booking_id
-                name = row.name
-                town = row.town
+            raw_cache = ResponseCache() if keep_raw else None
+
+            if n_workers == 1:
+                limiter = RateLimiter(max_rps)
+                for i, row in enumerate(selected_hotels.itertuples()):
+
+                    hotel_id = row.Index
+                    booking_id = row.booking_id
+                    name = row.name
+                    town = row.town
+
+                    try:
+                        status_text.text(f"🔍 Extraction des avis pour **{name} ({town})**...")
+                        collected, expected = scrap_one_hotel(
+                            hotel_id, booking_id, PAYLOAD_TEMPLATE, HEADERS, db, st_container=status_text,
+                            limiter=limiter, raw_cache=raw_cache, page_workers=int(page_workers)
+                        )
+                        if collected < expected:
+                            st.warning(f"{name} : {collected}/{expected} avis récupérés.")
+                    except Exception as e:
+                        st.error(f"Erreur pour {name}: {e}")
+                    global_bar.progress((i + 1) / total_hotels)
+            else:
+                names = {row.Index: row.name for row in selected_hotels.itertuples()}
+                items = [(int(row.Index), row.booking_id) for row in selected_hotels.itertuples()]
+                done = []
+
+                def on_done(item, error):
+                    done.append(item)
+                    status_text.text(f"🔍 {len(done)}/{total_hotels} : {names.get(item[0])}")
+                    if error:
+                        st.error(f"Erreur pour {names.get(item[0])}: {error}")
+                    global_bar.progress(len(done) / total_hotels)
+
+                status_text.text(f"🚀 Lancement de {n_workers} processus...")
+                run_sharded(items, scrap_hotel_task, n_workers=int(n_workers), max_rps=max_rps,
+                            db_file=db.db_file, on_done=on_done, options={"keep_raw": keep_raw, "page_workers": int(page_workers)})
+
+            if raw_cache:
+                raw_cache.evict()
+                raw_cache.close()
+
+            if tag_after:
+                from utils.predict_topics import predict_pending
+
+                processed, api_calls = predict_pending(
+                    db, progress=lambda n, calls: status_text.text(f"🏷️ {n} avis tagués ({calls} appels API)...")
+                )
+                st.info(f"🏷️ {processed} côtés d'avis tagués ({api_calls} appels API).")
 
                 try:
-                    status_text.text(f"🔍 Extraction des avis pour **{name} ({town})**...")
-                    scrap_one_hotel(hotel_id, booking_id, PAYLOAD_TEMPLATE, HEADERS, st_container=status_text)
-                except Exception as e:
-                    st.error(f"Erreur pour {name}: {e}")
-                global_bar.progress((i + 1) / total_hotels)
-
+                    from utils.multilingual_tagger import tag_pending
+
+                    processed, encoded = tag_pending(
+                        db, progress=lambda n, k: status_text.text(f"🌍 {n} avis non français tagués...")
+                    )
+                    st.info(f"🌍 {processed} côtés d'avis non français tagués ({encoded} textes encodés).")
+                except (ImportError, ValueError) as e:
+                    st.warning(f"Tagging multilingue ignoré : {e}")
             status_text.empty()
             st.success("✅ Scraping terminé et avis insérés dans SQLite !")
+
+        # ----------------------------------------
+        # Rejeu hors-ligne depuis le cache brut
+        # ----------------------------------------
+        with st.expander("♻️ Rejouer l'extraction depuis le cache brut (sans réseau)"):
+            st.write("Utile après un ajout de champ dans `extract_review_info` : aucune requête n'est envoyée.")
+            if st.button("♻️ Rejouer pour les hôtels sélectionnés"):
+                raw_cache = ResponseCache()
+                total = 0
+                for row in selected_hotels.itertuples():
+                    if row.booking_id:
+                        total += replay_hotel(row.Index, row.booking_id, raw_cache, db)
+                raw_cache.close()
+                st.success(f"✅ {total} avis ré-extraits depuis le cache.")
\ No newline at end of file
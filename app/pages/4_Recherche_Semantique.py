@@ -0,0 +1,76 @@
+import streamlit as st
+import datetime
+from sqlite.SQLiteSingleton import SQLiteSingleton
+from utils.data_cache import get_hotels
+from utils.ann_index import IVFIndex
+
+st.set_page_config(page_title="4. Recherche sémantique", layout="wide")
+st.title("🔎 Recherche d'avis similaires")
+st.write("Trouve, dans tous les hôtels, les avis proches d'une phrase (ex. une plainte client).")
+
+# ========================================
+# Singleton SQLite + index
+# ========================================
+db = SQLiteSingleton()
+
+
+@st.cache_resource
+def get_index():
+    return IVFIndex()
+
+
+index = get_index()
+
+# ========================================
+# Indexation incrémentale
+# ========================================
+with st.sidebar:
+    st.subheader("🧠 Index")
+    st.write(f"- Vecteurs indexés : **{len(index)}**")
+    st.write(f"- Index IVF entraîné : **{'oui' if index.trained else 'non (recherche exhaustive)'}**")
+    if st.button("➕ Indexer les nouveaux avis"):
+        from utils.semantic_search import index_new_reviews
+
+        status = st.empty()
+        with st.spinner("Calcul des embeddings..."):
+            added = index_new_reviews(db, index, progress=lambda n: status.text(f"{n} textes indexés..."))
+        status.empty()
+        st.success(f"✅ {added} textes ajoutés à l'index.")
+
+# ========================================
+# Recherche
+# ========================================
+df_hotels = get_hotels(db)
+hotel_labels = {f"{idx} - {row['name']} - {row['town']}": idx for idx, row in df_hotels.iterrows()}
+
+query = st.text_input("Texte recherché", placeholder="ex. la literie est trop dure et bruyante")
+col1, col2, col3 = st.columns(3)
+with col1:
+    selected = st.multiselect("Hôtels (vide = tous)", options=list(hotel_labels))
+with col2:
+    date_range = st.date_input(
+        "Période", value=(datetime.date(2015, 1, 1), datetime.date.today())
+    )
+with col3:
+    k = st.slider("Nombre de résultats", min_value=5, max_value=200, value=20, step=5)
+    nprobe = st.slider("Listes explorées (précision / vitesse)", min_value=1, max_value=64, value=8)
+
+if query:
+    if len(index) == 0:
+        st.info("L'index est vide : lancez d'abord l'indexation des avis.")
+    else:
+        from utils.semantic_search import search_reviews
+
+        date_from, date_to = (date_range + (None,))[:2] if isinstance(date_range, tuple) else (date_range, None)
+        start = datetime.datetime.now()
+        results = search_reviews(
+            db, query, index=index, k=k, nprobe=nprobe,
+            hotel_ids=[hotel_labels[label] for label in selected] or None,
+            date_from=date_from, date_to=date_to,
+        )
+        elapsed_ms = (datetime.datetime.now() - start).total_seconds() * 1000
+        st.caption(f"{len(results)} résultats en {elapsed_ms:.0f} ms")
+        if results.empty:
+            st.info("Aucun avis trouvé pour ces filtres.")
+        else:
+            st.dataframe(results, use_container_width=True)
@@ -1,7 +1,9 @@
 import sqlite3
 import threading
 import os
-import pandas as pd
+import json
+from .migrations import migrate, latest_version, REVIEW_DIMENSIONS
+from . import materialize
 
 class SQLiteSingleton:
     _instance = None
@@ -18,67 +20,18 @@ class SQLiteSingleton:
     def _init_db(self, db_file):
         os.makedirs(os.path.dirname(db_file), exist_ok=True)
         self.db_file = db_file
-        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        # busy_timeout de 30 s : attend le verrou du scraper ou du rafraîchissement au lieu d'échouer
+        self.conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+        self._dimension_cache = {}
+        self._data_version = None
         #self.conn.set_trace_callback(print)
-        self._create_tables()
+        # Schéma déjà à jour : pas de CREATE TABLE à chaque démarrage de processus
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < latest_version():
+            self._create_tables()
 
     def _create_tables(self):
-        # Table hôtels
-        cursor = self.get_cursor()
-
-        # --- Table des hôtels ---
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS hotels (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            town TEXT,
-            url TEXT UNIQUE,
-            booking_id TEXT UNIQUE,
-
-            -- Champs meta (tous optionnels)
-            hotel_staff REAL,
-            hotel_services REAL,
-            hotel_clean REAL,
-            hotel_comfort REAL,
-            hotel_value REAL,
-            hotel_location REAL,
-            hotel_free_wifi REAL
-        )
-        """)
-
-        # --- Table des avis ---
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS reviews (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            hotel_id INTEGER NOT NULL,
-            review_score REAL,
-            reviewed_date TEXT,
-            is_approved INTEGER,
-            helpful_votes INTEGER DEFAULT 0,
-            review_url TEXT NOT NULL,
-            guest_username TEXT,
-            guest_type TEXT,
-            guest_country TEXT,
-            guest_country_code TEXT,
-            guest_avatar_url TEXT,
-            guest_anonymous INTEGER,
-            review_title TEXT,
-            positive_text TEXT,
-            negative_text TEXT,
-            language TEXT,
-            stay_status TEXT,
-            checkin_date TEXT,
-            checkout_date TEXT,
-            num_nights INTEGER,
-            room_name TEXT,
-            room_id TEXT,
-            FOREIGN KEY (hotel_id) REFERENCES hotels(id) ON DELETE CASCADE,
-            UNIQUE(hotel_id, review_url)
-        )
-        """)
-
-        self.commit()
-        print(f"✅ Tables créées avec succès dans '{self.db_file}'")
+        # Le schéma est défini par les migrations versionnées (sqlite/migrations.py)
+        migrate(self.conn)
 
     def get_connection(self):
         return self.conn
@@ -136,15 +89,18 @@ class SQLiteSingleton:
             hotel_staff, hotel_services, hotel_clean, hotel_comfort,
             hotel_value, hotel_location, hotel_free_wifi
         ))
+        materialize.log_event(self.conn, "hotel", [id])
         self.commit()
     
     def insert_or_update_review(self, hotel_id, review_url, **kwargs):
         cursor = self.get_cursor()
+        self._check_dimension_cache()
 
         # Convert booleans to 0/1
         for key in ["is_approved", "guest_anonymous"]:
             if key in kwargs and kwargs[key] is not None:
                 kwargs[key] = int(kwargs[key])
+        kwargs = self._encode_dimensions(kwargs)
 
         columns = ", ".join(["hotel_id", "review_url"] + list(kwargs.keys()))
         placeholders = ", ".join(["?"] * (2 + len(kwargs)))
@@ -160,8 +116,170 @@ class SQLiteSingleton:
         """
 
         cursor.execute(sql, values)
+        materialize.log_event(self.conn, "reviews", [hotel_id], 1)
         self.conn.commit()
-        
+
+    # --------------------
+    # Dimensions des avis (guest_type, pays, room_name, langue...)
+    # --------------------
+    def _check_dimension_cache(self):
+        """
+        Vide le cache des dimensions si une autre connexion a écrit depuis le dernier
+        lot (ex. restauration d'un instantané) : les ids en cache peuvent ne plus exister.
+        """
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._dimension_cache.clear()
+            self._data_version = version
+
+    def _dimension_id(self, table, value):
+        """Id de `value` dans une table de dimension, créé au besoin (mis en cache)."""
+        if value is None:
+            return None
+        key = (table, value)
+        if key not in self._dimension_cache:
+            self.conn.execute(f"INSERT OR IGNORE INTO {table} (value) VALUES (?)", (value,))
+            self._dimension_cache[key] = self.conn.execute(
+                f"SELECT id FROM {table} WHERE value = ?", (value,)
+            ).fetchone()[0]
+        return self._dimension_cache[key]
+
+    def _country_id(self, name, code):
+        if name is None and code is None:
+            return None
+        key = ("dim_country", name, code)
+        if key not in self._dimension_cache:
+            self.conn.execute("INSERT OR IGNORE INTO dim_country (name, code) VALUES (?, ?)", (name, code))
+            self._dimension_cache[key] = self.conn.execute(
+                "SELECT id FROM dim_country WHERE name IS ? AND code IS ?", (name, code)
+            ).fetchone()[0]
+        return self._dimension_cache[key]
+
+    def _encode_dimensions(self, info):
+        """Remplace les colonnes texte répétitives par leurs ids (colonnes <nom>_id)."""
+        info = dict(info)
+        for column, table in REVIEW_DIMENSIONS.items():
+            if column in info:
+                info[f"{column}_id"] = self._dimension_id(table, info.pop(column))
+        if "guest_country" in info or "guest_country_code" in info:
+            info["guest_country_id"] = self._country_id(info.pop("guest_country", None), info.pop("guest_country_code", None))
+        return info
+
+    def dimension_ids(self, column, values):
+        """Ids des valeurs existantes d'une dimension (pour filtrer sur des entiers)."""
+        table = REVIEW_DIMENSIONS[column]
+        if not values:
+            return []
+        return [row[0] for row in self.conn.execute(
+            f"SELECT id FROM {table} WHERE value IN ({', '.join(['?'] * len(values))})", list(values)
+        )]
+
+    def get_dimension(self, column):
+        """{id: valeur} d'une dimension."""
+        return dict(self.conn.execute(f"SELECT id, value FROM {REVIEW_DIMENSIONS[column]}"))
+
+    def insert_or_update_reviews(self, hotel_id, reviews):
+        """
+        Insère un lot d'avis (dicts issus de extract_review_info) en une seule transaction.
+        """
+        if not reviews:
+            return
+        self._check_dimension_cache()
+        for info in reviews:
+            info = dict(info)
+            review_url = info.pop("review_url", None)
+            for key in ["is_approved", "guest_anonymous"]:
+                if key in info and info[key] is not None:
+                    info[key] = int(info[key])
+            info = self._encode_dimensions(info)
+
+            columns = ", ".join(["hotel_id", "review_url"] + list(info.keys()))
+            placeholders = ", ".join(["?"] * (2 + len(info)))
+            updates = ", ".join([f"{col} = COALESCE(excluded.{col}, reviews.{col})" for col in info.keys()])
+
+            self.conn.execute(f"""
+                INSERT INTO reviews ({columns})
+                VALUES ({placeholders})
+                ON CONFLICT(hotel_id, review_url) DO UPDATE SET
+                    {updates}
+            """, [hotel_id, review_url] + list(info.values()))
+        materialize.log_event(self.conn, "reviews", [hotel_id], len(reviews))
+        self.conn.commit()
+
+    # --------------------
+    # Version des données et agrégats matérialisés
+    # --------------------
+    def data_version(self, hotel_ids=None):
+        return materialize.data_version(self.conn, hotel_ids)
+
+    def materialized_version(self):
+        return materialize.materialized_version(self.conn)
+
+    def refresh_aggregates(self):
+        return materialize.refresh(self.conn)
+
+    def get_hotel_stats(self):
+        """Agrégats par hôtel (table hotel_stats), joints aux infos de l'hôtel."""
+        import pandas as pd
+        return pd.read_sql("""
+            SELECT h.id, h.name, h.town, s.reviews, s.avg_score, s.first_review_date,
+                   s.last_review_date, s.tagged_sides, s.refreshed_at
+            FROM hotels h LEFT JOIN hotel_stats s ON s.hotel_id = h.id
+        """, self.get_connection(), index_col="id")
+
+    def get_hotel_topic_counts(self, hotel_ids=None):
+        """Mentions matérialisées par (hôtel, topic, côté)."""
+        import pandas as pd
+        sql = """
+            SELECT c.hotel_id, v.topic, c.side, c.mentions
+            FROM hotel_topic_counts c JOIN topic_vocabulary v ON v.id = c.topic_id
+        """
+        params = []
+        if hotel_ids:
+            sql += f" WHERE c.hotel_id IN ({', '.join(['?'] * len(hotel_ids))})"
+            params = [int(h) for h in hotel_ids]
+        return pd.read_sql(sql, self.get_connection(), params=params)
+
+    # --------------------
+    # Planification des collectes
+    # --------------------
+    def record_scrape(self, hotel_id, requests, reviews):
+        """Trace une collecte : requêtes envoyées, avis reçus, avis stockés pour l'hôtel."""
+        self.conn.execute("""
+            INSERT INTO scrape_runs (hotel_id, requests, reviews, stored_reviews)
+            VALUES (?, ?, ?, (SELECT COUNT(*) FROM reviews WHERE hotel_id = ?))
+        """, (hotel_id, requests, reviews, hotel_id))
+        self.commit()
+
+    def requests_spent(self, since="start of day"):
+        """Requêtes envoyées depuis `since` (modificateur de date SQLite, UTC)."""
+        row = self.conn.execute(
+            "SELECT COALESCE(SUM(requests), 0) FROM scrape_runs WHERE scraped_at >= datetime('now', ?)", (since,)
+        ).fetchone()
+        return row[0]
+
+    def get_review_activity(self, window_days=180):
+        """
+        Par hôtel : avis stockés, avis des `window_days` derniers jours, premier et
+        dernier avis (heure locale), dernière collecte (UTC) et son coût en requêtes.
+        """
+        import pandas as pd
+        return pd.read_sql("""
+            SELECT h.id, h.name, h.town, h.booking_id,
+                   COUNT(r.id) AS reviews,
+                   COUNT(CASE WHEN r.reviewed_date >= datetime('now', 'localtime', ?) THEN 1 END) AS recent_reviews,
+                   MIN(r.reviewed_date) AS first_review_date,
+                   MAX(r.reviewed_date) AS last_review_date,
+                   s.scraped_at AS last_scraped_at,
+                   s.requests AS last_requests
+            FROM hotels h
+            LEFT JOIN reviews r ON r.hotel_id = h.id
+            LEFT JOIN scrape_runs s ON s.id = (
+                SELECT id FROM scrape_runs WHERE hotel_id = h.id ORDER BY scraped_at DESC, id DESC LIMIT 1
+            )
+            GROUP BY h.id
+        """, self.get_connection(), params=[f"-{int(window_days)} days"], index_col="id")
+
     def get_hotel_count(self):
         try:
             cursor = self.get_cursor()
@@ -171,7 +289,213 @@ class SQLiteSingleton:
             return 0
 
     def get_all_hotels(self):
+        import pandas as pd
         try:
             return pd.read_sql("SELECT * FROM hotels", self.get_connection(),  index_col="id")
         except:
             return pd.DataFrame()
+
+    # --------------------
+    # Cache de résolution des URLs
+    # --------------------
+    def save_hotel_resolution(self, match_key, name, town, url, booking_id=None):
+        if not url:
+            return
+        self.conn.execute("""
+            INSERT INTO hotel_url_cache (match_key, name, town, url, booking_id)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(match_key) DO UPDATE SET
+                url = excluded.url,
+                booking_id = COALESCE(excluded.booking_id, hotel_url_cache.booking_id),
+                resolved_at = CURRENT_TIMESTAMP
+        """, (match_key, name, town, url, None if booking_id is None else str(booking_id)))
+        self.commit()
+
+    def get_hotel_resolutions(self):
+        import pandas as pd
+        try:
+            return pd.read_sql("SELECT * FROM hotel_url_cache", self.get_connection(), index_col="match_key")
+        except:
+            return pd.DataFrame()
+
+    # --------------------
+    # Lecture des avis
+    # --------------------
+    def get_reviews_after(self, last_review_id, limit=1000):
+        """Avis d'id > last_review_id (ordre croissant), pour l'indexation incrémentale."""
+        cursor = self.get_cursor()
+        cursor.execute("""
+            SELECT id, hotel_id, reviewed_date, positive_text, negative_text
+            FROM reviews WHERE id > ? ORDER BY id LIMIT ?
+        """, (last_review_id, limit))
+        return cursor.fetchall()
+
+    def get_reviews_to_reindex(self, up_to_review_id, limit=1000):
+        """Avis déjà indexés (id <= up_to_review_id) dont le texte a changé depuis, même format que get_reviews_after."""
+        cursor = self.get_cursor()
+        cursor.execute("""
+            SELECT r.id, r.hotel_id, r.reviewed_date, r.positive_text, r.negative_text
+            FROM embedding_queue q JOIN reviews r ON r.id = q.review_id
+            WHERE q.review_id <= ? ORDER BY q.review_id LIMIT ?
+        """, (up_to_review_id, limit))
+        return cursor.fetchall()
+
+    def clear_reindex_queue(self, review_ids=None, above_review_id=None):
+        """Retire de la file les avis ré-indexés, ou ceux pas encore indexés (id > above_review_id)."""
+        if review_ids:
+            self.conn.execute(
+                "DELETE FROM embedding_queue WHERE review_id IN (SELECT value FROM json_each(?))",
+                (json.dumps([int(i) for i in review_ids]),)
+            )
+        if above_review_id is not None:
+            self.conn.execute("DELETE FROM embedding_queue WHERE review_id > ?", (above_review_id,))
+        # Avis supprimés entre-temps
+        self.conn.execute(
+            "DELETE FROM embedding_queue WHERE NOT EXISTS (SELECT 1 FROM reviews r WHERE r.id = embedding_queue.review_id)"
+        )
+        self.commit()
+
+    def get_reviews_by_ids(self, review_ids):
+        import pandas as pd
+        if not review_ids:
+            return pd.DataFrame()
+        placeholders = ", ".join(["?"] * len(review_ids))
+        return pd.read_sql(f"""
+            SELECT r.id, r.hotel_id, h.name AS hotel_name, h.town AS hotel_town,
+                   r.reviewed_date, r.review_score, r.guest_type, r.language,
+                   r.positive_text, r.negative_text
+            FROM reviews_full r LEFT JOIN hotels h ON h.id = r.hotel_id
+            WHERE r.id IN ({placeholders})
+        """, self.get_connection(), params=list(review_ids), index_col="id")
+
+    def iter_reviews_for_export(self, hotel_id, chunk_size=5000):
+        """
+        Avis d'un hôtel (avec scores de topics) lus par paquets via un curseur dédié.
+        Génère d'abord la liste des colonnes, puis des listes de lignes.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT r.*, h.name AS hotel_name, h.town AS hotel_town,
+                   tp.scores AS positive_scores, tn.scores AS negative_scores
+            FROM reviews_full r
+            JOIN hotels h ON h.id = r.hotel_id
+            LEFT JOIN review_topics tp ON tp.review_id = r.id AND tp.side = 'positive'
+            LEFT JOIN review_topics tn ON tn.review_id = r.id AND tn.side = 'negative'
+            WHERE r.hotel_id = ?
+            ORDER BY r.id
+        """, (hotel_id,))
+        try:
+            yield [d[0] for d in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def get_column_types(self, table):
+        """{colonne: type déclaré} d'une table."""
+        return {row[1]: row[2].upper() for row in self.conn.execute(f"PRAGMA table_info({table})")}
+
+    # --------------------
+    # Topics prédits
+    # --------------------
+    def get_topic_vocabulary(self):
+        """topic -> id (position dans les vecteurs de scores)."""
+        return {topic: id_ for id_, topic in self.conn.execute("SELECT id, topic FROM topic_vocabulary")}
+
+    def add_topics(self, topics):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO topic_vocabulary (id, topic) VALUES ((SELECT COALESCE(MAX(id), -1) + 1 FROM topic_vocabulary), ?)",
+            [(t,) for t in topics]
+        )
+        self.commit()
+        return self.get_topic_vocabulary()
+
+    def get_pending_predictions(self, model_version, languages=None, limit=1000, exclude_languages=None,
+                                keep_versions=None):
+        """
+        Côtés d'avis sans prédiction, ou prédits avec une autre version du modèle
+        (sauf les versions de `keep_versions`, qui ne sont jamais remplacées).
+        Retourne [(review_id, side, text, language)], groupés par langue.
+        """
+        lang_filter = ""
+        params = []
+        if keep_versions:
+            lang_filter += f" AND COALESCE(t.model_version, '') NOT IN ({', '.join(['?'] * len(keep_versions))})"
+            params += list(keep_versions)
+        # Filtre sur les ids de langue (entiers), pas sur le texte
+        if languages:
+            lang_filter += f" AND r.language_id IN (SELECT id FROM dim_language WHERE value IN ({', '.join(['?'] * len(languages))}))"
+            params += list(languages)
+        if exclude_languages:
+            lang_filter += (f" AND COALESCE(r.language_id, -1) NOT IN "
+                            f"(SELECT id FROM dim_language WHERE value IN ({', '.join(['?'] * len(exclude_languages))}))")
+            params += list(exclude_languages)
+        sql = " UNION ALL ".join(f"""
+            SELECT r.id, '{side}', r.{side}_text, (SELECT value FROM dim_language WHERE id = r.language_id)
+            FROM reviews r
+            LEFT JOIN review_topics t ON t.review_id = r.id AND t.side = '{side}'
+            WHERE r.{side}_text IS NOT NULL AND TRIM(r.{side}_text) != ''
+              AND (t.review_id IS NULL OR t.model_version != ?) {lang_filter}
+        """ for side in ("positive", "negative"))
+        all_params = []
+        for _ in range(2):
+            all_params += [model_version] + params
+        return self.conn.execute(f"{sql} ORDER BY 4 LIMIT ?", all_params + [limit]).fetchall()
+
+    def get_tagged_texts(self, model_version, languages=None, limit=None):
+        """[(side, text, scores_blob)] des côtés déjà tagués par `model_version`."""
+        sql = """
+            SELECT t.side, CASE t.side WHEN 'positive' THEN r.positive_text ELSE r.negative_text END, t.scores
+            FROM review_topics t JOIN reviews r ON r.id = t.review_id
+            WHERE t.model_version = ?
+        """
+        params = [model_version]
+        if languages:
+            sql += f" AND r.language_id IN (SELECT id FROM dim_language WHERE value IN ({', '.join(['?'] * len(languages))}))"
+            params += list(languages)
+        if limit:
+            sql += " ORDER BY RANDOM() LIMIT ?"
+            params.append(limit)
+        return self.conn.execute(sql, params).fetchall()
+
+    def get_cached_prediction(self, text_hash, model_version):
+        row = self.conn.execute(
+            "SELECT scores FROM review_topics WHERE text_hash = ? AND model_version = ? LIMIT 1",
+            (text_hash, model_version)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_text_signatures(self, model_version):
+        """[(simhash, text_hash)] des textes déjà prédits par `model_version`."""
+        return self.conn.execute("""
+            SELECT simhash, MIN(text_hash) FROM review_topics
+            WHERE model_version = ? AND simhash IS NOT NULL
+            GROUP BY simhash
+        """, (model_version,)).fetchall()
+
+    def save_review_topics(self, rows):
+        """rows : [(review_id, side, text_hash, model_version, scores_blob, simhash)] ; un commit par lot."""
+        self.conn.executemany("""
+            INSERT INTO review_topics (review_id, side, text_hash, model_version, scores, simhash)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(review_id, side) DO UPDATE SET
+                text_hash = excluded.text_hash,
+                model_version = excluded.model_version,
+                scores = excluded.scores,
+                simhash = excluded.simhash,
+                predicted_at = CURRENT_TIMESTAMP
+        """, rows)
+        materialize.log_review_event(self.conn, "topics", {row[0] for row in rows})
+        self.commit()
+
+    def get_review_topic_scores(self, hotel_id=None):
+        """[(review_id, side, scores_blob)] pour un hôtel (ou tous)."""
+        sql = "SELECT t.review_id, t.side, t.scores FROM review_topics t"
+        params = []
+        if hotel_id is not None:
+            sql += " JOIN reviews r ON r.id = t.review_id WHERE r.hotel_id = ?"
+            params.append(hotel_id)
+        return self.conn.execute(sql, params).fetchall()
@@ -0,0 +1,197 @@
+"""
+Sauvegarde en ligne de la base des avis, sans arrêter l'application.
+
+La copie passe par l'API de sauvegarde de SQLite, par paquets de pages avec une
+pause entre deux paquets : chaque paquet ne tient la base que quelques
+millisecondes. En mode WAL (le mode de la base, voir migrations.py), la copie
+lit un instantané figé au début de la sauvegarde : les écritures du scraper
+continuent pendant la copie sans la faire repartir de zéro, et l'instantané
+est cohérent. Hors WAL, la copie repart au début à chaque écriture d'une autre
+connexion ; elle est abandonnée après MAX_RESTARTS reprises.
+
+Chaque instantané est une copie complète, vérifiée (quick_check), compressée
+en gzip, et seuls les KEEP plus récents sont conservés. Si la base (fichier et
+WAL) n'a pas été modifiée depuis le début du dernier instantané, aucune
+nouvelle copie n'est faite : la rotation ne se remplit pas de copies identiques. La restauration décompresse un instantané puis le
+recopie dans la base par la même API, en une seule transaction.
+"""
+import datetime
+import glob
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import time
+
+BACKUP_DIR = os.path.join("db", "backups")
+# Instantanés conservés
+KEEP = 7
+# Pages copiées par pas (pages de 4 Kio : 4 Mio par pas)
+PAGES_PER_STEP = 1024
+# Pause entre deux pas, pour laisser la main aux écritures
+STEP_PAUSE = 0.01
+# Hors WAL : reprises tolérées avant d'abandonner
+MAX_RESTARTS = 20
+COMPRESS_LEVEL = 6
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    pass
+
+
+def _stem(db_file):
+    return os.path.splitext(os.path.basename(db_file))[0]
+
+
+def list_snapshots(db_file, backup_dir=BACKUP_DIR):
+    """Instantanés de la base, du plus ancien au plus récent (l'horodatage est dans le nom)."""
+    # Horodatage à la microseconde ; les anciens noms, à la seconde, restent reconnus
+    name = re.compile(rf"{re.escape(_stem(db_file))}-\d{{8}}-\d{{6}}(-\d{{6}})?\.db(\.gz)?$")
+    pattern = os.path.join(backup_dir, f"{_stem(db_file)}-*.db*")
+    return sorted(p for p in glob.glob(pattern) if name.match(os.path.basename(p)))
+
+
+def _modified_ns(db_file):
+    """Dernière modification de la base, journal WAL compris."""
+    return max(os.stat(p).st_mtime_ns for p in (db_file, db_file + "-wal") if os.path.exists(p))
+
+
+def unchanged(db_file, backup_dir=BACKUP_DIR):
+    """
+    Vrai si la base n'a pas été modifiée depuis le dernier instantané
+    (dont la date de modification est celle du début de sa copie).
+    """
+    snapshots = list_snapshots(db_file, backup_dir)
+    return bool(snapshots) and _modified_ns(db_file) < os.stat(snapshots[-1]).st_mtime_ns
+
+
+def rotate(db_file, backup_dir=BACKUP_DIR, keep=KEEP):
+    """Supprime les instantanés au-delà des `keep` plus récents ; retourne les fichiers supprimés."""
+    removed = list_snapshots(db_file, backup_dir)[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def _check(path):
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        raise BackupError(f"Copie corrompue ({path}) : {result}")
+
+
+def copy_online(db_file, target_file, pages=PAGES_PER_STEP, pause=STEP_PAUSE,
+                max_restarts=MAX_RESTARTS, progress=None):
+    """
+    Copie page à page de `db_file` vers `target_file` (fichier SQLite non compressé).
+    progress(pages restantes, pages totales) est appelé après chaque pas.
+    """
+    source = sqlite3.connect(db_file, timeout=30, isolation_level=None)
+    target = sqlite3.connect(target_file)
+    restarts = 0
+    last_remaining = None
+
+    def on_step(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise BackupError(f"Sauvegarde abandonnée : la base a changé {restarts} fois pendant la copie")
+        last_remaining = remaining
+        if progress:
+            progress(remaining, total)
+        if pause:
+            time.sleep(pause)
+
+    try:
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+        if wal:
+            # Instantané figé : ne bloque pas les écritures en WAL, évite les reprises
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages, progress=on_step)
+        if wal:
+            source.execute("COMMIT")
+    finally:
+        target.close()
+        source.close()
+    return restarts
+
+
+def _compress(path, target, level=COMPRESS_LEVEL):
+    with open(path, "rb") as src, gzip.open(target, "wb", compresslevel=level) as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def _decompress(path, target):
+    with gzip.open(path, "rb") as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def snapshot(db_file, backup_dir=BACKUP_DIR, keep=KEEP, compress=True, pages=PAGES_PER_STEP,
+             pause=STEP_PAUSE, progress=None, force=False):
+    """
+    Sauvegarde en ligne, vérifiée, compressée puis rotation. Retourne le chemin de l'instantané,
+    ou celui du dernier si la base n'a pas changé depuis (sauf `force`).
+    """
+    if not os.path.exists(db_file):
+        raise BackupError(f"Base introuvable : {db_file}")
+    if not force and unchanged(db_file, backup_dir):
+        return list_snapshots(db_file, backup_dir)[-1]
+    os.makedirs(backup_dir, exist_ok=True)
+    # Les écritures faites pendant la copie seront plus récentes que l'instantané
+    started = time.time_ns()
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(backup_dir, f"{_stem(db_file)}-{stamp}.db")
+    tmp = path + ".tmp"
+    try:
+        copy_online(db_file, tmp, pages=pages, pause=pause, progress=progress)
+        _check(tmp)
+        if compress:
+            path += ".gz"
+            _compress(tmp, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        else:
+            os.replace(tmp, path)
+        os.utime(path, ns=(started, started))
+    finally:
+        for leftover in (tmp, path + ".tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    rotate(db_file, backup_dir, keep)
+    return path
+
+
+def restore(snapshot_path, db_file):
+    """
+    Remplace le contenu de `db_file` par un instantané (.db ou .db.gz). La copie se
+    fait en une transaction par l'API de sauvegarde : les connexions ouvertes
+    voient la base restaurée à leur prochaine lecture, et SQLiteSingleton vide
+    son cache des dimensions au lot suivant (PRAGMA data_version).
+    """
+    if not os.path.exists(snapshot_path):
+        raise BackupError(f"Instantané introuvable : {snapshot_path}")
+    tmp = db_file + ".restore"
+    try:
+        if snapshot_path.endswith(".gz"):
+            _decompress(snapshot_path, tmp)
+            source_file = tmp
+        else:
+            source_file = snapshot_path
+        _check(source_file)
+        source = sqlite3.connect(source_file)
+        target = sqlite3.connect(db_file, timeout=30)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return db_file
@@ -0,0 +1,85 @@
+"""
+Commandes d'administration de la base (depuis app/) :
+    python -m sqlite.cli migrate [--db db/booking_reviews.db]
+    python -m sqlite.cli status
+    python -m sqlite.cli backup [--dir db/backups] [--keep 7] [--no-compress] [--force]
+    python -m sqlite.cli restore [instantané | latest]
+    python -m sqlite.cli snapshots
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from . import backup
+from .migrations import migrate, status, latest_version
+
+DEFAULT_DB_FILE = "db/booking_reviews.db"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Administration de la base SQLite des avis.")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="fichier SQLite")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="appliquer les migrations manquantes")
+    sub.add_parser("status", help="lister les migrations appliquées")
+    backup_parser = sub.add_parser("backup", help="sauvegarde en ligne, sans arrêter l'application")
+    backup_parser.add_argument("--dir", default=backup.BACKUP_DIR, help="dossier des instantanés")
+    backup_parser.add_argument("--keep", type=int, default=backup.KEEP, help="instantanés conservés")
+    backup_parser.add_argument("--pages", type=int, default=backup.PAGES_PER_STEP, help="pages copiées par pas")
+    backup_parser.add_argument("--pause", type=float, default=backup.STEP_PAUSE, help="pause entre deux pas (s)")
+    backup_parser.add_argument("--no-compress", action="store_true", help="instantané .db non compressé")
+    backup_parser.add_argument("--force", action="store_true", help="copier même si la base n'a pas changé")
+    restore_parser = sub.add_parser("restore", help="restaurer un instantané")
+    restore_parser.add_argument("snapshot", nargs="?", default="latest", help="fichier, ou 'latest'")
+    restore_parser.add_argument("--dir", default=backup.BACKUP_DIR, help="dossier des instantanés")
+    snapshots_parser = sub.add_parser("snapshots", help="lister les instantanés")
+    snapshots_parser.add_argument("--dir", default=backup.BACKUP_DIR, help="dossier des instantanés")
+    args = parser.parse_args(argv)
+
+    if args.command in ("backup", "restore", "snapshots"):
+        try:
+            run_backup_command(args)
+        except backup.BackupError as e:
+            sys.exit(f"❌ {e}")
+        return
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.command == "migrate":
+            applied = migrate(conn)
+            print(f"Schéma à la version {latest_version()} ({len(applied)} migration(s) appliquée(s)).")
+        elif args.command == "status":
+            status(conn)
+    finally:
+        conn.close()
+
+
+def run_backup_command(args):
+    if args.command == "backup":
+        if not args.force and backup.unchanged(args.db, args.dir):
+            print(f"✅ Base inchangée depuis le dernier instantané : {backup.list_snapshots(args.db, args.dir)[-1]}")
+            return
+
+        def progress(remaining, total):
+            print(f"\r{total - remaining}/{total} pages", end="", flush=True)
+
+        path = backup.snapshot(args.db, args.dir, keep=args.keep, compress=not args.no_compress,
+                               pages=args.pages, pause=args.pause, progress=progress, force=args.force)
+        print(f"\n✅ Instantané : {path} ({os.path.getsize(path) / 2 ** 20:.1f} Mio)")
+    elif args.command == "restore":
+        path = args.snapshot
+        if path == "latest":
+            snapshots = backup.list_snapshots(args.db, args.dir)
+            if not snapshots:
+                raise backup.BackupError(f"Aucun instantané dans {args.dir}")
+            path = snapshots[-1]
+        backup.restore(path, args.db)
+        print(f"✅ {args.db} restaurée depuis {path}")
+    elif args.command == "snapshots":
+        for path in backup.list_snapshots(args.db, args.dir):
+            print(f"{path}  {os.path.getsize(path) / 2 ** 20:.1f} Mio")
+
+
+if __name__ == "__main__":
+    main()
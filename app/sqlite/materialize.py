@@ -0,0 +1,140 @@
+"""
+Agrégats matérialisés du tableau de bord, reconstruits à partir du journal `data_events`.
+
+Le scraper et les prédictions ajoutent un évènement par écriture (hôtel X modifié).
+`refresh()` ne recalcule que les hôtels apparus dans le journal depuis le dernier
+passage ; `data_version()` (dernier id du journal) sert de clé de cache aux pages.
+Après chaque passage, le journal est purgé sous le plus ancien point de reprise
+des consommateurs (`prune_events()`).
+
+Ces fonctions prennent une connexion : le rafraîchissement en tâche de fond
+utilise la sienne (voir utils/background_refresh.py).
+"""
+import json
+
+# Même règle que utils.predict_topics.topics_above (score > floor(0.8 * 255))
+MENTION_LEVEL = 204
+STATE_NAME = "dashboard"
+
+
+def log_event(conn, kind, hotel_ids, rows=None):
+    """Ajoute un évènement par hôtel modifié (sans commit : fait partie de la transaction de l'écriture)."""
+    conn.executemany(
+        "INSERT INTO data_events (hotel_id, kind, rows) VALUES (?, ?, ?)",
+        [(hotel_id, kind, rows) for hotel_id in hotel_ids]
+    )
+
+
+def log_review_event(conn, kind, review_ids):
+    """Évènements pour les hôtels d'une liste d'avis."""
+    conn.execute("""
+        INSERT INTO data_events (hotel_id, kind, rows)
+        SELECT hotel_id, ?, COUNT(*) FROM reviews
+        WHERE id IN (SELECT value FROM json_each(?))
+        GROUP BY hotel_id
+    """, (kind, json.dumps(list(review_ids))))
+
+
+def data_version(conn, hotel_ids=None):
+    """Dernier évènement (global, ou pour ces hôtels) : change dès que les données changent."""
+    if hotel_ids:
+        row = conn.execute(
+            "SELECT MAX(id) FROM data_events WHERE hotel_id IN (SELECT value FROM json_each(?))",
+            (json.dumps([int(h) for h in hotel_ids]),)
+        ).fetchone()
+    else:
+        row = conn.execute("SELECT MAX(id) FROM data_events").fetchone()
+    return row[0] or 0
+
+
+def materialized_version(conn):
+    """Dernier évènement pris en compte dans les agrégats."""
+    row = conn.execute("SELECT last_event_id FROM materializer_state WHERE name = ?", (STATE_NAME,)).fetchone()
+    return row[0] if row else 0
+
+
+def refresh_hotel(conn, hotel_id, event_id):
+    import numpy as np
+
+    conn.execute("DELETE FROM hotel_stats WHERE hotel_id = ?", (hotel_id,))
+    conn.execute("DELETE FROM hotel_topic_counts WHERE hotel_id = ?", (hotel_id,))
+    if conn.execute("SELECT 1 FROM hotels WHERE id = ?", (hotel_id,)).fetchone() is None:
+        return
+
+    conn.execute("""
+        INSERT INTO hotel_stats (hotel_id, reviews, avg_score, first_review_date, last_review_date,
+                                 tagged_sides, event_id)
+        SELECT ?, COUNT(*), AVG(review_score), MIN(reviewed_date), MAX(reviewed_date),
+               (SELECT COUNT(*) FROM review_topics t JOIN reviews r2 ON r2.id = t.review_id
+                WHERE r2.hotel_id = ?), ?
+        FROM reviews WHERE hotel_id = ?
+    """, (hotel_id, hotel_id, event_id, hotel_id))
+
+    n_topics = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM topic_vocabulary").fetchone()[0]
+    for side in ("positive", "negative"):
+        counts = np.zeros(n_topics, dtype=np.int64)
+        cursor = conn.execute("""
+            SELECT t.scores FROM review_topics t JOIN reviews r ON r.id = t.review_id
+            WHERE r.hotel_id = ? AND t.side = ? AND t.scores IS NOT NULL
+        """, (hotel_id, side))
+        while True:
+            blobs = cursor.fetchmany(5000)
+            if not blobs:
+                break
+            for (blob,) in blobs:
+                values = np.frombuffer(blob, dtype=np.uint8)[:n_topics]
+                counts[:len(values)] += values > MENTION_LEVEL
+        conn.executemany(
+            "INSERT INTO hotel_topic_counts (hotel_id, topic_id, side, mentions) VALUES (?, ?, ?, ?)",
+            [(hotel_id, int(topic_id), side, int(counts[topic_id])) for topic_id in np.nonzero(counts)[0]]
+        )
+
+
+def refresh(conn, log=None):
+    """Recalcule les agrégats des hôtels modifiés depuis le dernier passage. Retourne leur nombre."""
+    last = materialized_version(conn)
+    row = conn.execute("SELECT MAX(id) FROM data_events").fetchone()
+    latest = row[0] or 0
+    if latest <= last:
+        return 0
+
+    hotel_ids = [r[0] for r in conn.execute(
+        "SELECT DISTINCT hotel_id FROM data_events WHERE id > ? AND id <= ? AND hotel_id IS NOT NULL",
+        (last, latest)
+    )]
+    for hotel_id in hotel_ids:
+        # Un hôtel par transaction : les écrivains n'attendent jamais longtemps
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            refresh_hotel(conn, hotel_id, latest)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    conn.execute(
+        "INSERT INTO materializer_state (name, last_event_id) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET last_event_id = excluded.last_event_id",
+        (STATE_NAME, latest)
+    )
+    conn.commit()
+    prune_events(conn)
+    if log:
+        log(f"🔄 Agrégats recalculés pour {len(hotel_ids)} hôtel(s) (évènement {latest})")
+    return len(hotel_ids)
+
+
+def prune_events(conn):
+    """
+    Supprime les évènements déjà pris en compte par tous les consommateurs
+    (materializer_state), sauf le dernier de chaque hôtel : data_version() et
+    les clés de cache qui en dépendent ne changent pas. Retourne le nombre de lignes supprimées.
+    """
+    row = conn.execute("SELECT MIN(last_event_id) FROM materializer_state").fetchone()
+    if row[0] is None:
+        return 0
+    cursor = conn.execute("""
+        DELETE FROM data_events
+        WHERE id <= ? AND id NOT IN (SELECT MAX(id) FROM data_events GROUP BY hotel_id)
+    """, (row[0],))
+    conn.commit()
+    return cursor.rowcount
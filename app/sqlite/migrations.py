@@ -0,0 +1,513 @@
+"""
+Migrations versionnées du schéma SQLite.
+
+Chaque migration est une fonction `fn(conn)` enregistrée avec @migration(version, nom).
+Elles sont appliquées dans l'ordre et tracées dans la table `schema_version` ;
+`PRAGMA user_version` en garde une copie pour que la vérification au démarrage
+ne coûte qu'une lecture.
+
+Règles :
+- une migration DDL simple est exécutée dans une transaction unique ;
+- une migration longue (backfill, index sur une grosse table) utilise
+  `batched_update` / `create_index` : elle commit par lots, et doit donc
+  pouvoir être relancée si elle est interrompue (IF NOT EXISTS, WHERE ... IS NULL).
+
+Utilisation en ligne de commande (depuis app/) :
+    python -m sqlite.cli migrate [--db db/booking_reviews.db]
+    python -m sqlite.cli status
+"""
+import re
+import time
+import sqlite3
+
+MIGRATIONS = []
+# ALTER TABLE ... DROP COLUMN : SQLite >= 3.35 (le Raspberry Pi est en 3.34)
+DROP_COLUMN_SUPPORTED = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def migration(version, name, batched=False):
+    def register(fn):
+        MIGRATIONS.append((version, name, batched, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# --------------------
+# Outils pour migrations longues
+# --------------------
+def batched_update(conn, table, set_sql, where_sql="1", params=(), batch_size=5000, pause=0.01):
+    """
+    Applique `UPDATE table SET set_sql WHERE where_sql` par tranches de rowid.
+    Chaque tranche est committée séparément : le verrou d'écriture est relâché
+    entre deux lots et le scraper peut continuer d'écrire.
+    """
+    row = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}").fetchone()
+    if row[0] is None:
+        return 0
+    low, high = row
+    updated = 0
+    while low <= high:
+        cur = conn.execute(
+            f"UPDATE {table} SET {set_sql} WHERE rowid >= ? AND rowid < ? AND ({where_sql})",
+            (low, low + batch_size, *params)
+        )
+        conn.commit()
+        updated += cur.rowcount
+        low += batch_size
+        if pause:
+            time.sleep(pause)
+    return updated
+
+
+def create_index(conn, name, table, columns, where=None):
+    """
+    Construit un index dans sa propre transaction (IF NOT EXISTS, donc rejouable).
+    SQLite ne sait pas construire un index par morceaux : en mode WAL les lecteurs
+    ne sont pas bloqués, et chaque index est committé séparément pour que les
+    écrivains n'attendent qu'un index à la fois.
+    """
+    sql = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+    if where:
+        sql += f" WHERE {where}"
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(sql)
+    conn.commit()
+
+
+def column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _table_definitions(sql):
+    """Colonnes et contraintes de premier niveau d'un CREATE TABLE (commentaires retirés)."""
+    sql = re.sub(r"--[^\n]*", "", sql)
+    body = sql[sql.index("(") + 1:sql.rindex(")")]
+    items, depth, start = [], 0, 0
+    for i, ch in enumerate(body):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            items.append(body[start:i].strip())
+            start = i + 1
+    items.append(body[start:].strip())
+    return [item for item in items if item]
+
+
+def _rebuild_without(conn, table, columns):
+    """
+    Suppression de colonnes sans DROP COLUMN : nouvelle table, copie, suppression,
+    renommage, puis index et triggers recréés (procédure de la doc SQLite).
+    """
+    def mentions(sql):
+        return any(re.search(rf"\b{column}\b", sql) for column in columns)
+
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    constraints = ("CONSTRAINT", "PRIMARY", "UNIQUE", "CHECK", "FOREIGN")
+    definitions = []
+    for item in _table_definitions(sql):
+        if item.split()[0].upper() in constraints:
+            if mentions(item):
+                raise RuntimeError(f"Contrainte sur une colonne supprimée de {table} : {item}")
+        elif item.split()[0].strip('"`[]') in columns:
+            continue
+        definitions.append(item)
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)
+    )]
+    for dependent in dependents:
+        if mentions(dependent):
+            raise RuntimeError(f"Index ou trigger sur une colonne supprimée de {table} : {dependent}")
+    kept = ", ".join(row[1] for row in conn.execute(f"PRAGMA table_info({table})") if row[1] not in columns)
+    sequence = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)
+    ).fetchone() if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone() else None
+
+    rebuilt = f"{table}__rebuild"
+    conn.execute(f"CREATE TABLE {rebuilt} (\n    " + ",\n    ".join(definitions) + "\n)")
+    conn.execute(f"INSERT INTO {rebuilt} ({kept}) SELECT {kept} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {rebuilt} RENAME TO {table}")
+    for dependent in dependents:
+        conn.execute(dependent)
+    if sequence:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequence[0], table))
+
+
+def drop_columns(conn, table, columns):
+    """
+    Supprime des colonnes en une transaction : DROP COLUMN si SQLite le permet
+    (>= 3.35), sinon reconstruction de la table, au résultat identique.
+    """
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    # Hors transaction : DROP TABLE ne doit pas supprimer en cascade les lignes liées,
+    # et le renommage ne doit pas revalider les vues qui lisent la table
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if DROP_COLUMN_SUPPORTED:
+            for column in columns:
+                conn.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+        else:
+            _rebuild_without(conn, table, columns)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+
+
+# --------------------
+# Migrations
+# --------------------
+@migration(1, "schéma initial : hotels, reviews, hotel_url_cache")
+def _initial_schema(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS hotels (
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        town TEXT,
+        url TEXT UNIQUE,
+        booking_id TEXT UNIQUE,
+
+        -- Champs meta (tous optionnels)
+        hotel_staff REAL,
+        hotel_services REAL,
+        hotel_clean REAL,
+        hotel_comfort REAL,
+        hotel_value REAL,
+        hotel_location REAL,
+        hotel_free_wifi REAL
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS reviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hotel_id INTEGER NOT NULL,
+        review_score REAL,
+        reviewed_date TEXT,
+        is_approved INTEGER,
+        helpful_votes INTEGER DEFAULT 0,
+        review_url TEXT NOT NULL,
+        guest_username TEXT,
+        guest_type TEXT,
+        guest_country TEXT,
+        guest_country_code TEXT,
+        guest_avatar_url TEXT,
+        guest_anonymous INTEGER,
+        review_title TEXT,
+        positive_text TEXT,
+        negative_text TEXT,
+        language TEXT,
+        stay_status TEXT,
+        checkin_date TEXT,
+        checkout_date TEXT,
+        num_nights INTEGER,
+        room_name TEXT,
+        room_id TEXT,
+        FOREIGN KEY (hotel_id) REFERENCES hotels(id) ON DELETE CASCADE,
+        UNIQUE(hotel_id, review_url)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS hotel_url_cache (
+        match_key TEXT PRIMARY KEY,
+        name TEXT,
+        town TEXT,
+        url TEXT,
+        booking_id TEXT,
+        resolved_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+@migration(2, "index avis par hôtel et date", batched=True)
+def _reviews_hotel_date_index(conn):
+    create_index(conn, "idx_reviews_hotel_date", "reviews", "hotel_id, reviewed_date")
+
+
+@migration(3, "état de prédiction des topics par avis")
+def _review_topics(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS topic_vocabulary (
+        id INTEGER PRIMARY KEY,
+        topic TEXT NOT NULL UNIQUE
+    )
+    """)
+
+    # Un enregistrement par côté d'avis ; scores = uint8[id de topic] (0..255)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS review_topics (
+        review_id INTEGER NOT NULL,
+        side TEXT NOT NULL CHECK (side IN ('positive', 'negative')),
+        text_hash TEXT NOT NULL,
+        model_version TEXT NOT NULL,
+        scores BLOB,
+        predicted_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (review_id, side),
+        FOREIGN KEY (review_id) REFERENCES reviews(id) ON DELETE CASCADE
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_review_topics_hash ON review_topics(text_hash, model_version)")
+
+    # Texte modifié par un nouveau scraping : la prédiction devient obsolète
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS reviews_text_changed
+    AFTER UPDATE OF positive_text, negative_text ON reviews
+    WHEN OLD.positive_text IS NOT NEW.positive_text OR OLD.negative_text IS NOT NEW.negative_text
+    BEGIN
+        DELETE FROM review_topics WHERE review_id = NEW.id;
+    END
+    """)
+
+
+@migration(4, "empreinte simhash des textes prédits (quasi-doublons)")
+def _review_topics_simhash(conn):
+    if not column_exists(conn, "review_topics", "simhash"):
+        conn.execute("ALTER TABLE review_topics ADD COLUMN simhash INTEGER")
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_review_topics_simhash
+    ON review_topics(model_version, simhash) WHERE simhash IS NOT NULL
+    """)
+
+
+@migration(5, "journal des modifications et agrégats matérialisés par hôtel")
+def _data_events(conn):
+    # Une ligne par écriture (lot d'avis, hôtel, prédictions) : id croissant = version des données
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS data_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hotel_id INTEGER,
+        kind TEXT NOT NULL,
+        rows INTEGER,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_data_events_hotel ON data_events(hotel_id, id)")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS hotel_stats (
+        hotel_id INTEGER PRIMARY KEY,
+        reviews INTEGER NOT NULL,
+        avg_score REAL,
+        first_review_date TEXT,
+        last_review_date TEXT,
+        tagged_sides INTEGER NOT NULL,
+        event_id INTEGER NOT NULL,
+        refreshed_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (hotel_id) REFERENCES hotels(id) ON DELETE CASCADE
+    )
+    """)
+    # Mentions au seuil par défaut, par hôtel / topic / côté
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS hotel_topic_counts (
+        hotel_id INTEGER NOT NULL,
+        topic_id INTEGER NOT NULL,
+        side TEXT NOT NULL,
+        mentions INTEGER NOT NULL,
+        PRIMARY KEY (hotel_id, topic_id, side),
+        FOREIGN KEY (hotel_id) REFERENCES hotels(id) ON DELETE CASCADE
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS materializer_state (
+        name TEXT PRIMARY KEY,
+        last_event_id INTEGER NOT NULL
+    )
+    """)
+    # Les hôtels déjà en base sont à matérialiser une première fois
+    conn.execute("INSERT INTO data_events (hotel_id, kind, rows) SELECT id, 'migration', NULL FROM hotels")
+
+
+# Colonnes texte répétitives des avis -> table de dimension (id, value)
+REVIEW_DIMENSIONS = {
+    "guest_type": "dim_guest_type",
+    "room_name": "dim_room_name",
+    "language": "dim_language",
+    "stay_status": "dim_stay_status",
+    "guest_avatar_url": "dim_avatar_url",
+}
+# Colonnes exposées par la vue reviews_full, dans l'ordre de l'ancienne table
+REVIEW_COLUMNS = [
+    "id", "hotel_id", "review_score", "reviewed_date", "is_approved", "helpful_votes", "review_url",
+    "guest_username", "guest_type", "guest_country", "guest_country_code", "guest_avatar_url",
+    "guest_anonymous", "review_title", "positive_text", "negative_text", "language", "stay_status",
+    "checkin_date", "checkout_date", "num_nights", "room_name", "room_id",
+]
+
+
+@migration(6, "tables de dimension pour les colonnes répétitives des avis", batched=True)
+def _review_dimensions(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    for table in REVIEW_DIMENSIONS.values():
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE)")
+    # Pays : nom et code vont ensemble
+    conn.execute("CREATE TABLE IF NOT EXISTS dim_country (id INTEGER PRIMARY KEY, name TEXT, code TEXT)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_country ON dim_country(IFNULL(name, ''), IFNULL(code, ''))")
+    for column, table in list(REVIEW_DIMENSIONS.items()) + [("guest_country", "dim_country")]:
+        if not column_exists(conn, "reviews", f"{column}_id"):
+            conn.execute(f"ALTER TABLE reviews ADD COLUMN {column}_id INTEGER REFERENCES {table}(id)")
+    conn.commit()
+
+    # Ancienne version du schéma : remplissage des dimensions puis des clés, par lots
+    if column_exists(conn, "reviews", "guest_type"):
+        conn.execute("BEGIN IMMEDIATE")
+        for column, table in REVIEW_DIMENSIONS.items():
+            conn.execute(f"INSERT OR IGNORE INTO {table} (value) SELECT DISTINCT {column} FROM reviews WHERE {column} IS NOT NULL")
+        conn.execute("""
+            INSERT OR IGNORE INTO dim_country (name, code)
+            SELECT DISTINCT guest_country, guest_country_code FROM reviews
+            WHERE guest_country IS NOT NULL OR guest_country_code IS NOT NULL
+        """)
+        conn.commit()
+
+        assignments = [
+            f"{column}_id = (SELECT id FROM {table} WHERE value = reviews.{column})"
+            for column, table in REVIEW_DIMENSIONS.items()
+        ] + ["""guest_country_id = (SELECT id FROM dim_country
+                WHERE name IS reviews.guest_country AND code IS reviews.guest_country_code
+                  AND (reviews.guest_country IS NOT NULL OR reviews.guest_country_code IS NOT NULL))"""]
+        batched_update(conn, "reviews", ", ".join(assignments))
+
+        # Réécrit la table une fois : les lignes ne portent plus que des entiers
+        drop_columns(conn, "reviews", list(REVIEW_DIMENSIONS) + ["guest_country", "guest_country_code"])
+
+    create_index(conn, "idx_reviews_language", "reviews", "language_id")
+
+    # Lecture transparente avec les anciens noms de colonnes
+    select = {column: f"r.{column}" for column in REVIEW_COLUMNS}
+    for column, table in REVIEW_DIMENSIONS.items():
+        select[column] = f"(SELECT value FROM {table} WHERE id = r.{column}_id) AS {column}"
+    select["guest_country"] = "(SELECT name FROM dim_country WHERE id = r.guest_country_id) AS guest_country"
+    select["guest_country_code"] = "(SELECT code FROM dim_country WHERE id = r.guest_country_id) AS guest_country_code"
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("DROP VIEW IF EXISTS reviews_full")
+    conn.execute(f"CREATE VIEW reviews_full AS SELECT {', '.join(select.values())} FROM reviews r")
+    conn.commit()
+
+
+@migration(7, "journal des collectes par hôtel (planification)")
+def _scrape_runs(conn):
+    # Une ligne par hôtel scrapé : coût en requêtes et nombre d'avis stockés après coup
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS scrape_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hotel_id INTEGER NOT NULL,
+        scraped_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        requests INTEGER NOT NULL,
+        reviews INTEGER NOT NULL,
+        stored_reviews INTEGER,
+        FOREIGN KEY (hotel_id) REFERENCES hotels(id) ON DELETE CASCADE
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scrape_runs_hotel ON scrape_runs(hotel_id, scraped_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scrape_runs_date ON scrape_runs(scraped_at)")
+
+
+@migration(8, "file de ré-indexation des textes modifiés (recherche sémantique)")
+def _embedding_queue(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS embedding_queue (
+        review_id INTEGER PRIMARY KEY,
+        queued_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    # Même condition que reviews_text_changed : le vecteur indexé devient obsolète
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS reviews_text_changed_embedding
+    AFTER UPDATE OF positive_text, negative_text ON reviews
+    WHEN OLD.positive_text IS NOT NEW.positive_text OR OLD.negative_text IS NOT NEW.negative_text
+    BEGIN
+        INSERT OR IGNORE INTO embedding_queue (review_id) VALUES (NEW.id);
+    END
+    """)
+
+
+# --------------------
+# Moteur
+# --------------------
+def _ensure_version_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        duration_s REAL
+    )
+    """)
+    conn.commit()
+
+
+def current_version(conn):
+    _ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def verify(conn):
+    """Contrôle d'intégrité après migration. Retourne la liste des problèmes."""
+    problems = [r[0] for r in conn.execute("PRAGMA quick_check") if r[0] != "ok"]
+    problems += [f"clé étrangère invalide : {r}" for r in conn.execute("PRAGMA foreign_key_check")]
+    return problems
+
+
+def migrate(conn, log=print):
+    """Applique les migrations manquantes. Retourne la liste des versions appliquées."""
+    # WAL : les lecteurs (dashboard) ne sont pas bloqués pendant les migrations
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA busy_timeout = 30000")
+
+    applied = []
+    version = current_version(conn)
+    for target, name, batched, fn in MIGRATIONS:
+        if target <= version:
+            continue
+        start = time.perf_counter()
+        if batched:
+            fn(conn)
+        else:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                fn(conn)
+            except Exception:
+                conn.rollback()
+                raise
+        conn.execute(
+            "INSERT INTO schema_version (version, name, duration_s) VALUES (?, ?, ?)",
+            (target, name, round(time.perf_counter() - start, 3))
+        )
+        conn.commit()
+        applied.append(target)
+        log(f"✅ Migration {target} appliquée : {name}")
+
+    if applied:
+        problems = verify(conn)
+        if problems:
+            raise RuntimeError("Contrôle d'intégrité échoué après migration : " + "; ".join(problems[:10]))
+
+    conn.execute(f"PRAGMA user_version = {latest_version()}")
+    conn.commit()
+    return applied
+
+
+def status(conn):
+    _ensure_version_table(conn)
+    done = {r[0]: (r[1], r[2]) for r in conn.execute("SELECT version, applied_at, duration_s FROM schema_version")}
+    for version, name, _, _ in MIGRATIONS:
+        if version in done:
+            applied_at, duration = done[version]
+            print(f"[x] {version:3d} {name} ({applied_at}, {duration}s)")
+        else:
+            print(f"[ ] {version:3d} {name}")
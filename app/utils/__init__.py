@@ -1 +0,0 @@
-from .filter_hotel_to_select import filter_hotel_to_select
\ No newline at end of file
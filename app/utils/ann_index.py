@@ -0,0 +1,325 @@
+import os
+import json
+import numpy as np
+
+DEFAULT_INDEX_DIR = "db/ann"
+# En dessous de ce nombre de vecteurs, une recherche exhaustive suffit
+MIN_TRAIN_SIZE = 20_000
+FIELDS = ("keys", "hotels", "days", "assign", "vectors")
+
+
+def make_key(review_id, side):
+    """Clé d'un vecteur : un avis a deux côtés (0 = positif, 1 = négatif)."""
+    return np.asarray(review_id, dtype=np.int64) * 2 + np.asarray(side, dtype=np.int64)
+
+
+def split_key(key):
+    return int(key) // 2, int(key) % 2
+
+
+def date_to_day(date_str):
+    """'2025-10-02 15:36:09' -> 20251002 (0 si absente)."""
+    if not isinstance(date_str, str) or len(date_str) < 10:
+        return 0
+    return int(date_str[:10].replace("-", ""))
+
+
+def quantize(vectors):
+    # Vecteurs normalisés : composantes dans [-1, 1] -> int8 (4x moins de mémoire que float32)
+    return np.clip(np.rint(vectors * 127), -127, 127).astype(np.int8)
+
+
+def _spherical_kmeans(x, n_lists, iters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), n_lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                centroids[c] = x[rng.integers(len(x))]
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Index approximatif des plus proches voisins (IVF, CPU, numpy uniquement).
+
+    - les vecteurs (normalisés) sont quantifiés en int8 et rangés en segments
+      sur disque, relus en mmap ;
+    - `add()` écrit un nouveau segment (insertion incrémentale, sans réécriture) ;
+      un texte modifié remplace son vecteur : l'ancien est masqué par une pierre
+      tombale (clé, numéro de segment) jusqu'au prochain compactage ;
+    - `train()` apprend n_lists centroïdes (k-means sphérique) sur un échantillon,
+      puis compacte tout en un segment trié par liste (une liste = une tranche
+      contiguë), par blocs lus en mmap et écrits directement dans le segment final ;
+    - `search()` ne parcourt que les `nprobe` listes les plus proches de la requête,
+      avec filtres optionnels par hôtel et par date.
+    """
+
+    def __init__(self, root=DEFAULT_INDEX_DIR, dim=384):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.meta = {"dim": dim, "trained_size": 0, "last_review_id": 0, "segments": [], "next_segment": 0}
+        meta_path = os.path.join(root, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta.update(json.load(f))
+        centroids_path = os.path.join(root, "centroids.npy")
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        self.segments = [self._load_segment(name) for name in self.meta["segments"]]
+        # (clé, n) : les vecteurs de cette clé dans les segments de numéro < n sont obsolètes
+        tombstones_path = os.path.join(root, "tombstones.npy")
+        self.tombstones = np.load(tombstones_path) if os.path.exists(tombstones_path) else np.empty((0, 2), np.int64)
+
+    # --------------------
+    # Persistance
+    # --------------------
+    def _segment_path(self, name, field):
+        return os.path.join(self.root, f"{name}_{field}.npy")
+
+    def _load_segment(self, name):
+        seg = {"name": name}
+        for field in FIELDS:
+            seg[field] = np.load(self._segment_path(name, field), mmap_mode="r")
+        offsets_path = self._segment_path(name, "offsets")
+        seg["offsets"] = np.load(offsets_path) if os.path.exists(offsets_path) else None
+        return seg
+
+    def _new_segment_name(self):
+        name = f"seg_{self.meta['next_segment']:05d}"
+        self.meta["next_segment"] += 1
+        return name
+
+    def _write_segment(self, arrays, offsets=None):
+        name = self._new_segment_name()
+        for field in FIELDS:
+            np.save(self._segment_path(name, field), arrays[field])
+        if offsets is not None:
+            np.save(self._segment_path(name, "offsets"), offsets)
+        return name
+
+    def _remove_segment_files(self, name):
+        for field in FIELDS + ("offsets",):
+            path = self._segment_path(name, field)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _save_tombstones(self):
+        path = os.path.join(self.root, "tombstones.npy")
+        if len(self.tombstones):
+            np.save(path, self.tombstones)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def _save_meta(self):
+        tmp = os.path.join(self.root, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.root, "meta.json"))
+
+    def __len__(self):
+        return sum(len(seg["keys"]) for seg in self.segments)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def _dead(self, seg, keys):
+        """Masque des vecteurs remplacés (ou supprimés) depuis l'écriture du segment."""
+        if not len(self.tombstones):
+            return None
+        number = int(seg["name"].split("_")[1])
+        stale = self.tombstones[self.tombstones[:, 1] > number, 0]
+        if not len(stale):
+            return None
+        return np.isin(keys, stale)
+
+    # --------------------
+    # Écriture
+    # --------------------
+    def _assign(self, vectors):
+        if not self.trained:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def add(self, keys, vectors, hotel_ids, days, last_review_id=None, stale_keys=()):
+        """
+        Ajoute des vecteurs float32 normalisés (n, dim) dans un nouveau segment.
+        `stale_keys` : clés dont les vecteurs déjà indexés sont obsolètes (texte
+        modifié ou vidé) ; elles peuvent être ré-ajoutées dans ce même appel.
+        """
+        if last_review_id is not None:
+            self.meta["last_review_id"] = max(self.meta["last_review_id"], int(last_review_id))
+        if len(stale_keys):
+            # Le segment écrit ci-dessous porte le numéro next_segment : il reste visible
+            stale = np.asarray(stale_keys, dtype=np.int64)
+            marks = np.column_stack([stale, np.full(len(stale), self.meta["next_segment"], dtype=np.int64)])
+            self.tombstones = np.concatenate([self.tombstones, marks])
+            self._save_tombstones()
+        if len(keys) == 0:
+            self._save_meta()
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        arrays = {
+            "keys": np.asarray(keys, dtype=np.int64),
+            "hotels": np.asarray(hotel_ids, dtype=np.int32),
+            "days": np.asarray(days, dtype=np.int32),
+            "assign": self._assign(vectors),
+            "vectors": quantize(vectors),
+        }
+        name = self._write_segment(arrays)
+        self.meta["segments"].append(name)
+        self._save_meta()
+        self.segments.append(self._load_segment(name))
+
+    def needs_training(self):
+        n = len(self)
+        if n < MIN_TRAIN_SIZE:
+            return False
+        return not self.trained or n > 4 * self.meta["trained_size"]
+
+    def _blocks(self, block_size=50_000):
+        """(segment, début, fin) de tous les segments, par blocs (lecture en mmap)."""
+        for seg in self.segments:
+            for start in range(0, len(seg["keys"]), block_size):
+                yield seg, start, min(start + block_size, len(seg["keys"]))
+
+    def train(self, n_lists=None, sample_size=100_000, iters=20):
+        """(Ré)apprend les centroïdes sur un échantillon, puis compacte tous les segments en un seul, trié par liste."""
+        sizes = [len(seg["keys"]) for seg in self.segments]
+        n = sum(sizes)
+        if n == 0:
+            return
+        n_lists = n_lists or int(min(max(4 * np.sqrt(n), 16), 4096))
+        n_lists = min(n_lists, n)
+
+        # Seules les lignes tirées sont lues depuis les mmap
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(n, min(max(sample_size, n_lists), n), replace=False))
+        bounds = np.concatenate([[0], np.cumsum(sizes)])
+        parts = []
+        for seg, low, high in zip(self.segments, bounds[:-1], bounds[1:]):
+            rows = sample[(sample >= low) & (sample < high)] - low
+            if len(rows):
+                parts.append(np.asarray(seg["vectors"][rows]))
+        self.centroids = _spherical_kmeans(np.concatenate(parts).astype(np.float32) / 127, n_lists, iters)
+        np.save(os.path.join(self.root, "centroids.npy"), self.centroids)
+        self.meta["trained_size"] = n
+        self._compact()
+
+    def _compact(self):
+        """
+        Réécrit les segments en un seul, trié par liste, sans les vecteurs obsolètes.
+        Deux passes par blocs : affectation (seul le tableau des listes est en mémoire),
+        puis écriture de chaque bloc à sa place dans le segment final, ouvert en mmap.
+        """
+        assign = []
+        for seg, start, stop in self._blocks():
+            block = self._assign(np.asarray(seg["vectors"][start:stop]).astype(np.float32) / 127)
+            dead = self._dead(seg, np.asarray(seg["keys"][start:stop]))
+            if dead is not None:
+                block[dead] = -1
+            assign.append(block)
+        assign = np.concatenate(assign) if assign else np.empty(0, dtype=np.int32)
+        counts = np.bincount(assign[assign >= 0], minlength=len(self.centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        n_live = int(offsets[-1])
+
+        old = list(self.meta["segments"])
+        name = self._new_segment_name()
+        dim = self.meta["dim"]
+        shapes = {"keys": (n_live,), "hotels": (n_live,), "days": (n_live,), "assign": (n_live,),
+                  "vectors": (n_live, dim)}
+        dtypes = {"keys": np.int64, "hotels": np.int32, "days": np.int32, "assign": np.int32, "vectors": np.int8}
+        if n_live == 0:
+            for field in FIELDS:
+                np.save(self._segment_path(name, field), np.empty(shapes[field], dtype=dtypes[field]))
+        else:
+            out = {field: np.lib.format.open_memmap(self._segment_path(name, field), mode="w+",
+                                                   dtype=dtypes[field], shape=shapes[field])
+                   for field in FIELDS}
+            cursor = offsets[:-1].copy()
+            position = 0
+            for seg, start, stop in self._blocks():
+                block = assign[position:position + stop - start]
+                position += stop - start
+                keep = np.nonzero(block >= 0)[0]
+                lists = block[keep]
+                # Ordre stable dans chaque liste : rang de la ligne parmi celles de sa liste
+                order = np.argsort(lists, kind="stable")
+                lists, rows = lists[order], keep[order] + start
+                rank = np.arange(len(lists)) - np.searchsorted(lists, lists, side="left")
+                dest = cursor[lists] + rank
+                for field in ("keys", "hotels", "days", "vectors"):
+                    out[field][dest] = np.asarray(seg[field][rows])
+                out["assign"][dest] = lists
+                cursor += np.bincount(lists, minlength=len(cursor))
+            for array in out.values():
+                array.flush()
+            del out
+        np.save(self._segment_path(name, "offsets"), offsets)
+
+        self.meta["segments"] = [name]
+        self._save_meta()
+        self.tombstones = np.empty((0, 2), np.int64)
+        self._save_tombstones()
+        self.segments = [self._load_segment(name)]
+        for old_name in old:
+            self._remove_segment_files(old_name)
+
+    # --------------------
+    # Recherche
+    # --------------------
+    def search(self, query, k=20, nprobe=8, hotel_ids=None, day_from=None, day_to=None):
+        """
+        Retourne [(key, score)] des k vecteurs les plus proches (cosinus) de `query`.
+        `hotel_ids` / `day_from` / `day_to` (AAAAMMJJ) filtrent les candidats.
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        probe = None
+        if self.trained:
+            probe = np.argsort(-(self.centroids @ query))[:nprobe]
+
+        all_keys, all_scores = [], []
+        for seg in self.segments:
+            if probe is None:
+                rows = np.arange(len(seg["keys"]))
+            elif seg["offsets"] is not None:
+                offsets = seg["offsets"]
+                rows = np.concatenate([np.arange(offsets[c], offsets[c + 1]) for c in probe])
+            else:
+                rows = np.nonzero(np.isin(seg["assign"], probe) | (seg["assign"] < 0))[0]
+            if len(rows) == 0:
+                continue
+
+            mask = np.ones(len(rows), dtype=bool)
+            dead = self._dead(seg, np.asarray(seg["keys"][rows]))
+            if dead is not None:
+                mask &= ~dead
+            if hotel_ids:
+                mask &= np.isin(seg["hotels"][rows], np.asarray(hotel_ids, dtype=np.int32))
+            if day_from:
+                mask &= seg["days"][rows] >= day_from
+            if day_to:
+                mask &= seg["days"][rows] <= day_to
+            rows = rows[mask]
+            if len(rows) == 0:
+                continue
+
+            scores = (seg["vectors"][rows].astype(np.float32) @ query) / 127
+            if len(scores) > k:
+                top = np.argpartition(-scores, k)[:k]
+                rows, scores = rows[top], scores[top]
+            all_keys.append(np.asarray(seg["keys"][rows]))
+            all_scores.append(scores)
+
+        if not all_keys:
+            return []
+        keys = np.concatenate(all_keys)
+        scores = np.concatenate(all_scores)
+        best = np.argsort(-scores)[:k]
+        return [(int(keys[i]), float(scores[i])) for i in best]
@@ -0,0 +1,30 @@
+import sqlite3
+import threading
+
+from sqlite import materialize
+
+
+def _run(db_file, interval, stop):
+    # Connexion propre au thread : la connexion du singleton reste à l'interface
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    try:
+        while not stop.is_set():
+            try:
+                materialize.refresh(conn)
+            except sqlite3.Error as e:
+                print(f"⚠️ Rafraîchissement des agrégats : {e}")
+            stop.wait(interval)
+    finally:
+        conn.close()
+
+
+def start_refresher(db_file, interval=5.0):
+    """
+    Lance le rafraîchissement des agrégats en tâche de fond (thread démon).
+    Retourne l'Event qui l'arrête. À appeler une fois par processus (st.cache_resource).
+    """
+    stop = threading.Event()
+    thread = threading.Thread(target=_run, args=(db_file, interval, stop), name="aggregates-refresher", daemon=True)
+    thread.start()
+    return stop
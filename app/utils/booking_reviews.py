@@ -0,0 +1,231 @@
+import json
+import datetime
+import time
+import random
+
+from utils.pagination import MAX_REFETCH_ROUNDS, PageCollector, Slice, fetch_pages, page_payload, plan_slices, probe_limit, review_list, uncovered
+from utils.rate_limiter import RateLimiter
+
+GRAPHQL_ENDPOINT = "https://www.booking.com/dml/graphql?lang=fr"
+MAX_LIMIT = 25
+
+
+def load_headers(path="scrap_util/header.json"):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_payload(path="scrap_util/payload.json"):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def wait():
+    time.sleep(random.uniform(1, 3))
+
+def post_graphql(payload, headers, session=None):
+    if session is None:
+        import requests
+        session = requests
+    response = session.post(GRAPHQL_ENDPOINT, headers=headers, json=payload)
+    return response.json()
+
+def extract_review_info(card):
+    info = {}
+
+    # Basic review info
+    info['review_score'] = card.get('reviewScore')
+    info['reviewed_date'] = datetime.datetime.fromtimestamp(card.get('reviewedDate')).strftime('%Y-%m-%d %H:%M:%S') if card.get('reviewedDate') else None
+    info['is_approved'] = card.get('isApproved')
+    info['helpful_votes'] = card.get('helpfulVotesCount')
+    info['review_url'] = card.get('reviewUrl')
+
+    # Guest details
+    guest = card.get('guestDetails', {})
+    info['guest_username'] = guest.get('username')
+    info['guest_type'] = guest.get('guestTypeTranslation')
+    info['guest_country'] = guest.get('countryName')
+    info['guest_country_code'] = guest.get('countryCode')
+    info['guest_avatar_url'] = guest.get('avatarUrl')
+    info['guest_anonymous'] = guest.get('anonymous')
+
+    # Review text
+    text = card.get('textDetails', {})
+    info['review_title'] = text.get('title')
+    info['positive_text'] = text.get('positiveText')
+    info['negative_text'] = text.get('negativeText')
+    info['language'] = text.get('lang')
+
+    # Booking details
+    booking = card.get('bookingDetails', {})
+    info['stay_status'] = booking.get('stayStatus')
+    info['checkin_date'] = booking.get('checkinDate')
+    info['checkout_date'] = booking.get('checkoutDate')
+    info['num_nights'] = booking.get('numNights')
+    room = booking.get('roomType', {})
+    info['room_name'] = room.get('name')
+    info['room_id'] = room.get('id')
+
+    return info
+
+
+def write_hotel_meta(hotel_id, data, db):
+    # Add meta review score of hotel
+    scores = data.get('ratingScores', {})
+    meta = {s['name']: s['value'] for s in scores}
+
+    db.insert_or_update_hotel(
+        id=hotel_id,
+        hotel_staff=meta.get('hotel_staff'),
+        hotel_services=meta.get('hotel_services'),
+        hotel_clean=meta.get('hotel_clean'),
+        hotel_comfort=meta.get('hotel_comfort'),
+        hotel_value=meta.get('hotel_value'),
+        hotel_location=meta.get('hotel_location'),
+        hotel_free_wifi=meta.get('hotel_free_wifi')
+    )
+
+
+# Taille de page prouvée / refusée par le serveur, partagée par les hôtels du processus
+_limit_state = {}
+
+
+def scrap_one_hotel(hotel_id, booking_id, payload_template, headers, db, st_container=None, session=None, limiter=None, raw_cache=None, page_workers=1, probe=True):
+    """
+    Scrape all reviews of one hotel and write them through `db`.
+    `db` is either the SQLiteSingleton itself or a writer proxy (see sharded_scrap).
+    If `raw_cache` (ResponseCache) is given, every raw GraphQL page is kept for offline replay.
+    The first call probes the largest accepted page `limit` (if `probe`). All page
+    offsets are then planned from `reviewsCount`, split into filter / sorter slices
+    for large hotels (see pagination), fetched by `page_workers` threads sharing
+    `limiter`, deduplicated on review_url, and missing pages are fetched again.
+    The number of requests sent is recorded with db.record_scrape, also when the scrape fails midway.
+    Returns (distinct reviews collected, reviewsCount).
+    """
+    if limiter is None and page_workers > 1:
+        limiter = RateLimiter()
+    pause = limiter.wait if limiter else wait
+    sorter = payload_template['variables']['input'].get('sorter', '')
+
+    sent = 0
+    collector = None
+    try:
+        def first_page(limit):
+            nonlocal sent
+            # A rejected page size is retried through the limiter like any other request
+            if sent:
+                pause()
+            sent += 1
+            return post_graphql(page_payload(payload_template, booking_id, 0, limit), headers, session)
+
+        # First call: hotel meta, reviewsCount, facets and page size
+        if probe:
+            limit, response = probe_limit(first_page, MAX_LIMIT, _limit_state)
+        else:
+            limit, response = MAX_LIMIT, first_page(MAX_LIMIT)
+        if raw_cache:
+            raw_cache.put(booking_id, sorter, 0, response)
+        data = review_list(response)
+        write_hotel_meta(hotel_id, data, db)
+
+        cards = data.get('reviewCard', [])
+        total_reviews = data.get('reviewsCount', len(cards))
+
+        def facets(filters):
+            # Facets of a slice too long for two opposite sorts, to split it further (see plan_slices)
+            nonlocal sent
+            pause()
+            sent += 1
+            return review_list(post_graphql(page_payload(payload_template, booking_id, 0, limit, sorter, filters), headers, session))
+
+        slices = plan_slices(data, sorter, probe=facets)
+        # Past the cap of both sorts of an unsplittable slice: reported, not refetched in vain
+        unreachable = uncovered(slices)
+        reachable = total_reviews - unreachable
+        if unreachable:
+            message = (f"Hotel {hotel_id}: {unreachable} of {total_reviews} reviews are beyond the "
+                       f"pagination cap and cannot be collected")
+            if st_container:
+                st_container.warning(message)
+            else:
+                print(f"⚠️ {message}")
+        collector = PageCollector(limit)
+        # Page 0 of the default sort: it is also page 0 of a single slice
+        collector.add((0, 0) if len(slices) == 1 else (-1, 0), cards)
+        db.insert_or_update_reviews(hotel_id, [extract_review_info(card) for card in cards])
+
+        def fetch(key):
+            pause()
+            s = slices[key[0]]
+            return post_graphql(page_payload(payload_template, booking_id, key[1], limit, s.sorter, s.filters), headers, session)
+
+        progress = None
+        if st_container:
+            progress = st_container.progress(0)
+
+        keys = [(s.index, skip) for s in slices for skip in s.offsets(limit) if (s.index, skip) not in collector.pages]
+        for _ in range(MAX_REFETCH_ROUNDS + 1):
+            for key, response in fetch_pages(keys, fetch, page_workers):
+                sent += 1
+                if isinstance(response, Exception):
+                    collector.fail(key)
+                    continue
+                # Cache writes stay in this thread (one SQLite connection)
+                if raw_cache:
+                    raw_cache.put(booking_id, slices[key[0]].label, key[1], response)
+                new_cards = collector.add(key, review_list(response).get('reviewCard', []))
+                db.insert_or_update_reviews(hotel_id, [extract_review_info(card) for card in new_cards])
+                if progress and total_reviews:
+                    progress.progress(min(len(collector.review_urls) / total_reviews, 1.0))
+            if collector.is_complete(reachable):
+                break
+            keys = collector.missing(slices, reachable)
+            if not keys:
+                if len(slices) == 1:
+                    break
+                # Filters did not cover the hotel: fall back on the plain sort for the rest
+                slices = [Slice(0, sorter, None, total_reviews)]
+                reachable = total_reviews
+                collector.pages, collector.failed = {}, set()
+                keys = [(0, skip) for skip in slices[0].offsets(limit)]
+
+        if progress:
+            progress.empty()
+        return len(collector.review_urls), total_reviews
+    finally:
+        # Cost and yield of this run for the scheduler (see scheduler.py), also when it fails midway
+        db.record_scrape(hotel_id, sent, len(collector.review_urls) if collector else 0)
+
+
+def replay_hotel(hotel_id, booking_id, raw_cache, db, fetch_date=None):
+    """
+    Ré-extrait les avis d'un hôtel depuis le cache de réponses brutes, sans réseau.
+    Retourne le nombre d'avis relus.
+    """
+    count = 0
+    for i, (sorter, skip, response) in enumerate(raw_cache.iter_pages(booking_id, fetch_date)):
+        data = response.get('data', {}).get('reviewListFrontend', {})
+        if i == 0:
+            write_hotel_meta(hotel_id, data, db)
+        cards = data.get('reviewCard', [])
+        db.insert_or_update_reviews(hotel_id, [extract_review_info(card) for card in cards])
+        count += len(cards)
+    return count
+
+
+def scrap_hotel_task(item, ctx):
+    """Tâche de sharded_scrap : item = (hotel_id, booking_id)."""
+    hotel_id, booking_id = item
+    if "payload" not in ctx.cache:
+        ctx.cache["payload"] = load_payload()
+        ctx.cache["headers"] = load_headers()
+    raw_cache = None
+    if ctx.options.get("keep_raw"):
+        if "raw_cache" not in ctx.cache:
+            from utils.response_cache import ResponseCache
+            ctx.cache["raw_cache"] = ResponseCache()
+            ctx.on_close(ctx.cache["raw_cache"].close)
+        raw_cache = ctx.cache["raw_cache"]
+    scrap_one_hotel(
+        hotel_id, booking_id, ctx.cache["payload"], ctx.cache["headers"], ctx.db,
+        session=ctx.session, limiter=ctx.limiter, raw_cache=raw_cache,
+        page_workers=ctx.options.get("page_workers", 1)
+    )
@@ -0,0 +1,105 @@
+import time
+import random
+import platform
+from utils.hotel_match import match_key
+
+# selenium / webdriver_manager sont importés dans les fonctions :
+# ils ne sont chargés qu'au lancement effectif d'un scraping.
+
+ENDPOINT = "https://www.booking.com/searchresults.fr.html?ss="
+
+def wait():
+    """Pause aléatoire pour éviter d'être détecté comme bot"""
+    time.sleep(random.uniform(1, 3))
+
+def build_query(hotel_name, town):
+    query = ENDPOINT + '+'.join(town.split()) + '+' + '+'.join(hotel_name.split())
+    return query.lower()
+
+def setup_driver():
+    from selenium import webdriver
+    from selenium.webdriver.firefox.service import Service
+    from selenium.webdriver.firefox.options import Options
+
+    options = Options()
+    options.add_argument("--headless")  # Optionnel : exécuter sans fenêtre
+    options.set_preference("dom.webdriver.enabled", False)
+    options.set_preference("useAutomationExtension", False)
+
+    system = platform.system()
+    machine = platform.machine()
+
+    if system == "Linux" and "arm" in machine.lower():
+        # Probablement Raspberry Pi
+        driver_path = "/usr/bin/geckodriver"  # Assurez-vous qu'il est installé via apt
+        service = Service(driver_path)
+    else:
+        # PC classique : utiliser GeckoDriverManager
+        from webdriver_manager.firefox import GeckoDriverManager
+        service = Service(GeckoDriverManager().install())
+
+    driver = webdriver.Firefox(service=service, options=options)
+    return driver
+
+def get_hotel_url(driver, hotel, town, pause=wait):
+    """Retourne l'URL du premier hôtel trouvé"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    query = build_query(hotel, town)
+    driver.get(query)
+    pause()
+
+    try:
+        a_tag = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='hotel']"))
+        )
+        href = a_tag.get_attribute("href")
+        return href.split("?")[0]
+    except Exception:
+        return ""
+
+def get_hotel_id(driver, url, timeout=10, pause=wait):
+    """Retourne l'id booking depuis l'URL de l'hôtel"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    # Open the page
+    driver.get(url)
+
+    # Wait a random time to mimic human reading
+    pause()
+
+    try:
+        # Wait for the input element with name="hotel_id" to appear
+        hotel_input = WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.NAME, "hotel_id"))
+        )
+        # Scroll into view (mimic human behavior)
+        driver.execute_script("arguments[0].scrollIntoView(true);", hotel_input)
+        time.sleep(random.uniform(0.5, 1.5))
+
+        # Get the value attribute
+        hotel_id = hotel_input.get_attribute("value")
+        hotel_id = int(hotel_id)
+    except Exception as e:
+        print(f"Hotel ID input not found. Error: {e}")
+        hotel_id = None
+
+    return hotel_id
+
+
+def resolve_hotel_task(item, ctx):
+    """Tâche de sharded_scrap : item = (id, name, town). Un navigateur par worker."""
+    id_, name, town = item
+    if "driver" not in ctx.cache:
+        ctx.cache["driver"] = setup_driver()
+        ctx.on_close(ctx.cache["driver"].quit)
+    driver = ctx.cache["driver"]
+
+    url = get_hotel_url(driver, name, town, pause=ctx.limiter.wait)
+    booking_id = get_hotel_id(driver, url, pause=ctx.limiter.wait)
+    ctx.db.insert_or_update_hotel(id=id_, url=url, booking_id=booking_id)
+    ctx.db.save_hotel_resolution(match_key(name, town), name, town, url, booking_id)
@@ -0,0 +1,50 @@
+"""
+Cache des données du tableau de bord, indexé sur la version des données
+(dernier id du journal data_events) : tant que rien n'a été écrit, un rerun
+Streamlit ne coûte qu'une lecture de MAX(id). Les statistiques sont indexées
+sur la version des agrégats matérialisés, tenus à jour par background_refresh.
+"""
+import streamlit as st
+
+from sqlite.SQLiteSingleton import SQLiteSingleton
+from utils.background_refresh import start_refresher
+from utils.filter_hotel_to_select import hotel_facets
+
+
+@st.cache_resource
+def ensure_refresher(db_file):
+    """Un seul thread de rafraîchissement par processus serveur."""
+    return start_refresher(db_file)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _hotels(db_file, version):
+    return SQLiteSingleton(db_file).get_all_hotels()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _hotel_facets(db_file, version):
+    return hotel_facets(_hotels(db_file, version))
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _hotel_stats(db_file, version):
+    return SQLiteSingleton(db_file).get_hotel_stats()
+
+
+def get_hotels(db):
+    return _hotels(db.db_file, db.data_version())
+
+
+def get_hotel_facets(db):
+    """Index des filtres de la table des hôtels, recalculé seulement quand les données changent."""
+    return _hotel_facets(db.db_file, db.data_version())
+
+
+def get_hotel_stats(db):
+    """
+    Derniers agrégats matérialisés, sans rafraîchissement pendant le rendu :
+    le thread de fond les rattrape et la version matérialisée change alors la clé du cache.
+    """
+    ensure_refresher(db.db_file)
+    return _hotel_stats(db.db_file, db.materialized_version())
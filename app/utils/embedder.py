@@ -0,0 +1,44 @@
+import numpy as np
+
+MODEL_PATH = "models/sbert/multilingual-e5-TourCSE"
+EMBEDDING_DIM = 384
+
+_model = None
+
+
+def load_model(model_path=MODEL_PATH):
+    """
+    Charge le modèle multilingual-e5-TourCSE (adapter LoRA sur multilingual-e5-small).
+    Nécessite sentence-transformers et peft ; chargé une seule fois par processus.
+    """
+    global _model
+    if _model is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "La recherche sémantique nécessite 'sentence-transformers' et 'peft' "
+                "(pip install sentence-transformers peft)."
+            ) from e
+        _model = SentenceTransformer(model_path, device="cpu")
+    return _model
+
+
+def prepare_text(text):
+    # Format d'entraînement du modèle : préfixe e5 « query: » et minuscules
+    return "query: " + " ".join(str(text).split()).lower()
+
+
+def embed_texts(texts, batch_size=64):
+    """Retourne une matrice float32 (n, 384) de vecteurs normalisés."""
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    model = load_model()
+    vectors = model.encode(
+        [prepare_text(t) for t in texts],
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return vectors.astype(np.float32)
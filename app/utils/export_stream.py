@@ -0,0 +1,132 @@
+"""
+Export des avis en flux : chaque hôtel est lu par paquets depuis un curseur SQL
+et écrit directement dans une entrée d'un ZIP sur disque (CSV, NDJSON ou Parquet).
+Rien n'est accumulé en mémoire au-delà d'un paquet.
+
+Le ZIP est mis en cache dans db/exports/ : tant qu'aucune écriture n'est
+journalisée pour ces hôtels (data_events), le même export (mêmes hôtels,
+même format) est resservi sans être recalculé.
+"""
+import os
+import io
+import re
+import csv
+import json
+import glob
+import hashlib
+import importlib.util
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from utils.predict_topics import SCORE_THRESHOLD, topics_above
+
+EXPORT_DIR = "db/exports"
+FORMATS = {"csv": ".csv", "ndjson": ".ndjson", "parquet": ".parquet"}
+CHUNK_SIZE = 5000
+# Nombre d'exports conservés dans le cache
+MAX_CACHED_EXPORTS = 5
+
+_SQL_TO_ARROW = {"INTEGER": "int64", "REAL": "float64"}
+
+
+def available_formats():
+    """Formats proposés à l'utilisateur : Parquet seulement si pyarrow est installé."""
+    return [fmt for fmt in FORMATS if fmt != "parquet" or importlib.util.find_spec("pyarrow")]
+
+
+def _slug(text):
+    return re.sub(r"[^\w]+", "_", str(text or "")).strip("_").lower()
+
+
+def _with_topics(columns, rows, topics, threshold):
+    """Remplace les blobs de scores par les listes de topics au-dessus du seuil."""
+    pos, neg = columns.index("positive_scores"), columns.index("negative_scores")
+    out = []
+    for row in rows:
+        row = list(row)
+        row[pos] = "|".join(topics_above(row[pos], topics, threshold)) if row[pos] else ""
+        row[neg] = "|".join(topics_above(row[neg], topics, threshold)) if row[neg] else ""
+        out.append(row)
+    return out
+
+
+def _write_csv(stream, columns, chunks):
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+
+def _write_ndjson(stream, columns, chunks):
+    for rows in chunks:
+        lines = (json.dumps(dict(zip(columns, row)), ensure_ascii=False) for row in rows)
+        stream.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+
+def _write_parquet(stream, columns, chunks, column_types):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("L'export Parquet nécessite 'pyarrow' (pip install pyarrow).") from e
+
+    schema = pa.schema([(c, getattr(pa, _SQL_TO_ARROW.get(column_types.get(c), "string"))()) for c in columns])
+    with pq.ParquetWriter(stream, schema) as writer:
+        for rows in chunks:
+            writer.write_table(pa.Table.from_pylist([dict(zip(columns, row)) for row in rows], schema=schema))
+
+
+def _export_hotel(db, zip_file, hotel_id, name, fmt, topics, threshold, column_types):
+    source = db.iter_reviews_for_export(hotel_id, CHUNK_SIZE)
+    source_columns = next(source)
+    chunks = (_with_topics(source_columns, rows, topics, threshold) for rows in source)
+    # Les blobs de scores deviennent des listes de topics (séparés par « | »)
+    columns = [{"positive_scores": "positive_topics", "negative_scores": "negative_topics"}.get(c, c)
+               for c in source_columns]
+    with zip_file.open(f"{hotel_id}_{_slug(name)}{FORMATS[fmt]}", "w", force_zip64=True) as stream:
+        if fmt == "csv":
+            _write_csv(stream, columns, chunks)
+        elif fmt == "ndjson":
+            _write_ndjson(stream, columns, chunks)
+        else:
+            _write_parquet(stream, columns, chunks, column_types)
+
+
+def export_reviews(db, hotels, fmt="csv", threshold=SCORE_THRESHOLD, out_dir=EXPORT_DIR, progress=None):
+    """
+    Exporte les avis de `hotels` ([(hotel_id, name)]) dans un ZIP, un fichier par hôtel.
+    Retourne le chemin du ZIP (celui du cache si ces hôtels n'ont pas changé).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt} ({', '.join(FORMATS)})")
+    os.makedirs(out_dir, exist_ok=True)
+    key = hashlib.sha1(json.dumps(
+        [sorted(int(h) for h, _ in hotels), fmt, threshold, db.data_version([h for h, _ in hotels])]
+    ).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(out_dir, f"reviews_{key}.zip")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    vocabulary = db.get_topic_vocabulary()
+    topics = sorted(vocabulary, key=vocabulary.get)
+    column_types = db.get_column_types("reviews_full")
+    tmp = path + ".tmp"
+    try:
+        with ZipFile(tmp, "w", compression=ZIP_DEFLATED) as zip_file:
+            for i, (hotel_id, name) in enumerate(hotels):
+                _export_hotel(db, zip_file, hotel_id, name, fmt, topics, threshold, column_types)
+                if progress:
+                    progress(i + 1, len(hotels))
+    except BaseException:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+    # Les exports les plus anciens sont supprimés
+    cached = sorted(glob.glob(os.path.join(out_dir, "reviews_*.zip")), key=os.path.getmtime)
+    for old in cached[:-MAX_CACHED_EXPORTS]:
+        os.remove(old)
+    return path
@@ -1,26 +1,50 @@
 import streamlit as st
 import pandas as pd
 
-def filter_hotel_to_select(df_hotels: pd.DataFrame) -> pd.DataFrame:
+EXCLUDED_COLUMNS = ['id', 'url', 'booking_id', 'hotel_staff', 'hotel_services', 'hotel_clean', 'hotel_comfort', 'hotel_value', 'hotel_location', 'hotel_free_wifi']
+
+
+def hotel_facets(df_hotels: pd.DataFrame) -> dict:
+    """
+    Index des filtres de la table des hôtels : pour chaque colonne filtrable,
+    valeurs distinctes et nombre d'hôtels (texte) ou bornes (numérique).
+    Calculé une fois par version des données (voir data_cache.get_hotel_facets).
+    """
+    facets = {}
+    for col in df_hotels.columns:
+        if col in EXCLUDED_COLUMNS:
+            continue
+        if pd.api.types.is_numeric_dtype(df_hotels[col]):
+            values = df_hotels[col].dropna()
+            facets[col] = {"range": (int(values.min()), int(values.max())) if len(values) else (0, 0)}
+        else:
+            counts = df_hotels[col].dropna().astype(str).value_counts()
+            facets[col] = {"counts": counts, "lower": counts.index.str.lower()}
+    return facets
+
+
+def filter_hotel_to_select(df_hotels: pd.DataFrame, facets: dict = None) -> pd.DataFrame:
     """
     Streamlit module to filter hotels for selection.
     Filters all columns except 'id', 'url', 'booking_id' and allows selecting hotels
     with NULL booking_id. Displays filtered table in main page.
+    `facets` (hotel_facets) avoids scanning the table for every widget.
     """
     st.sidebar.subheader("🔎 Filtrage des hôtels")
 
-    filtered_df = df_hotels.copy()
+    facets = facets if facets is not None else hotel_facets(df_hotels)
+    filtered_df = df_hotels
 
-    # Filter by all columns except 'id', 'url', 'booking_id'
-    filterable_columns = [col for col in filtered_df.columns if col not in ['id', 'url', 'booking_id', 'hotel_staff', 'hotel_services', 'hotel_clean', 'hotel_comfort', 'hotel_value', 'hotel_location', 'hotel_free_wifi']]
-    
-    for col in filterable_columns:
-        if filtered_df[col].dtype == object:
+    for col, facet in facets.items():
+        if "counts" in facet:
             search_val = st.sidebar.text_input(f"Recherche par {col}", key=col)
             if search_val:
-                filtered_df = filtered_df[filtered_df[col].str.contains(search_val, case=False, na=False)]
+                # Recherche sur les valeurs distinctes, puis sélection des lignes par égalité
+                matches = facet["counts"].index[facet["lower"].str.contains(search_val.lower(), regex=False)]
+                st.sidebar.caption(f"{int(facet['counts'][matches].sum())} hôtel(s), {len(matches)} valeur(s)")
+                filtered_df = filtered_df[filtered_df[col].isin(matches)]
         else:
-            min_val, max_val = int(filtered_df[col].min()), int(filtered_df[col].max())
+            min_val, max_val = facet["range"]
             selected_range = st.sidebar.slider(f"Filtrer par {col}", min_value=min_val, max_value=max_val,
                                                value=(min_val, max_val), key=col)
             filtered_df = filtered_df[(filtered_df[col] >= selected_range[0]) & (filtered_df[col] <= selected_range[1])]
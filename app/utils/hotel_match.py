@@ -0,0 +1,109 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+# Mots trop fréquents pour distinguer deux hôtels
+STOPWORDS = {"hotel", "the", "le", "la", "les", "de", "du", "des", "et"}
+
+
+def normalize(text):
+    """Minuscules, sans accents ni ponctuation, espaces réduits."""
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    return " ".join(text.split())
+
+
+def match_key(name, town):
+    """Clé de cache stable pour (nom, ville)."""
+    return f"{normalize(name)}|{normalize(town)}"
+
+
+def trigrams(text):
+    tokens = [t for t in normalize(text).split() if t not in STOPWORDS]
+    padded = f"  {' '.join(tokens)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyHotelIndex:
+    """
+    Index trigrammes en mémoire sur les hôtels déjà résolus.
+    Similarité de Dice sur les trigrammes du nom, restreinte à la même ville.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._postings = defaultdict(set)
+
+    def add(self, key, name, town, url=None):
+        grams = trigrams(name)
+        self._entries[key] = (name, normalize(town), url, grams)
+        for g in grams:
+            self._postings[g].add(key)
+
+    def query(self, name, town, threshold=0.85, limit=3, exclude=None):
+        """Retourne [(key, score, name, url)] triés par score décroissant."""
+        grams = trigrams(name)
+        if not grams:
+            return []
+        town = normalize(town)
+        overlap = defaultdict(int)
+        for g in grams:
+            for key in self._postings.get(g, ()):
+                overlap[key] += 1
+
+        results = []
+        for key, shared in overlap.items():
+            if key == exclude:
+                continue
+            other_name, other_town, url, other_grams = self._entries[key]
+            if town and other_town and town != other_town:
+                continue
+            score = 2 * shared / (len(grams) + len(other_grams))
+            if score >= threshold:
+                results.append((key, round(score, 3), other_name, url))
+        results.sort(key=lambda r: r[1], reverse=True)
+        return results[:limit]
+
+
+def plan_resolution(selected_hotels, resolutions, known_hotels=None, skip_resolved=True, threshold=0.85):
+    """
+    Prépare la résolution des URLs sans ouvrir de navigateur.
+
+    Retourne (to_resolve, from_cache, duplicates) :
+    - to_resolve : [(id, name, town)] à chercher sur Booking ;
+    - from_cache : [(id, url, booking_id)] connus dans le cache de résolution ;
+    - duplicates : [(id, name, town, match_name, url, score)] doublons probables
+      d'un hôtel déjà résolu (même ville, nom quasi identique).
+
+    `resolutions` est la table hotel_url_cache, `known_hotels` la table hotels :
+    les hôtels ayant déjà une URL alimentent aussi l'index flou.
+    """
+    index = FuzzyHotelIndex()
+    for key, row in resolutions.iterrows():
+        index.add(key, row["name"], row["town"], row["url"])
+    if known_hotels is not None:
+        for _, row in known_hotels.iterrows():
+            if isinstance(row.get("url"), str) and row.get("url"):
+                index.add(match_key(row["name"], row["town"]), row["name"], row["town"], row["url"])
+
+    to_resolve, from_cache, duplicates = [], [], []
+    for id_, row in selected_hotels.iterrows():
+        name = row["name"] if isinstance(row["name"], str) else ""
+        town = row["town"] if isinstance(row["town"], str) else ""
+        key = match_key(name, town)
+
+        if skip_resolved and isinstance(row.get("url"), str) and row.get("url"):
+            continue
+        if key in resolutions.index:
+            cached = resolutions.loc[key]
+            from_cache.append((int(id_), cached["url"], cached["booking_id"]))
+            continue
+
+        for other_key, score, other_name, url in index.query(name, town, threshold=threshold, limit=1, exclude=key):
+            duplicates.append((int(id_), name, town, other_name, url, score))
+        to_resolve.append((int(id_), name, town))
+
+    return to_resolve, from_cache, duplicates
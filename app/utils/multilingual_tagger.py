@@ -0,0 +1,160 @@
+"""
+Tagueur multilingue local : les avis non français sont projetés avec le modèle
+multilingual-e5-TourCSE et comparés à un prototype par topic.
+
+Les prototypes sont appris sur les avis français déjà tagués par l'API : le
+modèle étant multilingue, un avis anglais ou allemand tombe près du prototype
+du même topic. Les similarités sont calibrées par topic pour que le seuil de
+0.8 garde le même sens que pour les scores de l'API.
+"""
+import os
+import numpy as np
+
+from utils.embedder import embed_texts
+from utils.text_dedup import InferenceDeduper
+from utils.predict_topics import (
+    MODEL_VERSION, SCORE_THRESHOLD, DEFAULT_LANGUAGES, decode_scores
+)
+
+LOCAL_MODEL_VERSION = "tourcse-e5-proto-v1"
+PROTOTYPES_PATH = "db/topic_prototypes.npz"
+# Nombre minimal d'avis positifs pour apprendre le prototype d'un topic
+MIN_EXAMPLES = 5
+
+
+class PrototypeTagger:
+    """
+    topics : noms des topics ; vectors : (n_topics, dim) normalisés ;
+    low / high : similarités ramenées à 0 et 1 (calibration par topic).
+    """
+
+    def __init__(self, topics, vectors, low, high):
+        self.topics = list(topics)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.low = np.asarray(low, dtype=np.float32)
+        self.high = np.asarray(high, dtype=np.float32)
+
+    @classmethod
+    def build(cls, db, reference_version=MODEL_VERSION, sample_size=20_000, threshold=SCORE_THRESHOLD):
+        """Apprend les prototypes sur un échantillon d'avis français tagués par l'API."""
+        rows = db.get_tagged_texts(reference_version, languages=("fr",), limit=sample_size)
+        vocabulary = db.get_topic_vocabulary()
+        topics = sorted(vocabulary, key=vocabulary.get)
+        rows = [row for row in rows if isinstance(row[1], str) and row[1].strip()]
+        if not rows or not topics:
+            raise ValueError("Aucun avis français tagué : lancez d'abord la prédiction via l'API.")
+
+        labels = np.stack([decode_scores(blob, len(topics)) for _, _, blob in rows])
+        labels = labels > int(np.floor(threshold * 255))
+        return cls.from_examples(embed_texts([text for _, text, _ in rows]), labels, topics)
+
+    @classmethod
+    def from_examples(cls, embeddings, labels, topics):
+        """
+        embeddings : (n, dim) des avis de référence ; labels : (n, n_topics) booléens
+        (topic au-dessus du seuil) ; un prototype par topic assez représenté.
+        """
+        kept, vectors, low, high = [], [], [], []
+        for i, topic in enumerate(topics):
+            positives = labels[:, i]
+            if positives.sum() < MIN_EXAMPLES or positives.all():
+                continue
+            prototype = embeddings[positives].mean(axis=0)
+            prototype /= np.linalg.norm(prototype) + 1e-12
+            sims = embeddings @ prototype
+            kept.append(topic)
+            vectors.append(prototype)
+            # 0 = avis non tagués les plus proches, 1 = avis tagués typiques
+            low.append(np.percentile(sims[~positives], 95))
+            high.append(max(np.median(sims[positives]), low[-1] + 1e-3))
+        if not kept:
+            raise ValueError(f"Aucun topic n'a {MIN_EXAMPLES} exemples tagués : prototypes impossibles à apprendre.")
+        return cls(kept, np.stack(vectors), low, high)
+
+    @classmethod
+    def load(cls, path=PROTOTYPES_PATH):
+        data = np.load(path)
+        return cls(data["topics"].tolist(), data["vectors"], data["low"], data["high"])
+
+    def save(self, path=PROTOTYPES_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, topics=np.array(self.topics, dtype=str), vectors=self.vectors, low=self.low, high=self.high)
+
+    def score(self, embeddings):
+        """(n, dim) -> scores (n, n_topics) dans [0, 1]."""
+        sims = np.asarray(embeddings, dtype=np.float32) @ self.vectors.T
+        return np.clip((sims - self.low) / (self.high - self.low), 0, 1)
+
+    def encode(self, embeddings, vocabulary):
+        """
+        Scores au format de review_topics : un blob uint8 indexé par id de topic.
+        Les topics des prototypes absents du vocabulaire sont ignorés.
+        """
+        scores = np.rint(self.score(embeddings) * 255).astype(np.uint8)
+        known = [i for i, t in enumerate(self.topics) if t in vocabulary]
+        columns = np.array([vocabulary[self.topics[i]] for i in known], dtype=np.int64)
+        matrix = np.zeros((len(scores), len(vocabulary)), dtype=np.uint8)
+        matrix[:, columns] = scores[:, known]
+        return [row.tobytes() for row in matrix]
+
+
+def get_tagger(db, path=PROTOTYPES_PATH, rebuild=False):
+    """Charge les prototypes sauvegardés, ou les apprend puis les sauvegarde."""
+    if not rebuild and os.path.exists(path):
+        return PrototypeTagger.load(path)
+    tagger = PrototypeTagger.build(db)
+    tagger.save(path)
+    return tagger
+
+
+def tag_pending(db, tagger=None, api_languages=DEFAULT_LANGUAGES, api_version=MODEL_VERSION,
+                batch_size=2000, max_reviews=None, progress=None):
+    """
+    Tague localement les côtés d'avis en attente dont la langue n'est pas servie par l'API.
+    Une prédiction de l'API (`api_version`, ex. via --all-languages) n'est jamais
+    remplacée par le tagueur local : review_topics n'a qu'une ligne par côté d'avis.
+    Les lignes arrivent triées par langue : chaque langue est encodée en un seul lot
+    homogène, et un texte déjà vu (même texte canonique ou quasi-doublon) n'est encodé qu'une fois.
+    Retourne (côtés traités, textes encodés).
+    """
+    from itertools import groupby
+
+    if tagger is None:
+        tagger = get_tagger(db)
+    vocabulary = db.get_topic_vocabulary()
+    dedup = InferenceDeduper(db, LOCAL_MODEL_VERSION)
+    processed, encoded = 0, 0
+
+    while max_reviews is None or processed < max_reviews:
+        pending = db.get_pending_predictions(
+            LOCAL_MODEL_VERSION, limit=batch_size, exclude_languages=api_languages,
+            keep_versions=(api_version,)
+        )
+        if not pending:
+            break
+
+        rows = []
+        for _, group in groupby(pending, key=lambda row: row[3]):
+            items, to_encode = [], {}
+            for review_id, side, text, _ in group:
+                digest, signature = dedup.key(text)
+                source = dedup.lookup(digest, signature)
+                if source is None:
+                    dedup.reserve(digest, signature)
+                    to_encode[digest] = text
+                    source = digest
+                items.append((review_id, side, digest, signature, source))
+            if to_encode:
+                embeddings = embed_texts(list(to_encode.values()))
+                for digest, blob in zip(to_encode, tagger.encode(embeddings, vocabulary)):
+                    dedup.remember(digest, blob)
+                encoded += len(to_encode)
+            rows += [(review_id, side, digest, LOCAL_MODEL_VERSION, dedup.blob(source), signature)
+                     for review_id, side, digest, signature, source in items]
+
+        db.save_review_topics(rows)
+        processed += len(rows)
+        if progress:
+            progress(processed, encoded)
+
+    return processed, encoded
@@ -0,0 +1,269 @@
+"""
+Planification de la pagination GraphQL des avis.
+
+La première réponse donne `reviewsCount` : toutes les positions (skip) sont
+calculées d'emblée, ce qui permet de récupérer les pages dans n'importe quel
+ordre, y compris en parallèle. À la fin, le nombre de review_url distincts est
+comparé à `reviewsCount` et les pages manquantes ou incomplètes sont redemandées.
+
+Pour les gros hôtels, l'espace des avis est découpé en tranches (filtres de
+langue, type de client ou note exposés par ReviewList, combinés si une tranche
+dépasse deux fois le plafond, puis deux tris opposés pour les tranches trop
+longues) : chaque tranche reste sous le plafond de pagination et toutes sont
+récupérées dans le même pool, dédoublonnées sur review_url.
+"""
+import copy
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Nombre maximal de passes de rattrapage après la passe principale
+MAX_REFETCH_ROUNDS = 3
+
+# Au-delà, un seul tri ne se pagine pas de façon fiable : on découpe en tranches
+SLICE_ABOVE = 1000
+
+# Tailles de page essayées sur la première requête, de la plus grande à la plus petite
+LIMIT_CANDIDATES = (100, 50)
+
+# Facette de la réponse -> champ de `input.filters` de ReviewList
+SLICE_FILTERS = {
+    "languageFilter": "languages",
+    "customerTypeFilter": "customerType",
+    "reviewScoreFilter": "scoreFilter",
+}
+
+# Tris opposés : les deux extrémités d'une tranche trop longue
+SORTER_PAIR = ("NEWEST_FIRST", "OLDEST_FIRST")
+
+
+def plan_offsets(total, page_size, start=0):
+    """Positions de toutes les pages couvrant [start, total)."""
+    return list(range(start, max(total, 0), page_size))
+
+
+def page_payload(template, booking_id, skip, limit, sorter=None, filters=None):
+    """Copie profonde du payload : le modèle partagé n'est jamais modifié."""
+    payload = copy.deepcopy(template)
+    payload['variables']['input']['hotelId'] = int(booking_id)
+    payload['variables']['input']['skip'] = skip
+    payload['variables']['input']['limit'] = limit
+    if sorter:
+        payload['variables']['input']['sorter'] = sorter
+    if filters:
+        payload['variables']['input'].setdefault('filters', {}).update(filters)
+    return payload
+
+
+def review_list(response):
+    return (response or {}).get('data', {}).get('reviewListFrontend') or {}
+
+
+def probe_limit(fetch_first, default, state, candidates=LIMIT_CANDIDATES):
+    """
+    Essaie les plus grandes tailles de page sur la première requête d'un hôtel.
+    fetch_first(limit) -> réponse ; la réponse retenue sert de première page, le
+    sondage ne coûte donc une requête de plus qu'en cas de refus. `state` (dict)
+    garde la taille prouvée et les tailles refusées d'un hôtel à l'autre.
+    Retourne (limit, réponse).
+    """
+    if state.get('limit'):
+        return state['limit'], fetch_first(state['limit'])
+    rejected = state.setdefault('rejected', set())
+    for limit in candidates:
+        if limit <= default or limit in rejected:
+            continue
+        try:
+            response = fetch_first(limit)
+        except Exception:
+            rejected.add(limit)
+            continue
+        data = review_list(response)
+        cards = data.get('reviewCard')
+        if cards is None:
+            rejected.add(limit)
+        elif len(cards) == limit:
+            state['limit'] = limit
+            return limit, response
+        elif len(cards) == data.get('reviewsCount'):
+            # Tout l'hôtel tient sur une page : ni preuve ni refus
+            return limit, response
+        else:
+            # Page tronquée : le serveur plafonne en dessous de `limit`
+            rejected.add(limit)
+    return default, fetch_first(default)
+
+
+class Slice:
+    """Sous-ensemble des avis d'un hôtel : un tri, des filtres, et la plage [start, stop)."""
+
+    def __init__(self, index, sorter, filters, count, start=0, stop=None):
+        self.index = index
+        self.sorter = sorter
+        self.filters = filters or {}
+        self.count = count
+        self.start = start
+        self.stop = count if stop is None else stop
+
+    @property
+    def label(self):
+        """Clé de cache : le tri, suivi des filtres éventuels."""
+        parts = [self.sorter or ""] + [f"{k}={v}" for k, v in sorted(self.filters.items())]
+        return "|".join(parts)
+
+    def offsets(self, page_size):
+        return plan_offsets(self.stop, page_size, start=self.start)
+
+
+def _best_facet(data, total, exclude=()):
+    """
+    Facette qui partitionne le mieux les `total` avis de `data` (somme des comptes
+    la plus proche de total, puis plus petite tranche maximale), hors champs de `exclude`.
+    Retourne (champ de filtre, [(valeur, compte)]) ou None.
+    """
+    best = None
+    for facet, field in SLICE_FILTERS.items():
+        if field in exclude:
+            continue
+        values = [(f.get('value'), f.get('count') or 0) for f in data.get(facet) or []]
+        # L'entrée « toutes » couvre déjà toute la tranche
+        values = [(v, c) for v, c in values if v and 0 < c < total]
+        if not values:
+            continue
+        score = (abs(total - sum(c for _, c in values)), max(c for _, c in values))
+        if best is None or score < best[0]:
+            best = (score, field, values)
+    return None if best is None else best[1:]
+
+
+def plan_slices(data, sorter, cap=SLICE_ABOVE, probe=None):
+    """
+    Découpe un hôtel en tranches à partir des facettes de la première réponse.
+    Une tranche plus longue que `cap` est lue par ses deux extrémités avec deux tris
+    opposés, ce qui couvre au plus 2 x cap avis. Au-delà, si `probe(filtres)` est
+    fourni (première page de la tranche filtrée, pour ses facettes), la tranche est
+    redécoupée sur une autre facette (ex. langue x note) jusqu'à tenir en deux tris.
+    Le milieu d'une tranche impossible à redécouper reste hors d'atteinte : voir uncovered().
+    """
+    total = data.get('reviewsCount', 0)
+    if total <= cap:
+        return [Slice(0, sorter, None, total)]
+
+    available = {s.get('value') for s in data.get('sorters') or []}
+    two_ends = all(s in available for s in SORTER_PAIR)
+    slices = []
+
+    def split(filters, count, facets=None):
+        choice = None
+        if count > 2 * cap:
+            if facets is None and probe is not None:
+                try:
+                    facets = probe(filters)
+                except Exception:
+                    # Facettes indisponibles : la tranche est lue par ses deux extrémités
+                    facets = None
+            if facets:
+                choice = _best_facet(facets, count, exclude=filters or {})
+        if choice is not None:
+            field, values = choice
+            for value, sub_count in values:
+                split({**(filters or {}), field: value}, sub_count)
+        elif count > cap and two_ends:
+            slices.append(Slice(len(slices), SORTER_PAIR[0], filters, count, stop=cap))
+            slices.append(Slice(len(slices), SORTER_PAIR[1], filters, count, stop=min(count - cap, cap)))
+        else:
+            slices.append(Slice(len(slices), sorter, filters, count))
+
+    choice = _best_facet(data, total)
+    if choice is None:
+        split(None, total, data)
+    else:
+        field, values = choice
+        for value, count in values:
+            split({field: value}, count)
+    return slices
+
+
+def uncovered(slices):
+    """
+    Avis qu'aucune tranche ne peut atteindre : une tranche de plus de 2 x cap sans
+    autre facette pour la redécouper n'est lue que par ses deux extrémités.
+    """
+    covered = {}
+    for s in slices:
+        key = tuple(sorted(s.filters.items()))
+        count, stop = covered.get(key, (s.count, 0))
+        covered[key] = (count, stop + s.stop - s.start)
+    return sum(max(count - stop, 0) for count, stop in covered.values())
+
+
+def fetch_pages(keys, fetch, workers=1):
+    """
+    Appelle fetch(clé) pour chaque clé et génère (clé, réponse ou exception)
+    dans l'ordre d'arrivée. Le rythme est donné par le limiteur utilisé dans `fetch`.
+    """
+    if workers <= 1:
+        for key in keys:
+            try:
+                yield key, fetch(key)
+            except Exception as e:
+                yield key, e
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch, key): key for key in keys}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+
+class PageCollector:
+    """
+    Suivi des review_url reçus par page (clé = (tranche, skip)), pour vérifier la
+    complétude et ne transmettre que les avis pas encore vus.
+    """
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+        self.pages = {}  # (slice index, skip) -> set(review_url)
+        self.failed = set()
+        self.review_urls = set()
+
+    def add(self, key, cards):
+        """Enregistre une page ; retourne ses cartes dont le review_url est nouveau."""
+        urls = {card.get('reviewUrl') for card in cards if card.get('reviewUrl')}
+        self.pages[key] = urls
+        self.failed.discard(key)
+        new_cards = [card for card in cards if card.get('reviewUrl') not in self.review_urls]
+        self.review_urls |= urls
+        return new_cards
+
+    def fail(self, key):
+        self.failed.add(key)
+
+    def is_complete(self, total):
+        return len(self.review_urls) >= total
+
+    def missing(self, slices, total):
+        """
+        Pages à redemander : en échec, absentes, ou plus courtes que prévu.
+        Si toutes les pages sont pleines mais qu'il manque des avis, la liste a
+        bougé pendant le scraping (nouvel avis en tête) : on redemande les pages
+        dont le contenu recoupe une autre page de la même tranche, ainsi que la suivante.
+        """
+        missing = set(self.failed)
+        for s in slices:
+            for skip in s.offsets(self.page_size):
+                expected = min(self.page_size, s.count - skip)
+                key = (s.index, skip)
+                if key not in self.pages or len(self.pages[key]) < expected:
+                    missing.add(key)
+        if not missing and not self.is_complete(total):
+            for s in slices:
+                seen = {}
+                for skip in s.offsets(self.page_size):
+                    for url in self.pages.get((s.index, skip), ()):
+                        if url in seen and seen[url] != skip:
+                            missing.update({(s.index, skip), (s.index, skip + self.page_size)})
+                        seen.setdefault(url, skip)
+        bounds = {s.index: s.stop for s in slices}
+        return sorted(k for k in missing if k[1] < bounds.get(k[0], 0))
@@ -0,0 +1,139 @@
+"""
+Étape de prédiction incrémentale : ne tague que les côtés d'avis nouveaux,
+modifiés (trigger reviews_text_changed) ou prédits par une autre version du modèle.
+
+Les langues de DEFAULT_LANGUAGES passent par l'API ; les autres sont taguées
+localement, par lots homogènes par langue (voir utils/multilingual_tagger.py).
+Avec --all-languages, l'API remplace les prédictions du tagueur local ; le
+tagueur local ne remplace jamais une prédiction de l'API.
+
+Depuis app/ :
+    python -m utils.predict_topics [--model-version tourcse-v1] [--all-languages] [--rebuild-prototypes]
+"""
+import numpy as np
+
+from utils.text_dedup import InferenceDeduper
+
+API_URL = "http://raspberrypi:8000/predict"
+MODEL_VERSION = "tourcse-v1"
+SCORE_THRESHOLD = 0.8
+DEFAULT_LANGUAGES = ("fr",)
+
+
+def encode_scores(predictions, vocabulary):
+    """[{'topic', 'score'}] -> blob uint8 indexé par id de topic (0..255)."""
+    vector = np.zeros(len(vocabulary), dtype=np.uint8)
+    for p in predictions:
+        vector[vocabulary[p["topic"]]] = min(max(round(p["score"] * 255), 0), 255)
+    return vector.tobytes()
+
+
+def decode_scores(blob, n_topics):
+    """Blob -> vecteur uint8 de longueur n_topics (les topics ajoutés depuis valent 0)."""
+    vector = np.zeros(n_topics, dtype=np.uint8)
+    if blob:
+        values = np.frombuffer(blob, dtype=np.uint8)[:n_topics]
+        vector[:len(values)] = values
+    return vector
+
+
+def topics_above(blob, topics, threshold=SCORE_THRESHOLD):
+    """Liste des topics dont le score dépasse `threshold` (même règle que predict.py)."""
+    vector = decode_scores(blob, len(topics))
+    return [topics[i] for i in np.nonzero(vector > int(np.floor(threshold * 255)))[0]]
+
+
+def call_predict_api(text, session, api_url=API_URL, timeout=10):
+    """Retourne la liste [{'topic', 'score'}] ou None en cas d'erreur (l'avis restera en attente)."""
+    try:
+        response = session.post(api_url, json={"input": text}, timeout=timeout)
+        if response.status_code == 200:
+            return response.json()
+        print(f"⚠️ API error {response.status_code} for review {text}")
+    except Exception as e:
+        print(f"⚠️ Request error for review {text}: {e}")
+    return None
+
+
+def predict_pending(db, model_version=MODEL_VERSION, languages=DEFAULT_LANGUAGES,
+                    batch_size=500, max_reviews=None, api_url=API_URL, progress=None):
+    """
+    Tague les côtés d'avis en attente et écrit le résultat ligne par ligne dans review_topics.
+    Un texte déjà prédit pour cette version (même texte canonique, ou quasi-doublon)
+    n'est pas renvoyé à l'API : sa prédiction est recopiée.
+    Retourne (côtés traités, appels API).
+    """
+    import requests
+
+    session = requests.Session()
+    vocabulary = db.get_topic_vocabulary()
+    dedup = InferenceDeduper(db, model_version)
+    processed, api_calls = 0, 0
+    failed = set()
+
+    while max_reviews is None or processed < max_reviews:
+        pending = db.get_pending_predictions(model_version, languages, limit=batch_size + len(failed))
+        pending = [row for row in pending if (row[0], row[1]) not in failed]
+        if not pending:
+            break
+
+        rows = []
+        for review_id, side, text, _ in pending:
+            digest, signature = dedup.key(text)
+            source = dedup.lookup(digest, signature)
+            if source is None:
+                predictions = call_predict_api(text, session, api_url)
+                api_calls += 1
+                if predictions is None:
+                    failed.add((review_id, side))
+                    continue
+                new_topics = [p["topic"] for p in predictions if p["topic"] not in vocabulary]
+                if new_topics:
+                    vocabulary = db.add_topics(new_topics)
+                dedup.reserve(digest, signature)
+                dedup.remember(digest, encode_scores(predictions, vocabulary))
+                source = digest
+            rows.append((review_id, side, digest, model_version, dedup.blob(source), signature))
+
+        db.save_review_topics(rows)
+        processed += len(rows)
+        if progress:
+            progress(processed, api_calls)
+        if not rows:
+            break
+
+    session.close()
+    return processed, api_calls
+
+
+if __name__ == "__main__":
+    import argparse
+    from sqlite.SQLiteSingleton import SQLiteSingleton
+
+    parser = argparse.ArgumentParser(description="Tague les avis nouveaux ou obsolètes.")
+    parser.add_argument("--db", default="db/booking_reviews.db")
+    parser.add_argument("--model-version", default=MODEL_VERSION)
+    parser.add_argument("--all-languages", action="store_true",
+                        help="envoie toutes les langues à l'API au lieu du tagueur local")
+    parser.add_argument("--rebuild-prototypes", action="store_true")
+    parser.add_argument("--max-reviews", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SQLiteSingleton(args.db)
+    processed, api_calls = predict_pending(
+        db, model_version=args.model_version,
+        languages=None if args.all_languages else DEFAULT_LANGUAGES,
+        max_reviews=args.max_reviews,
+        progress=lambda n, calls: print(f"{n} côtés d'avis tagués ({calls} appels API)"),
+    )
+    print(f"✅ {processed} côtés d'avis tagués, {api_calls} appels API.")
+
+    if not args.all_languages:
+        from utils.multilingual_tagger import get_tagger, tag_pending
+
+        processed, encoded = tag_pending(
+            db, tagger=get_tagger(db, rebuild=args.rebuild_prototypes), api_version=args.model_version,
+            max_reviews=args.max_reviews,
+            progress=lambda n, k: print(f"{n} côtés d'avis tagués localement ({k} textes encodés)"),
+        )
+        print(f"✅ {processed} côtés d'avis non français tagués, {encoded} textes encodés.")
@@ -0,0 +1,27 @@
+import time
+import random
+import threading
+
+
+class RateLimiter:
+    """
+    Limiteur de débit simple : au plus `rate` requêtes par seconde,
+    avec une gigue aléatoire pour garder un rythme « humain ».
+    Avec N workers, chacun reçoit rate / N.
+    Partageable entre threads : chaque appel réserve son créneau sous verrou.
+    """
+
+    def __init__(self, rate=0.5, jitter=0.5):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.jitter = jitter
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now) + random.uniform(0, self.jitter * self.interval)
+            self._next = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import datetime
+
+try:
+    import zstandard
+except ImportError:  # zstd optionnel, gzip sinon
+    zstandard = None
+import gzip
+
+DEFAULT_CACHE_DIR = "db/raw_responses"
+
+
+def _compress(raw):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(raw), "zst"
+    return gzip.compress(raw, compresslevel=6), "gz"
+
+
+def _decompress(blob, codec):
+    if codec == "zst":
+        if zstandard is None:
+            raise RuntimeError("Le paquet 'zstandard' est requis pour relire ce cache.")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+class ResponseCache:
+    """
+    Stockage des réponses GraphQL brutes, compressées (zstd si disponible, sinon gzip).
+
+    - les objets sont adressés par contenu (sha256 du JSON brut) : une page identique
+      re-téléchargée n'est stockée qu'une fois ;
+    - un index SQLite associe (booking_id, sorter, skip, fetch_date) -> objet ;
+    - `evict()` applique la durée de vie (ttl_days) puis la taille max (max_bytes),
+      en supprimant les entrées les plus anciennes d'abord.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, ttl_days=180, max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.ttl_days = ttl_days
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, "index.db"), timeout=30, check_same_thread=False)
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS raw_responses (
+            booking_id INTEGER NOT NULL,
+            sorter TEXT NOT NULL,
+            skip INTEGER NOT NULL,
+            fetch_date TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            codec TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (booking_id, sorter, skip, fetch_date)
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_raw_created ON raw_responses(created_at)")
+        # Déduplication par contenu (put) et suppression par objet (evict)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_raw_digest ON raw_responses(digest)")
+        self.conn.commit()
+
+    def _object_path(self, digest, codec):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.json.{codec}")
+
+    def put(self, booking_id, sorter, skip, response, fetch_date=None):
+        """Stocke une réponse (dict JSON) et retourne son empreinte."""
+        fetch_date = fetch_date or datetime.date.today().isoformat()
+        raw = json.dumps(response, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+
+        row = self.conn.execute(
+            "SELECT codec, size FROM raw_responses WHERE digest = ? LIMIT 1", (digest,)
+        ).fetchone()
+        if row:
+            codec, size = row
+        else:
+            blob, codec = _compress(raw)
+            size = len(blob)
+            path = self._object_path(digest, codec)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+
+        self.conn.execute("""
+            INSERT OR REPLACE INTO raw_responses
+                (booking_id, sorter, skip, fetch_date, digest, codec, size, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (int(booking_id), sorter, int(skip), fetch_date, digest, codec, size, time.time()))
+        self.conn.commit()
+        return digest
+
+    def _load(self, digest, codec):
+        with open(self._object_path(digest, codec), "rb") as f:
+            return json.loads(_decompress(f.read(), codec))
+
+    def get(self, booking_id, sorter, skip, fetch_date=None):
+        """Retourne la réponse la plus récente (ou celle de fetch_date), None si absente."""
+        sql = "SELECT digest, codec FROM raw_responses WHERE booking_id = ? AND sorter = ? AND skip = ?"
+        params = [int(booking_id), sorter, int(skip)]
+        if fetch_date:
+            sql += " AND fetch_date = ?"
+            params.append(fetch_date)
+        row = self.conn.execute(sql + " ORDER BY fetch_date DESC LIMIT 1", params).fetchone()
+        return self._load(*row) if row else None
+
+    def fetch_dates(self, booking_id):
+        rows = self.conn.execute(
+            "SELECT DISTINCT fetch_date FROM raw_responses WHERE booking_id = ? ORDER BY fetch_date DESC",
+            (int(booking_id),)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def iter_pages(self, booking_id, fetch_date=None):
+        """
+        Itère (sorter, skip, response) pour un hôtel, page par page.
+        Par défaut, rejoue la collecte la plus récente.
+        """
+        if fetch_date is None:
+            dates = self.fetch_dates(booking_id)
+            if not dates:
+                return
+            fetch_date = dates[0]
+        rows = self.conn.execute("""
+            SELECT sorter, skip, digest, codec FROM raw_responses
+            WHERE booking_id = ? AND fetch_date = ?
+            ORDER BY sorter, skip
+        """, (int(booking_id), fetch_date)).fetchall()
+        for sorter, skip, digest, codec in rows:
+            try:
+                yield sorter, skip, self._load(digest, codec)
+            except FileNotFoundError:
+                continue
+
+    def cached_booking_ids(self):
+        return [r[0] for r in self.conn.execute("SELECT DISTINCT booking_id FROM raw_responses")]
+
+    def total_size(self):
+        row = self.conn.execute("""
+            SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM raw_responses)
+        """).fetchone()
+        return row[0]
+
+    def evict(self):
+        """Applique TTL puis plafond de taille. Retourne le nombre d'entrées supprimées."""
+        removed = 0
+        if self.ttl_days:
+            cutoff = time.time() - self.ttl_days * 86400
+            removed += self.conn.execute("DELETE FROM raw_responses WHERE created_at < ?", (cutoff,)).rowcount
+
+        if self.max_bytes:
+            total = self.total_size()
+            if total > self.max_bytes:
+                rows = self.conn.execute("""
+                    SELECT digest, MAX(created_at) AS last_used, MAX(size) FROM raw_responses
+                    GROUP BY digest ORDER BY last_used
+                """).fetchall()
+                for digest, _, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    removed += self.conn.execute("DELETE FROM raw_responses WHERE digest = ?", (digest,)).rowcount
+                    total -= size
+        self.conn.commit()
+        self._remove_orphans()
+        return removed
+
+    def _remove_orphans(self):
+        live = {r[0] for r in self.conn.execute("SELECT DISTINCT digest FROM raw_responses")}
+        objects_dir = os.path.join(self.root, "objects")
+        for sub in os.listdir(objects_dir):
+            sub_dir = os.path.join(objects_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                if name.split(".", 1)[0] not in live:
+                    os.remove(os.path.join(sub_dir, name))
+
+    def close(self):
+        self.conn.close()
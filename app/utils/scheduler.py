@@ -0,0 +1,135 @@
+"""
+Planification des collectes par hôtel : fraîcheur et rythme d'arrivée des avis.
+
+Le rythme de chaque hôtel (avis / jour) est estimé à partir des `reviewed_date`
+stockés sur une fenêtre glissante, lissé vers son rythme historique pour les
+hôtels peu observés. Le nombre d'avis attendus depuis la dernière collecte,
+rapporté au coût estimé en requêtes, donne la priorité ; les hôtels sont pris
+dans cet ordre tant que le budget de requêtes du jour le permet.
+
+Utilisation en ligne de commande (depuis app/) :
+    python -m utils.scheduler [--budget 500] [--db db/booking_reviews.db]
+"""
+import os
+import argparse
+import datetime
+import math
+
+from utils.booking_reviews import MAX_LIMIT
+
+# Requêtes GraphQL autorisées par jour (toutes collectes confondues)
+DAILY_BUDGET = 500
+# Fenêtre d'estimation du rythme
+WINDOW_DAYS = 180
+# Poids du rythme historique, en jours d'observation (lissage des petits hôtels)
+PRIOR_DAYS = 30
+# Pas de nouvelle collecte avant ce délai
+MIN_INTERVAL_DAYS = 1
+# En dessous, la collecte ne rapporterait probablement rien
+MIN_EXPECTED_REVIEWS = 1.0
+
+
+def local_timezone():
+    """Fuseau local avec ses règles d'heure d'été : TZ, sinon /etc/localtime, sinon le décalage actuel."""
+    import zoneinfo
+
+    name = os.environ.get("TZ", "").lstrip(":")
+    try:
+        if name:
+            return zoneinfo.ZoneInfo(name)
+        with open("/etc/localtime", "rb") as f:
+            return zoneinfo.ZoneInfo.from_file(f, key="localtime")
+    except (OSError, ValueError, zoneinfo.ZoneInfoNotFoundError):
+        return datetime.datetime.now().astimezone().tzinfo
+
+
+def local_to_utc(values):
+    """Dates en heure locale (reviewed_date, voir extract_review_info) -> dates UTC naïves, comme scraped_at."""
+    import pandas as pd
+
+    dates = pd.Series(pd.to_datetime(values, errors="coerce"))
+    return (dates.dt.tz_localize(local_timezone(), ambiguous="NaT", nonexistent="shift_forward")
+            .dt.tz_convert("UTC").dt.tz_localize(None))
+
+
+def estimate_rates(activity, now, window_days=WINDOW_DAYS, prior_days=PRIOR_DAYS):
+    """
+    Rythme lissé (avis / jour) : (récents + rythme historique * prior) / (fenêtre + prior).
+    Le rythme historique (tous les avis stockés sur leur période) évite un rythme
+    nul pour un hôtel calme ou une base qui n'a pas été collectée depuis longtemps.
+    """
+    import pandas as pd
+
+    first = pd.to_datetime(activity["first_review_date"], errors="coerce")
+    span_days = ((now - first).dt.total_seconds() / 86400).clip(lower=window_days)
+    lifetime_rate = (activity["reviews"].fillna(0) / span_days).fillna(0)
+    recent = activity["recent_reviews"].fillna(0)
+    return (recent + lifetime_rate * prior_days) / (window_days + prior_days)
+
+
+def estimate_cost(activity):
+    """Requêtes d'une collecte : celles de la dernière, sinon une par page d'avis stockés."""
+    import pandas as pd
+
+    pages = activity["reviews"].fillna(0).map(lambda n: 1 + math.ceil(n / MAX_LIMIT))
+    return pd.to_numeric(activity["last_requests"], errors="coerce").fillna(pages).clip(lower=1).astype(int)
+
+
+def schedule(db, budget=DAILY_BUDGET, now=None, window_days=WINDOW_DAYS,
+             min_interval_days=MIN_INTERVAL_DAYS, min_expected=MIN_EXPECTED_REVIEWS):
+    """
+    Hôtels dus, par priorité décroissante, dans la limite du budget restant du jour.
+    Même format que get_all_hotels (index = id) avec les colonnes de planification :
+    rate, days_since, expected_new, cost, priority. `now` : date UTC naïve.
+    """
+    import pandas as pd
+
+    now = now or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    activity = db.get_review_activity(window_days)
+    activity = activity[activity["booking_id"].notna() & (activity["booking_id"] != "")]
+    if activity.empty:
+        return activity
+    # Tout en UTC : scraped_at l'est (CURRENT_TIMESTAMP), reviewed_date est en heure locale
+    activity = activity.assign(first_review_date=local_to_utc(activity["first_review_date"]),
+                               last_review_date=local_to_utc(activity["last_review_date"]))
+
+    # Jamais collecté : le dernier avis stocké donne une borne de fraîcheur
+    last_seen = pd.to_datetime(activity["last_scraped_at"].fillna(activity["last_review_date"]), errors="coerce")
+    days_since = (now - last_seen).dt.total_seconds() / 86400
+
+    activity = activity.assign(rate=estimate_rates(activity, now, window_days), days_since=days_since,
+                               cost=estimate_cost(activity))
+    activity["expected_new"] = activity["rate"] * activity["days_since"]
+    # Hôtel sans aucune donnée : prioritaire, rien ne permet d'estimer son rythme
+    activity.loc[last_seen.isna(), ["expected_new", "days_since"]] = math.inf
+    activity["priority"] = activity["expected_new"] / activity["cost"]
+
+    due = activity[(activity["days_since"] >= min_interval_days) & (activity["expected_new"] >= min_expected)]
+    due = due.sort_values("priority", ascending=False)
+
+    remaining = budget - db.requests_spent()
+    keep = []
+    for hotel_id, cost in due["cost"].items():
+        if cost <= remaining:
+            keep.append(hotel_id)
+            remaining -= cost
+    return due.loc[keep]
+
+
+def main(argv=None):
+    from sqlite.SQLiteSingleton import SQLiteSingleton
+
+    parser = argparse.ArgumentParser(description="Hôtels à collecter aujourd'hui, par priorité.")
+    parser.add_argument("--db", default="db/booking_reviews.db")
+    parser.add_argument("--budget", type=int, default=DAILY_BUDGET, help="requêtes par jour")
+    args = parser.parse_args(argv)
+
+    db = SQLiteSingleton(args.db)
+    due = schedule(db, budget=args.budget)
+    print(f"Budget restant : {args.budget - db.requests_spent()} requêtes ; {len(due)} hôtel(s) dus.")
+    if not due.empty:
+        print(due[["name", "town", "rate", "days_since", "expected_new", "cost"]].round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
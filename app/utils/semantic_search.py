@@ -0,0 +1,100 @@
+import numpy as np
+
+from utils.ann_index import IVFIndex, make_key, split_key, date_to_day
+from utils.embedder import embed_texts
+
+SIDES = ("positive_text", "negative_text")
+
+
+def _side_vectors(rows):
+    """Clés, textes, hôtels et jours des côtés non vides de lignes (id, hotel_id, date, positif, négatif)."""
+    keys, texts, hotels, days = [], [], [], []
+    for review_id, hotel_id, reviewed_date, *side_texts in rows:
+        for side, text in enumerate(side_texts):
+            if isinstance(text, str) and text.strip():
+                keys.append(make_key(review_id, side))
+                texts.append(text)
+                hotels.append(hotel_id)
+                days.append(date_to_day(reviewed_date))
+    return keys, texts, hotels, days
+
+
+def index_new_reviews(db, index=None, batch_size=1000, progress=None):
+    """
+    Ajoute à l'index les avis insérés depuis la dernière indexation (id croissant),
+    puis ré-indexe les avis dont le texte a changé (file embedding_queue, alimentée
+    par un trigger) : leurs anciens vecteurs sont remplacés.
+    Retourne le nombre de vecteurs ajoutés.
+    """
+    if index is None:
+        index = IVFIndex()
+    added = 0
+    while True:
+        rows = db.get_reviews_after(index.meta["last_review_id"], limit=batch_size)
+        if not rows:
+            break
+        keys, texts, hotels, days = _side_vectors(rows)
+        vectors = embed_texts(texts)
+        index.add(keys, vectors, hotels, days, last_review_id=rows[-1][0])
+        added += len(keys)
+        if progress:
+            progress(added)
+
+    # Les avis pas encore indexés seront lus avec leur texte actuel
+    db.clear_reindex_queue(above_review_id=index.meta["last_review_id"])
+    while True:
+        rows = db.get_reviews_to_reindex(index.meta["last_review_id"], limit=batch_size)
+        if not rows:
+            break
+        review_ids = [row[0] for row in rows]
+        keys, texts, hotels, days = _side_vectors(rows)
+        # Les deux côtés sont obsolètes, y compris un côté vidé (sans nouveau vecteur)
+        stale = make_key(np.repeat(review_ids, 2), np.tile([0, 1], len(review_ids)))
+        index.add(keys, embed_texts(texts) if texts else [], hotels, days, stale_keys=stale)
+        db.clear_reindex_queue(review_ids)
+        added += len(keys)
+        if progress:
+            progress(added)
+
+    if index.needs_training():
+        index.train()
+    return added
+
+
+def search_reviews(db, query, index=None, k=20, nprobe=8, hotel_ids=None, date_from=None, date_to=None):
+    """
+    Avis les plus proches sémantiquement de `query`.
+    Retourne un DataFrame (un côté d'avis par ligne) trié par similarité.
+    """
+    import pandas as pd
+
+    if index is None:
+        index = IVFIndex()
+    vector = embed_texts([query])[0]
+    hits = index.search(
+        vector, k=k, nprobe=nprobe, hotel_ids=hotel_ids,
+        day_from=date_to_day(str(date_from)) if date_from else None,
+        day_to=date_to_day(str(date_to)) if date_to else None,
+    )
+    if not hits:
+        return pd.DataFrame()
+
+    review_ids = sorted({split_key(key)[0] for key, _ in hits})
+    reviews = db.get_reviews_by_ids(review_ids)
+    results = []
+    for key, score in hits:
+        review_id, side = split_key(key)
+        if review_id not in reviews.index:
+            continue
+        row = reviews.loc[review_id]
+        results.append({
+            "similarity": round(score, 3),
+            "sentiment": "Positive" if side == 0 else "Negative",
+            "text": row[SIDES[side]],
+            "hotel_name": row["hotel_name"],
+            "hotel_town": row["hotel_town"],
+            "reviewed_date": row["reviewed_date"],
+            "review_score": row["review_score"],
+            "review_id": review_id,
+        })
+    return pd.DataFrame(results)
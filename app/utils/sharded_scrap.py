@@ -0,0 +1,172 @@
+import multiprocessing as mp
+import queue
+import traceback
+
+from utils.rate_limiter import RateLimiter
+
+DEFAULT_DB_FILE = "db/booking_reviews.db"
+
+
+def partition_hotels(items, n_workers):
+    """Répartit les items en n_workers lots (round-robin)."""
+    n_workers = max(1, min(n_workers, len(items)))
+    return [items[i::n_workers] for i in range(n_workers)]
+
+
+class _WriterProxy:
+    """Envoie chaque appel `db.<méthode>(...)` au processus écrivain, étiqueté par le worker."""
+
+    def __init__(self, write_queue, worker_id):
+        self._queue = write_queue
+        self._worker_id = worker_id
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self._queue.put(("write", self._worker_id, name, args, kwargs))
+        return call
+
+
+class WorkerContext:
+    """Ressources propres à un worker : session HTTP, part du débit, proxy d'écriture."""
+
+    def __init__(self, worker_id, limiter, db, options=None):
+        self.worker_id = worker_id
+        self.options = options or {}
+        self.limiter = limiter
+        self.db = db
+        self.cache = {}
+        self._session = None
+        self._closers = []
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self.on_close(self._session.close)
+        return self._session
+
+    def on_close(self, fn):
+        self._closers.append(fn)
+
+    def close(self):
+        for fn in reversed(self._closers):
+            try:
+                fn()
+            except Exception:
+                pass
+
+
+def _worker(worker_id, task, shard, write_queue, rate, options):
+    ctx = WorkerContext(worker_id, RateLimiter(rate), _WriterProxy(write_queue, worker_id), options)
+    try:
+        for item in shard:
+            error = None
+            try:
+                task(item, ctx)
+            except Exception as e:
+                error = f"{e}\n{traceback.format_exc(limit=3)}"
+            # Passe par l'écrivain : l'item n'est terminé qu'une fois ses écritures appliquées
+            write_queue.put(("done", worker_id, item, error))
+    finally:
+        ctx.close()
+        write_queue.put(None)
+
+
+def _writer(db_file, write_queue, result_queue, n_workers):
+    # Seul processus à ouvrir la connexion SQLite en écriture
+    from sqlite.SQLiteSingleton import SQLiteSingleton
+
+    db = SQLiteSingleton(db_file)
+    failed = {}  # worker -> première écriture échouée de son item en cours
+    finished = 0
+    while finished < n_workers:
+        op = write_queue.get()
+        if op is None:
+            finished += 1
+            continue
+        if op[0] == "done":
+            _, worker_id, item, error = op
+            result_queue.put((item, error or failed.pop(worker_id, None)))
+            continue
+        _, worker_id, name, args, kwargs = op
+        try:
+            getattr(db, name)(*args, **kwargs)
+        except Exception as e:
+            failed.setdefault(worker_id, f"Écriture '{name}' échouée : {e}")
+    db.close()
+
+
+def run_sharded(items, task, n_workers=2, max_rps=0.5, db_file=DEFAULT_DB_FILE, on_done=None, options=None):
+    """
+    Exécute `task(item, ctx)` sur tous les items répartis entre n_workers processus.
+
+    - chaque worker a sa propre session HTTP et max_rps / n_workers requêtes/s ;
+    - toutes les écritures passent par `ctx.db` vers un unique processus écrivain ;
+    - `on_done(item, error)` est appelé dans le processus parent à chaque item terminé,
+      une fois ses écritures appliquées ; une écriture échouée est l'erreur de l'item ;
+    - si l'écrivain s'arrête, les workers sont arrêtés et les items restants en erreur ;
+    - `options` (dict picklable) est exposé aux tâches via `ctx.options`.
+
+    `task` doit être une fonction de module (importable par les processus fils).
+    Retourne la liste des (item, error) dont error n'est pas None.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    shards = partition_hotels(items, n_workers)
+    n_workers = len(shards)
+    rate = max_rps / n_workers
+
+    ctx = mp.get_context("spawn")
+    write_queue = ctx.Queue(maxsize=1000)
+    result_queue = ctx.Queue()
+
+    writer = ctx.Process(target=_writer, args=(db_file, write_queue, result_queue, n_workers), daemon=True)
+    writer.start()
+    workers = [
+        ctx.Process(target=_worker, args=(i, task, shard, write_queue, rate, options), daemon=True)
+        for i, shard in enumerate(shards)
+    ]
+    for w in workers:
+        w.start()
+
+    errors = []
+    pending = list(items)
+    released = set()
+    while pending:
+        try:
+            item, error = result_queue.get(timeout=1)
+        except queue.Empty:
+            for i, w in enumerate(workers):
+                if w.exitcode not in (None, 0) and i not in released:
+                    # Worker tué avant d'avoir signalé sa fin à l'écrivain
+                    write_queue.put(None)
+                    released.add(i)
+            if not writer.is_alive():
+                break
+            continue
+        pending.remove(item)
+        if error:
+            errors.append((item, error))
+        if on_done:
+            on_done(item, error)
+
+    if not writer.is_alive() and writer.exitcode != 0:
+        # Écrivain mort : les workers resteraient bloqués sur la file d'écriture pleine
+        for w in workers:
+            w.terminate()
+    for item in pending:
+        error = "Non terminé (processus arrêté)"
+        errors.append((item, error))
+        if on_done:
+            on_done(item, error)
+
+    for w in workers:
+        w.join()
+    writer.join()
+    return errors
@@ -0,0 +1,133 @@
+"""
+Normalisation et dédoublonnage des textes d'avis avant inférence.
+
+- `canonicalize` : minuscules, sans accents ni ponctuation, espaces réduits :
+  « Rien. », « rien » et « RIEN ! » deviennent le même texte ;
+- `simhash` : empreinte 64 bits sur les mots et bigrammes ; deux textes
+  presque identiques (un mot de plus, une faute de frappe) ont des empreintes
+  à faible distance de Hamming ;
+- `NearDuplicateIndex` : recherche des empreintes proches par bandes de 16 bits.
+"""
+import re
+import hashlib
+import unicodedata
+
+SIMHASH_BITS = 64
+BANDS = 4
+# Distance de Hamming maximale entre deux quasi-doublons (< BANDS : une bande au moins est identique)
+MAX_DISTANCE = 3
+# En dessous, un texte n'est regroupé qu'à l'identique (l'empreinte de 2-3 mots n'est pas fiable)
+MIN_TOKENS = 6
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def canonicalize(text):
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(canonical):
+    """Empreinte d'un texte canonique, ou None s'il est trop court."""
+    tokens = canonical.split()
+    if len(tokens) < MIN_TOKENS:
+        return None
+    weights = [0] * SIMHASH_BITS
+    for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        h = _feature_hash(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    signature = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            signature |= 1 << bit
+    # Entier signé : stockable tel quel dans une colonne INTEGER SQLite
+    return signature - (1 << 64) if signature >= 1 << 63 else signature
+
+
+def hamming(a, b):
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+
+class NearDuplicateIndex:
+    """Empreinte -> valeur (ex. hash du texte déjà prédit)."""
+
+    def __init__(self, max_distance=MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.bands = [{} for _ in range(BANDS)]
+
+    @staticmethod
+    def _band_keys(signature):
+        width = SIMHASH_BITS // BANDS
+        return [(signature >> (i * width)) & ((1 << width) - 1) for i in range(BANDS)]
+
+    def add(self, signature, value):
+        for band, key in zip(self.bands, self._band_keys(signature)):
+            band.setdefault(key, []).append((signature, value))
+
+    def find(self, signature):
+        """Valeur du plus proche voisin à distance <= max_distance, sinon None."""
+        best, best_distance = None, self.max_distance + 1
+        for band, key in zip(self.bands, self._band_keys(signature)):
+            for other, value in band.get(key, ()):
+                distance = hamming(signature, other)
+                if distance < best_distance:
+                    best, best_distance = value, distance
+        return best
+
+
+class InferenceDeduper:
+    """
+    Évite de relancer le modèle sur un texte déjà prédit pour `model_version` :
+    même texte canonique (dans le lot ou en base), ou quasi-doublon (simhash).
+    Le résultat du texte représentant est ensuite recopié sur tous les avis concernés.
+    """
+
+    def __init__(self, db, model_version):
+        self.db = db
+        self.model_version = model_version
+        self.seen = {}  # hash -> blob (None = prédiction en cours dans ce lot)
+        self.near = NearDuplicateIndex()
+        for signature, digest in db.get_text_signatures(model_version):
+            self.near.add(signature, digest)
+
+    def key(self, text):
+        """(hash du texte canonique, simhash ou None)."""
+        canonical = canonicalize(text)
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest(), simhash(canonical)
+
+    def lookup(self, digest, signature):
+        """Hash du texte dont la prédiction peut être réutilisée, sinon None (inférence nécessaire)."""
+        if digest in self.seen:
+            return digest
+        blob = self.db.get_cached_prediction(digest, self.model_version)
+        if blob is not None:
+            self.seen[digest] = blob
+            return digest
+        if signature is not None:
+            twin = self.near.find(signature)
+            if twin is not None and (twin in self.seen or self.blob(twin) is not None):
+                return twin
+        return None
+
+    def reserve(self, digest, signature):
+        """Déclare `digest` comme représentant (sa prédiction est faite dans ce lot)."""
+        self.seen.setdefault(digest, None)
+        if signature is not None:
+            self.near.add(signature, digest)
+
+    def remember(self, digest, blob):
+        self.seen[digest] = blob
+
+    def blob(self, digest):
+        blob = self.seen.get(digest)
+        if blob is None:
+            blob = self.db.get_cached_prediction(digest, self.model_version)
+            if blob is not None:
+                self.seen[digest] = blob
+        return blob
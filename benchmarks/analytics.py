@@ -0,0 +1,300 @@
+"""
+Analytics benchmark: every analyzer function and database query on synthetic corpora.
+
+For each size (10k, 1m, 10m reviews, see synthetic.py) the corpus is generated
+once under benchmarks/data/, then each case is timed (median of --repeat runs)
+and run once more under tracemalloc for its peak memory. The analyzer helpers
+of streamlit.py are timed uncached: the `st.cache_*` decorators are replaced by
+pass-throughs, so a run measures the work, not the cache.
+
+Results are printed next to a baseline (the previous run of the same corpus,
+or the last run of --baseline <git rev>) and appended to
+benchmarks/results/analytics.jsonl. --profile also writes one cProfile file
+per case under benchmarks/results/profiles/ (`python -m pstats <file>`).
+
+Usage (from the repository root):
+    python benchmarks/analytics.py [--sizes 10k,1m] [--repeat 3] [--profile] [--baseline abc1234]
+
+1m and 10m are opt-in: they take minutes to generate and several GB on disk.
+"""
+import argparse
+import cProfile
+import datetime
+import gc
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "app")
+RESULTS_FILE = os.path.join(ROOT, "benchmarks", "results", "analytics.jsonl")
+PROFILE_DIR = os.path.join(ROOT, "benchmarks", "results", "profiles")
+
+sys.path[:0] = [ROOT, APP_DIR, os.path.dirname(os.path.abspath(__file__))]
+
+import chart_render  # noqa: E402
+import review_frame  # noqa: E402
+import synthetic  # noqa: E402
+import topic_cube  # noqa: E402
+
+
+class _Uncached:
+    """Stands for `st` in the analyzer helpers: cache decorators become pass-throughs."""
+
+    @staticmethod
+    def cache_data(func=None, **kwargs):
+        return func if func is not None else (lambda f: f)
+
+    cache_resource = cache_data
+
+
+def load_analyzer():
+    """Helper functions of streamlit.py (everything above the app itself), as a namespace."""
+    with open(os.path.join(ROOT, "streamlit.py"), encoding="utf-8") as f:
+        source = f.read().split("# --- Streamlit App ---")[0]
+    source = source.replace("import streamlit as st\n", "")
+    namespace = {"st": _Uncached(), "__name__": "analyzer"}
+    exec(compile(source, os.path.join(ROOT, "streamlit.py"), "exec"), namespace)
+    return argparse.Namespace(**{k: v for k, v in namespace.items() if callable(v)})
+
+
+def time_case(func, repeat):
+    """Median and best wall time over `repeat` runs, then peak memory over one traced run."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_s": round(statistics.median(times), 5),
+        "min_s": round(min(times), 5),
+        "peak_mb": round(peak / 2 ** 20, 2),
+    }
+
+
+def profile_case(func, path):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    func()
+    profiler.disable()
+    profiler.dump_stats(path)
+
+
+def consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def analyzer_cases(an, json_files, work_dir):
+    """(name, callable) of the analyzer: the largest hotel view, then corpus-wide operations."""
+    largest = max(json_files, key=os.path.getsize)
+    df, codes = review_frame.load_reviews(largest)
+    scores = an.load_topic_scores(largest)
+    with_lists, _ = review_frame.load_reviews(
+        largest, columns=review_frame.ANALYSIS_COLUMNS + review_frame.TOPIC_COLUMNS, with_topics=False
+    )
+    filters = {"guest_type": [df["guest_type"].mode().iloc[0]], "score_band": ["7-9", "9-10"]}
+    filtered = an.filter_reviews(df, filters)
+    cube_path = os.path.join(work_dir, "topic_cube.db")
+    cube = {}
+
+    def cube_full():
+        if "conn" in cube:
+            cube.pop("conn").close()
+        if os.path.exists(cube_path):
+            os.remove(cube_path)
+        cube["conn"] = topic_cube.connect(cube_path)
+        topic_cube.refresh_cube(cube["conn"], os.path.dirname(largest))
+
+    def load_all():
+        return [review_frame.load_reviews(path) for path in json_files]
+
+    def export_all():
+        out_dir = os.path.join(work_dir, "exports")
+        shutil.rmtree(out_dir, ignore_errors=True)
+        an.bulk_export_topic_csvs(json_files, filters, True, 10, 0.8, out_dir=out_dir)
+
+    def facet_cascade(hotel_ids):
+        selected = {}
+        for facet in topic_cube.FACETS:
+            counts = topic_cube.facet_counts(cube["conn"], facet, selected, hotel_ids)
+            selected[facet] = list(counts["value"][:2])
+
+    yield "hotel.load_reviews", lambda: review_frame.load_reviews(largest)
+    yield "hotel.load_reviews_full", lambda: review_frame.load_reviews(largest, columns=None, with_topics=False)
+    yield "hotel.load_topic_scores", lambda: an.load_topic_scores(largest)
+    yield "hotel.filter_reviews", lambda: an.filter_reviews(df, filters)
+    yield "hotel.topic_counts_codes", lambda: an.get_topic_counts_stacked(filtered, True, 10, topic_codes=codes)
+    yield "hotel.topic_counts_scores", lambda: an.get_topic_counts_stacked(
+        filtered, True, 10, topic_scores=scores, threshold=0.8)
+    yield "hotel.topic_counts_lists", lambda: an.get_topic_counts_stacked(
+        with_lists.loc[filtered.index], True, 10)
+    yield "hotel.count_topics_above_threshold", lambda: an.count_topics_above_threshold(
+        scores, filtered["review_index"], 0.8)
+    yield "hotel.time_series", lambda: chart_render.time_series(df, "reviewed_date", "review_score", freq="D")
+    yield "hotel.binned_histogram", lambda: chart_render.binned_histogram(df["review_score"], 20, (0, 10))
+    yield "hotel.paginate", lambda: chart_render.paginate(df, 3)
+
+    yield "corpus.load_reviews_all", load_all
+    frames = pd.concat([d for d, _ in load_all()], ignore_index=True)
+    yield "corpus.filter_reviews", lambda: an.filter_reviews(frames, filters)
+    yield "corpus.time_series", lambda: chart_render.time_series(frames, "reviewed_date", "review_score")
+    x = frames["reviewed_date"].sort_values().astype("int64").to_numpy()
+    y = np.cumsum(np.random.default_rng(0).normal(size=len(x)))
+    yield "corpus.lttb", lambda: chart_render.lttb(x, y)
+    yield "corpus.bulk_export_topic_csvs", export_all
+    yield "cube.refresh_full", cube_full
+    if "conn" not in cube:
+        cube_full()
+    yield "cube.refresh_unchanged", lambda: topic_cube.refresh_cube(cube["conn"], os.path.dirname(largest))
+    for group_by in topic_cube.GROUPABLE:
+        yield f"cube.query_{group_by.lower().replace(' ', '_')}", \
+            lambda group_by=group_by: topic_cube.query_cube(cube["conn"], group_by)
+    hotel_id = topic_cube.hotel_id_of(cube["conn"], largest)
+    yield "cube.facets_hotel", lambda: facet_cascade([hotel_id])
+    yield "cube.facets_global", lambda: facet_cascade(None)
+    yield "cube.hotel_ids", lambda: topic_cube.hotel_ids(cube["conn"], towns=synthetic.TOWNS[:2])
+
+
+def db_cases(db_file):
+    """(name, callable) of the SQLiteSingleton queries and the app helpers on the synthetic database."""
+    from sqlite.SQLiteSingleton import SQLiteSingleton
+
+    db = SQLiteSingleton(db_file)
+    hotels = db.get_all_hotels()
+    largest = int(db.get_hotel_stats()["reviews"].idxmax())
+
+    yield "db.get_all_hotels", db.get_all_hotels
+    yield "db.get_hotel_stats", db.get_hotel_stats
+    yield "db.get_hotel_topic_counts", db.get_hotel_topic_counts
+    yield "db.data_version", db.data_version
+    yield "db.refresh_aggregates", db.refresh_aggregates
+    yield "db.get_review_activity", db.get_review_activity
+    yield "db.get_reviews_after", lambda: db.get_reviews_after(0, 1000)
+    yield "db.iter_reviews_for_export", lambda: consume(db.iter_reviews_for_export(largest))
+    # The app helpers need the streamlit package, which the root streamlit.py would shadow
+    path = sys.path[:]
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or ".") != ROOT]
+    try:
+        from utils.filter_hotel_to_select import hotel_facets
+    except Exception as e:
+        yield "app.hotel_facets", e
+    else:
+        yield "app.hotel_facets", lambda: hotel_facets(hotels)
+    finally:
+        sys.path[:] = path
+        if getattr(sys.modules.get("streamlit"), "__file__", None) == os.path.join(ROOT, "streamlit.py"):
+            del sys.modules["streamlit"]
+
+
+def run_size(size, args, an, git):
+    corpus = synthetic.generate(size, args.seed, scores=True, db=True)
+    json_files = sorted(glob.glob(os.path.join(corpus, "json", "*.json")))
+    report = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "git": git,
+        "size": size,
+        "seed": args.seed,
+        "hotels": len(json_files),
+        "repeat": args.repeat,
+        "results": {},
+    }
+
+    from sqlite.SQLiteSingleton import SQLiteSingleton
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{size}_")
+    try:
+        cases = [analyzer_cases(an, json_files, work_dir), db_cases(os.path.join(corpus, "booking_reviews.db"))]
+        for generator in cases:
+            for name, func in generator:
+                if isinstance(func, Exception):
+                    report["results"][name] = {"error": f"{type(func).__name__}: {func}"}
+                    continue
+                try:
+                    report["results"][name] = time_case(func, args.repeat)
+                    if args.profile:
+                        os.makedirs(PROFILE_DIR, exist_ok=True)
+                        profile_case(func, os.path.join(PROFILE_DIR, f"{git or 'nogit'}_{size}_{name}.prof"))
+                except Exception as e:
+                    report["results"][name] = {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        if SQLiteSingleton._instance is not None:
+            SQLiteSingleton._instance.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+
+def load_baseline(size, seed, rev=None):
+    """Last recorded run of the same corpus (from git revision `rev` if given)."""
+    if not os.path.exists(RESULTS_FILE):
+        return None
+    baseline = None
+    with open(RESULTS_FILE, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("size") == size and entry.get("seed") == seed and (rev is None or entry.get("git") == rev):
+                baseline = entry
+    return baseline
+
+
+def print_report(report, baseline):
+    print(f"\n{report['size']} ({report['hotels']} hotels), baseline: "
+          f"{baseline['git'] + ' ' + baseline['date'] if baseline else 'none'}")
+    print(f"{'case':36} {'median (s)':>11} {'peak (MB)':>10} {'vs base':>8}")
+    for name, result in report["results"].items():
+        if "error" in result:
+            print(f"{name:36} {result['error']}")
+            continue
+        base = (baseline or {}).get("results", {}).get(name, {}).get("median_s")
+        ratio = f"{result['median_s'] / base:.2f}x" if base else "-"
+        print(f"{name:36} {result['median_s']:>11.4f} {result['peak_mb']:>10.1f} {ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k", help="comma-separated, among " + ", ".join(synthetic.SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--profile", action="store_true", help="write one cProfile file per case")
+    parser.add_argument("--baseline", help="git revision to compare with (default: previous run)")
+    args = parser.parse_args()
+    sizes = args.sizes.split(",")
+    unknown = [s for s in sizes if s not in synthetic.SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+
+    git = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                         capture_output=True, text=True).stdout.strip()
+    an = load_analyzer()
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    for size in sizes:
+        baseline = load_baseline(size, args.seed, args.baseline)
+        report = run_size(size, args, an, git)
+        print_report(report, baseline)
+        with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+    print(f"\nResults appended to {os.path.relpath(RESULTS_FILE, ROOT)}")
+    if args.profile:
+        print(f"Profiles in {os.path.relpath(PROFILE_DIR, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
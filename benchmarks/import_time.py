@@ -0,0 +1,148 @@
+"""
+Cold-start benchmark: import time of app modules and first render of each page.
+
+Every measurement runs in a fresh interpreter so nothing is already imported.
+Results are printed and appended to benchmarks/results/import_time.jsonl so
+successive runs (one per commit / host) can be compared.
+
+Usage (from the repository root):
+    python benchmarks/import_time.py [--repeat 3] [--no-pages]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "app")
+RESULTS_FILE = os.path.join(ROOT, "benchmarks", "results", "import_time.jsonl")
+
+# Modules imported by the pages, from the app/ directory
+MODULES = [
+    "sqlite.SQLiteSingleton",
+    "utils.booking_reviews",
+    "utils.booking_search",
+    "utils.sharded_scrap",
+    "utils.response_cache",
+    "utils.hotel_match",
+    "utils.filter_hotel_to_select",
+]
+
+PAGES = [
+    os.path.join(APP_DIR, "Home.py"),
+    os.path.join(APP_DIR, "pages", "1_Scrap_ID_Booking.py"),
+    os.path.join(APP_DIR, "pages", "2_Scrap_Avis_Booking.py"),
+    os.path.join(ROOT, "streamlit.py"),
+]
+
+
+def run_python(code, cwd, extra_args=()):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=cwd, capture_output=True, text=True
+    )
+    return time.perf_counter() - start, proc
+
+
+def module_import_time(module):
+    """Wall time of `import module` plus its cumulative time from -X importtime."""
+    wall, proc = run_python(f"import {module}", APP_DIR, ("-X", "importtime"))
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+    return {"wall_s": round(wall, 4), "import_s": cumulative_us / 1e6 if cumulative_us else None}
+
+
+PAGE_CODE = """
+import time, sys, os
+# The root `streamlit.py` would shadow the streamlit package
+sys.path = [p for p in sys.path if p not in ("", os.getcwd())]
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+ready = time.perf_counter()
+at = AppTest.from_file({path!r}, default_timeout=120)
+at.run()
+done = time.perf_counter()
+print(ready - start, done - ready, len(at.exception))
+"""
+
+
+def page_first_render(path):
+    """First render of a page through streamlit's AppTest, in a fresh interpreter."""
+    cwd = APP_DIR if path.startswith(APP_DIR) else ROOT
+    wall, proc = run_python(PAGE_CODE.format(path=path), cwd)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    framework_s, render_s, exceptions = proc.stdout.split()
+    return {
+        "wall_s": round(wall, 4),
+        "framework_s": round(float(framework_s), 4),
+        "render_s": round(float(render_s), 4),
+        "exceptions": int(exceptions),
+    }
+
+
+def median_of(runs, key):
+    values = [r[key] for r in runs if r.get(key) is not None]
+    return round(statistics.median(values), 4) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-pages", action="store_true", help="skip page renders (no streamlit needed)")
+    args = parser.parse_args()
+
+    report = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "git": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip(),
+        "modules": {},
+        "pages": {},
+    }
+
+    print(f"{'module':40} {'wall (s)':>10} {'import (s)':>11}")
+    for module in MODULES:
+        runs = [module_import_time(module) for _ in range(args.repeat)]
+        if "error" in runs[0]:
+            report["modules"][module] = runs[0]
+            print(f"{module:40} {runs[0]['error']}")
+            continue
+        result = {"wall_s": median_of(runs, "wall_s"), "import_s": median_of(runs, "import_s")}
+        report["modules"][module] = result
+        print(f"{module:40} {result['wall_s']:>10} {result['import_s']!s:>11}")
+
+    if not args.no_pages:
+        print(f"\n{'page':40} {'wall (s)':>10} {'render (s)':>11}")
+        for path in PAGES:
+            name = os.path.relpath(path, ROOT)
+            runs = [page_first_render(path) for _ in range(args.repeat)]
+            if "error" in runs[0]:
+                report["pages"][name] = runs[0]
+                print(f"{name:40} {runs[0]['error']}")
+                continue
+            result = {key: median_of(runs, key) for key in ("wall_s", "framework_s", "render_s")}
+            result["exceptions"] = runs[0]["exceptions"]
+            report["pages"][name] = result
+            print(f"{name:40} {result['wall_s']:>10} {result['render_s']:>11}")
+
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(report, ensure_ascii=False) + "\n")
+    print(f"\nResults appended to {os.path.relpath(RESULTS_FILE, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Synthetic corpora shaped like scrap_out/*.json, for the analytics benchmarks.
+
+A corpus of N reviews is split into hotels of a few hundred to a few thousand
+reviews (log-normal, like the real files), each written as one JSON file with
+the same fields as utils/scrap_avis.py, an optional `.topics.npz` sidecar like
+predict.py, and optionally loaded into a migrated SQLite database through
+SQLiteSingleton. Everything is seeded: the same (size, seed) always gives the
+same corpus, so reports from different commits compare the same data.
+
+Usage (from the repository root):
+    python benchmarks/synthetic.py 10k [--seed 0] [--scores] [--db]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+TOWNS = ["ANNECY", "LA ROCHELLE", "FRÉJUS", "LORIENT", "SAINT-RAPHAËL", "CHÂTELAILLON-PLAGE", "SEYNOD", "SAMOËNS"]
+GUEST_TYPES = ["Couple", "Famille", "Voyageur individuel", "Groupe", "Voyageur d'affaires"]
+GUEST_TYPE_P = [0.5, 0.27, 0.15, 0.06, 0.02]
+LANGUAGES = ["fr", "en", "de", "it", "es", "nl", "pt", "pl", "ja", "zh", "ru", "sv", "da", "cs", "ko"]
+COUNTRIES = [f"Pays {i}" for i in range(150)]
+ROOM_KINDS = ["Chambre Double", "Chambre Triple", "Chambre Familiale", "Chambre Lits Jumeaux", "Suite", "Studio"]
+ROOM_VARIANTS = ["", " Standard", " Supérieure", " Nouvelle Génération", " avec Balcon", " Vue Mer"]
+TOPICS = [f"topic{i:02d}.mot.cle" for i in range(48)]
+WORDS = ("chambre propre personnel accueil petit déjeuner calme bruit lit confortable emplacement "
+         "parking prix rapport qualité piscine vue mer gare centre restaurant").split()
+SCORE_LEVEL = 204  # floor(0.8 * 255), same rule as predict.py
+
+
+def zipf_p(n, a=1.2):
+    p = 1.0 / np.arange(1, n + 1) ** a
+    return p / p.sum()
+
+
+def hotel_sizes(n_reviews, rng, mean=1100, sigma=0.9, max_reviews=20_000):
+    """Reviews per hotel, summing to n_reviews."""
+    sizes = []
+    left = n_reviews
+    while left > 0:
+        size = int(min(max(rng.lognormal(np.log(mean) - sigma ** 2 / 2, sigma), 20), max_reviews, left))
+        sizes.append(size)
+        left -= size
+    return sizes
+
+
+def _texts(rng, n, mean_words):
+    """n short texts drawn from WORDS (None when empty), in one vectorized draw."""
+    lengths = rng.poisson(mean_words, n)
+    words = np.array(WORDS, dtype=object)[rng.integers(0, len(WORDS), lengths.sum())]
+    ends = np.cumsum(lengths)
+    return [" ".join(words[end - k:end]) if k else None for k, end in zip(lengths, ends)]
+
+
+def hotel_reviews(hotel_id, n, rng):
+    """Review dicts of one hotel (fields of extract_review_info plus topic lists) and score matrices."""
+    rooms = [k + v for k in ROOM_KINDS for v in ROOM_VARIANTS]
+    rooms = list(rng.choice(rooms, size=rng.integers(3, 20), replace=False))
+    start = datetime.datetime(2019, 1, 1).timestamp()
+    dates = np.sort(rng.uniform(start, start + 6 * 365 * 86400, n))
+    scores = np.clip(np.round(rng.normal(8.0, 1.6, n)), 1, 10)
+    guest_types = rng.choice(len(GUEST_TYPES), n, p=GUEST_TYPE_P)
+    languages = rng.choice(len(LANGUAGES), n, p=zipf_p(len(LANGUAGES), 1.6))
+    countries = rng.choice(len(COUNTRIES), n, p=zipf_p(len(COUNTRIES)))
+    room_ids = rng.choice(len(rooms), n, p=zipf_p(len(rooms), 0.8))
+    nights = rng.integers(1, 8, n)
+    votes = rng.integers(0, 3, n)
+    usernames = rng.integers(0, 5000, n)
+    titles, positives, negatives = _texts(rng, n, 2), _texts(rng, n, 12), _texts(rng, n, 5)
+
+    # Topics above the threshold: up to 3 positive and 2 negative per review
+    topic_p = zipf_p(len(TOPICS), 0.9)
+    pos_topics = rng.choice(len(TOPICS), (n, 3), p=topic_p)
+    neg_topics = rng.choice(len(TOPICS), (n, 2), p=topic_p)
+    n_pos, n_neg = rng.integers(0, 4, n), rng.integers(0, 3, n)
+    positive = rng.integers(0, 64, (n, len(TOPICS)), dtype=np.uint8)
+    negative = rng.integers(0, 64, (n, len(TOPICS)), dtype=np.uint8)
+    rows = np.arange(n)
+    for j in range(3):
+        keep = rows[n_pos > j]
+        positive[keep, pos_topics[keep, j]] = rng.integers(SCORE_LEVEL + 1, 256, len(keep))
+    for j in range(2):
+        keep = rows[n_neg > j]
+        negative[keep, neg_topics[keep, j]] = rng.integers(SCORE_LEVEL + 1, 256, len(keep))
+
+    reviews = []
+    for i in range(n):
+        reviewed = datetime.datetime.fromtimestamp(dates[i])
+        checkin = reviewed.date() - datetime.timedelta(days=int(nights[i]))
+        reviews.append({
+            "review_score": float(scores[i]),
+            "reviewed_date": reviewed.strftime("%Y-%m-%d %H:%M:%S"),
+            "is_approved": True,
+            "helpful_votes": int(votes[i]),
+            "review_url": f"{hotel_id:06d}{i:08x}",
+            "guest_username": f"Guest {usernames[i]}",
+            "guest_type": GUEST_TYPES[guest_types[i]],
+            "guest_country": COUNTRIES[countries[i]],
+            "guest_country_code": f"c{countries[i]}",
+            "guest_avatar_url": "https://xx.bstatic.com/static/img/review/avatars/ava-default.png",
+            "guest_anonymous": False,
+            "review_title": titles[i],
+            "positive_text": positives[i],
+            "negative_text": negatives[i],
+            "language": LANGUAGES[languages[i]],
+            "stay_status": "stayed",
+            "checkin_date": checkin.isoformat(),
+            "checkout_date": (checkin + datetime.timedelta(days=int(nights[i]))).isoformat(),
+            "num_nights": int(nights[i]),
+            "room_name": rooms[room_ids[i]],
+            "room_id": str(1000 + room_ids[i]),
+            "positive_topics": [TOPICS[t] for t in dict.fromkeys(pos_topics[i, :n_pos[i]])],
+            "negative_topics": [TOPICS[t] for t in dict.fromkeys(neg_topics[i, :n_neg[i]])],
+        })
+    return reviews, positive, negative
+
+
+def iter_hotels(size, seed=0):
+    """(hotel dict, reviews, positive scores, negative scores) per synthetic hotel."""
+    rng = np.random.default_rng(seed)
+    for hotel_id, n in enumerate(hotel_sizes(SIZES.get(size, size), rng), start=1):
+        reviews, positive, negative = hotel_reviews(hotel_id, n, rng)
+        town = TOWNS[hotel_id % len(TOWNS)]
+        hotel = {
+            "id": hotel_id,
+            "name": f"HÔTEL SYNTHÉTIQUE {hotel_id}",
+            "town": town,
+            "url": f"https://www.booking.com/hotel/fr/synthetic-{hotel_id}.html",
+            "booking_id": 100000 + hotel_id,
+        }
+        yield hotel, reviews, positive, negative
+
+
+def corpus_dir(size, seed=0, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f"{size}_seed{seed}")
+
+
+def generate(size, seed=0, scores=False, db=False, data_dir=DATA_DIR, log=print):
+    """
+    Writes the corpus under data_dir/<size>_seed<seed>/ (json/ and booking_reviews.db)
+    unless it is already complete. Returns the corpus directory.
+    """
+    out = corpus_dir(size, seed, data_dir)
+    json_dir = os.path.join(out, "json")
+    db_file = os.path.join(out, "booking_reviews.db")
+    markers = [".json_done_scores"] if scores else [".json_done", ".json_done_scores"]
+    done_json = any(os.path.exists(os.path.join(out, m)) for m in markers)
+    done_db = not db or os.path.exists(os.path.join(out, ".db_done"))
+    if done_json and done_db:
+        return out
+    os.makedirs(json_dir, exist_ok=True)
+
+    singleton = None
+    if db:
+        sys.path.insert(0, os.path.join(ROOT, "app"))
+        from sqlite.SQLiteSingleton import SQLiteSingleton
+        if os.path.exists(db_file):
+            os.remove(db_file)
+        singleton = SQLiteSingleton(db_file)
+
+    total = 0
+    for hotel, reviews, positive, negative in iter_hotels(size, seed):
+        name = f"{hotel['id']}_synthetic_{hotel['town'].lower().replace(' ', '_')}"
+        path = os.path.join(json_dir, f"{name}.json")
+        if not done_json:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({**hotel, "scrap": {"meta": {}, "reviews": reviews}}, f, ensure_ascii=False)
+            if scores:
+                np.savez_compressed(os.path.join(json_dir, f"{name}.topics.npz"),
+                                    topics=np.array(TOPICS), positive=positive, negative=negative)
+        if singleton is not None:
+            singleton.insert_or_update_hotel(hotel["id"], hotel["name"], hotel["town"], hotel["url"],
+                                             str(hotel["booking_id"]))
+            singleton.insert_or_update_reviews(hotel["id"], [
+                {k: v for k, v in r.items() if not k.endswith("_topics")} for r in reviews
+            ])
+        total += len(reviews)
+        log(f"\r{size}: {total} reviews", end="")
+    log("")
+
+    if not done_json:
+        open(os.path.join(out, ".json_done" + ("_scores" if scores else "")), "w").close()
+    if singleton is not None:
+        singleton.refresh_aggregates()
+        singleton.close()
+        open(os.path.join(out, ".db_done"), "w").close()
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("size", choices=list(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scores", action="store_true", help="write .topics.npz sidecars")
+    parser.add_argument("--db", action="store_true", help="also load the corpus into a SQLite database")
+    args = parser.parse_args()
+    print(generate(args.size, args.seed, scores=args.scores, db=args.db))
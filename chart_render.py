@@ -0,0 +1,90 @@
+"""
+Server-side reduction of the data sent to the browser.
+
+Every chart and table of the analyzer goes through these helpers, so the page
+payload stays under MAX_POINTS points, MAX_GROUPS series and PAGE_SIZE rows
+whatever the hotel size:
+- time series are downsampled with LTTB (Largest-Triangle-Three-Buckets),
+  which keeps the visual shape (peaks, dips) with a fixed number of points;
+- score distributions are binned into histograms before plotting;
+- the raw review table is paginated.
+"""
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 1000
+PAGE_SIZE = 100
+# Series (colors) per comparison chart
+MAX_GROUPS = 25
+
+
+def lttb(x, y, n_out=MAX_POINTS):
+    """
+    Indices of the n_out points kept by LTTB. x must be sorted, numeric.
+    First and last points are always kept.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    # n_out - 2 buckets between the first and the last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the last bucket)
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # Point of the bucket forming the largest triangle with a and the next average
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample_series(df, x, y, max_points=MAX_POINTS):
+    """LTTB on a DataFrame sorted by `x` (datetime or numeric)."""
+    if len(df) <= max_points:
+        return df
+    df = df.sort_values(x)
+    x_values = df[x]
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        x_values = x_values.astype("int64")
+    return df.iloc[lttb(x_values.to_numpy(), df[y].to_numpy(), max_points)]
+
+
+def time_series(df, date_column, value_column=None, freq="D", max_points=MAX_POINTS):
+    """
+    Reviews per period (count) and mean of `value_column`, aggregated server-side
+    then downsampled. Returns columns: date, reviews[, mean].
+    """
+    dates = pd.to_datetime(df[date_column], errors="coerce")
+    grouped = df.assign(date=dates.dt.to_period(freq).dt.start_time).dropna(subset=["date"]).groupby("date")
+    series = grouped.size().rename("reviews").to_frame()
+    if value_column:
+        series["mean"] = grouped[value_column].mean()
+    series = series.reset_index()
+    return downsample_series(series, "date", "mean" if value_column else "reviews", max_points)
+
+
+def binned_histogram(values, bins=20, value_range=None):
+    """Histogram computed server-side: one row per bin (left, right, count)."""
+    values = pd.to_numeric(pd.Series(values), errors="coerce").dropna().to_numpy()
+    counts, edges = np.histogram(values, bins=bins, range=value_range)
+    return pd.DataFrame({
+        "bin": [f"{lo:g}–{hi:g}" for lo, hi in zip(edges[:-1], edges[1:])],
+        "left": edges[:-1],
+        "count": counts,
+    })
+
+
+def paginate(df, page, page_size=PAGE_SIZE):
+    """Returns (rows of the page, number of pages); page starts at 1."""
+    n_pages = max((len(df) - 1) // page_size + 1, 1)
+    page = min(max(int(page), 1), n_pages)
+    return df.iloc[(page - 1) * page_size: page * page_size], n_pages
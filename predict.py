@@ -1,70 +1,216 @@
 import os
+import sys
 import json
 import requests
 import tqdm
+import numpy as np
+
+# The multilingual tagger is shared with the app (app/utils)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+from utils.embedder import load_model, embed_texts
+from utils.multilingual_tagger import PrototypeTagger, PROTOTYPES_PATH as APP_PROTOTYPES_PATH
+from utils.text_dedup import canonicalize, simhash, NearDuplicateIndex
 
 # === CONFIG ===
 INPUT_FOLDER = "scrap"
 OUTPUT_FOLDER = "scrap_out"
 API_URL = "http://raspberrypi:8000/predict"
+# Default threshold for the `*_topics` lists kept in the JSON output;
+# the full scores go to the `.topics.npz` sidecar so it can be changed later
+SCORE_THRESHOLD = 0.8
+# Non-French reviews are tagged locally with the multilingual embedding model,
+# against topic prototypes learnt from the French reviews tagged by the API
+API_LANGUAGES = ("fr",)
+EMBEDDING_MODEL = "app/models/sbert/multilingual-e5-TourCSE"
+# Prototypes saved by the app (python -m utils.predict_topics), reused when present
+PROTOTYPES_PATH = os.path.join("app", APP_PROTOTYPES_PATH)
+# Otherwise they are learnt from this many French texts of the first files
+PROTOTYPE_SAMPLE = 20_000
 
 # === SETUP ===
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# Cache for already predicted texts
+# Cache for already predicted texts, keyed by canonical text ("Rien.", "RIEN !" and
+# "rien" share one prediction), and near-duplicates of them (one word more, a typo)
 prediction_cache = {}
+near_duplicates = NearDuplicateIndex()
 
-# === PROCESS EACH JSON FILE SEPARATELY ===
-json_files = [f for f in os.listdir(INPUT_FOLDER) if f.endswith(".json")]
+def quantize_scores(rows, vocabulary):
+    """
+    rows: one prediction list per review ([{'topic', 'score'}, ...] or None).
+    Returns a uint8 matrix (n_reviews, n_topics), score 0..1 -> 0..255.
+    """
+    matrix = np.zeros((len(rows), len(vocabulary)), dtype=np.uint8)
+    for i, predictions in enumerate(rows):
+        for p in predictions or []:
+            matrix[i, vocabulary[p['topic']]] = min(max(round(p['score'] * 255), 0), 255)
+    return matrix
 
-for filename in tqdm.tqdm(json_files, desc="Processing JSON files"):
-    input_path = os.path.join(INPUT_FOLDER, filename)
-    output_path = os.path.join(OUTPUT_FOLDER, filename)
+def save_topic_scores(path, side_rows):
+    """Write the full topic score vectors of one hotel, one uint8 matrix per review side."""
+    vocabulary = {}
+    for rows in side_rows.values():
+        for predictions in rows:
+            for p in predictions or []:
+                vocabulary.setdefault(p['topic'], len(vocabulary))
+    np.savez_compressed(
+        path,
+        topics=np.array(list(vocabulary), dtype=str),
+        **{sent: quantize_scores(rows, vocabulary) for sent, rows in side_rows.items()}
+    )
+
+def predict_api(text, filename):
+    """Calls the API (cached by canonical text and near-duplicates). Returns [{'topic', 'score'}], [] on error."""
+    key = canonicalize(text)
+    if key in prediction_cache:
+        return prediction_cache[key]
+    signature = simhash(key)
+    twin = near_duplicates.find(signature) if signature is not None else None
+    if twin is not None:
+        prediction_cache[key] = prediction_cache[twin]
+        return prediction_cache[key]
+    try:
+        response = requests.post(API_URL, json={"input": text}, timeout=10)
+        if response.status_code == 200:
+            predictions = response.json()
+            prediction_cache[key] = predictions
+            if signature is not None:
+                near_duplicates.add(signature, key)
+            return predictions
+        print(f"⚠️ API error {response.status_code} for review {text} in {filename}")
+    except Exception as e:
+        print(f"⚠️ Request error for review {text} in {filename}: {e}")
+    return []
 
+def read_json(filename):
     try:
-        with open(input_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(os.path.join(INPUT_FOLDER, filename), "r", encoding="utf-8") as f:
+            return json.load(f)
     except json.JSONDecodeError:
         print(f"⚠️ Error decoding JSON in file: {filename}")
-        continue
     except Exception as e:
         print(f"⚠️ Error reading {filename}: {e}")
+    return None
+
+def load_tagger(json_files):
+    """
+    Prototypes saved by the app if any, else learnt from the French reviews of the
+    first files (up to PROTOTYPE_SAMPLE texts, their API predictions stay cached).
+    Returns None when non-French reviews cannot be tagged.
+    """
+    try:
+        load_model(EMBEDDING_MODEL)
+    except ImportError:
+        print("⚠️ sentence-transformers is not installed: non-French reviews are left untagged")
+        return None
+    if os.path.exists(PROTOTYPES_PATH):
+        return PrototypeTagger.load(PROTOTYPES_PATH)
+
+    texts, labelled = [], []
+    for filename in json_files:
+        data = read_json(filename) or {}
+        for review in data.get("scrap", {}).get("reviews", []):
+            if review.get("language", "") not in API_LANGUAGES:
+                continue
+            for text in (review['positive_text'], review['negative_text']):
+                if type(text) == str and text.strip():
+                    predictions = predict_api(text, filename)
+                    if predictions:
+                        texts.append(text)
+                        labelled.append(predictions)
+        if len(texts) >= PROTOTYPE_SAMPLE:
+            break
+
+    topics = sorted({p['topic'] for predictions in labelled for p in predictions})
+    labels = np.array([[any(p['topic'] == topic and p['score'] > SCORE_THRESHOLD for p in predictions)
+                        for topic in topics] for predictions in labelled], dtype=bool)
+    try:
+        return PrototypeTagger.from_examples(embed_texts(texts), labels.reshape(len(texts), len(topics)), topics)
+    except ValueError:
+        print("⚠️ Not enough French reviews tagged by the API: non-French reviews are left untagged")
+        return None
+
+def tag_other_languages(tagger, pending):
+    """
+    pending: {language: [(text, callback)]} of one file. Each language is encoded as
+    one homogeneous batch; callback(predictions) stores the result in its review.
+    """
+    for items in pending.values():
+        texts = {}  # canonical text -> first original text, encoded once
+        sources = {}  # canonical text -> canonical text whose embedding is reused
+        near = NearDuplicateIndex()
+        for text, _ in items:
+            key = canonicalize(text)
+            if key in sources:
+                continue
+            signature = simhash(key)
+            twin = near.find(signature) if signature is not None else None
+            if twin is None:
+                texts[key] = text
+                twin = key
+                if signature is not None:
+                    near.add(signature, key)
+            sources[key] = twin
+        scores = tagger.score(embed_texts(list(texts.values())))
+        predictions = {key: [{'topic': t, 'score': float(s)} for t, s in zip(tagger.topics, row)]
+                       for key, row in zip(texts, scores)}
+        for text, callback in items:
+            callback(predictions[sources[canonicalize(text)]])
+
+def save(filename, data, side_rows):
+    output_path = os.path.join(OUTPUT_FOLDER, filename)
+
+    # Save updated JSON
+    try:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"⚠️ Error saving {filename}: {e}")
+
+    # Save full score vectors next to it (row i = review i of the JSON)
+    try:
+        save_topic_scores(os.path.splitext(output_path)[0] + ".topics.npz", side_rows)
+    except Exception as e:
+        print(f"⚠️ Error saving topic scores for {filename}: {e}")
+
+# === TAG EACH FILE (FRENCH WITH THE API, OTHER LANGUAGES LOCALLY) AND SAVE IT ===
+json_files = sorted(f for f in os.listdir(INPUT_FOLDER) if f.endswith(".json"))
+tagger = None
+tagger_loaded = False
+
+for filename in tqdm.tqdm(json_files, desc="Processing JSON files"):
+    data = read_json(filename)
+    if data is None:
         continue
 
     # Process reviews
     reviews = data.get("scrap", {}).get("reviews", [])
-    updated_reviews = []
-    for review in reviews:
+    side_rows = {'positive': [None] * len(reviews), 'negative': [None] * len(reviews)}
+    pending = {}
+    for i, review in enumerate(reviews):
         review['positive_topics'] = []
         review['negative_topics'] = []
         language = review.get("language", "")
-        if language != "fr": continue
 
         for sent, text in [('positive', review['positive_text']), ('negative', review['negative_text'])]:
-            # Check cache
-            if type(text) != str: continue 
-            if text in prediction_cache:
-                predictions = prediction_cache[text]
+            if type(text) != str: continue
+
+            def store(predictions, review=review, sent=sent, i=i):
+                review[f'{sent}_topics'] = [p['topic'] for p in predictions if p['score'] > SCORE_THRESHOLD]
+                side_rows[sent][i] = predictions
+
+            if language in API_LANGUAGES:
+                store(predict_api(text, filename))
             else:
-                try:
-                    response = requests.post(API_URL, json={"input": text}, timeout=10)
-                    if response.status_code == 200:
-                        predictions = response.json()
-                        prediction_cache[text] = predictions
-                    else:
-                        print(f"⚠️ API error {response.status_code} for review {text} in {filename}")
-                        predictions = []
-                except Exception as e:
-                    print(f"⚠️ Request error for review {text} in {filename}: {e}")
-                    predictions = []
-
-            review[f'{sent}_topics'] = [p['topic'] for p in predictions if p['score'] > 0.8]
+                pending.setdefault(language, []).append((text, store))
 
-    # Save updated JSON
-    try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"⚠️ Error saving {filename}: {e}")
+    if pending:
+        # Loaded on the first file that needs it
+        if not tagger_loaded:
+            tagger, tagger_loaded = load_tagger(json_files), True
+        if tagger is not None:
+            tag_other_languages(tagger, pending)
+
+    save(filename, data, side_rows)
 
-print("✅ All JSON files processed and saved in 'scrap_out/' folder.")
\ No newline at end of file
+print("✅ All JSON files processed and saved in 'scrap_out/' folder.")
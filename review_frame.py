@@ -0,0 +1,151 @@
+"""
+Memory-efficient review DataFrames for the analyzer.
+
+The scraped JSON files hold every field of every review (texts, avatars, topic
+lists as strings). Most views only need a few columns, so the loader:
+- projects columns while parsing (a json object_hook): reviews are never kept
+  as dicts, dropped fields are freed as soon as they are decoded;
+- stores repeated strings as categoricals, numbers and flags as compact
+  nullable dtypes, dates as datetime64;
+- encodes topic lists as integer codes in two flat arrays per side (CSR:
+  codes + offsets), counted with np.bincount instead of exploding lists.
+Hotel fields (id, name, town) are one-category columns, not copies per row.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+# Columns used by the filters, charts and topic counts
+ANALYSIS_COLUMNS = ("review_score", "reviewed_date", "guest_type", "room_name", "language", "guest_country")
+TOPIC_COLUMNS = ("positive_topics", "negative_topics")
+
+CATEGORY_COLUMNS = {
+    "guest_type", "room_name", "language", "stay_status", "guest_country", "guest_country_code",
+}
+DTYPES = {
+    "review_score": "float32",
+    "helpful_votes": "Int32",
+    "num_nights": "Int16",
+    "is_approved": "boolean",
+    "guest_anonymous": "boolean",
+}
+DATE_COLUMNS = {"reviewed_date", "checkin_date", "checkout_date"}
+
+# Review score bands (scores go from 1 to 10), lower bound included
+SCORE_BAND_EDGES = [0, 3, 5, 7, 9, 10.01]
+SCORE_BANDS = ["<3", "3-5", "5-7", "7-9", "9-10"]
+
+try:  # Arrow strings are several times smaller than Python str objects
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = "string[pyarrow]"
+except ImportError:
+    TEXT_DTYPE = object
+
+
+class TopicCodes:
+    """
+    Topic lists of one hotel as integer codes: for side s and review i, the topics
+    are topics[codes[s][offsets[s][i]:offsets[s][i + 1]]].
+    """
+
+    def __init__(self, topics, codes, offsets):
+        self.topics = np.asarray(topics, dtype=object)
+        self.codes = codes
+        self.offsets = offsets
+
+    def counts(self, review_index, side):
+        """Reviews mentioning each topic, among the rows `review_index`."""
+        codes, offsets = self.codes[side], self.offsets[side]
+        rows = np.asarray(review_index, dtype=np.int64)
+        starts = offsets[rows]
+        lengths = offsets[rows + 1] - starts
+        total = int(lengths.sum())
+        counts = np.zeros(len(self.topics), dtype=np.int64)
+        if total:
+            # Positions of every code of the selected rows, without a Python loop
+            index = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+            counts = np.bincount(codes[index], minlength=len(self.topics))
+        return pd.Series(counts, index=self.topics)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.codes.values()) + sum(a.nbytes for a in self.offsets.values())
+
+
+def score_band(scores):
+    """Categorical score band of each review score (NaN stays NaN)."""
+    return pd.cut(pd.to_numeric(scores, errors="coerce"), SCORE_BAND_EDGES, right=False, labels=SCORE_BANDS)
+
+
+def _column(name, values):
+    if name in CATEGORY_COLUMNS:
+        return pd.Series(values, dtype="category")
+    if name in DATE_COLUMNS:
+        return pd.to_datetime(pd.Series(values, dtype=object), errors="coerce")
+    if name in DTYPES:
+        return pd.Series(values, dtype=DTYPES[name])
+    return pd.Series(values, dtype=TEXT_DTYPE)
+
+
+def load_reviews(file_path, columns=ANALYSIS_COLUMNS, with_topics=True):
+    """
+    Returns (DataFrame, TopicCodes or None) for one scraped JSON file.
+    `columns=None` keeps every review field (topic lists excepted, see TopicCodes).
+    The DataFrame also has hotel_id / hotel_name / hotel_town, score_band and review_index,
+    the row position in the JSON used to look up topic scores and codes.
+    """
+    values = {}
+    vocabulary = {}
+    codes = {side: [] for side in TOPIC_COLUMNS}
+    offsets = {side: [0] for side in TOPIC_COLUMNS}
+    n_seen = 0
+
+    def on_object(obj):
+        nonlocal n_seen
+        if "review_url" not in obj:
+            return obj
+        # A review: keep the projected fields, then drop the dict
+        names = columns if columns is not None else [k for k in obj if k not in TOPIC_COLUMNS]
+        for name in names:
+            if name not in values:
+                values[name] = [None] * n_seen
+            values[name].append(obj.get(name))
+        if with_topics:
+            for side in TOPIC_COLUMNS:
+                codes[side].extend(vocabulary.setdefault(t, len(vocabulary)) for t in obj.get(side) or ())
+                offsets[side].append(len(codes[side]))
+        n_seen += 1
+        return None
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f, object_hook=on_object)
+    n_reviews = len(data.get("scrap", {}).get("reviews", []))
+
+    names = list(columns) if columns is not None else list(values)
+    frame = {}
+    for name in names:
+        column = values.pop(name, None) or [None] * n_reviews
+        column.extend([None] * (n_reviews - len(column)))
+        frame[name] = _column(name, column)
+        del column
+    df = pd.DataFrame(frame, index=pd.RangeIndex(n_reviews))
+
+    for column, key in (("hotel_id", "id"), ("hotel_name", "name"), ("hotel_town", "town")):
+        value = data.get(key)
+        categories = [] if value is None else [value]
+        df[column] = pd.Categorical.from_codes(np.full(n_reviews, len(categories) - 1, dtype=np.int8), categories)
+    if "review_score" in df.columns:
+        df["score_band"] = score_band(df["review_score"])
+    # Row position in the JSON, used to look up the topic score matrices
+    df["review_index"] = np.arange(n_reviews, dtype=np.int32)
+
+    topic_codes = None
+    if with_topics:
+        code_dtype = np.int16 if len(vocabulary) < 2 ** 15 else np.int32
+        topic_codes = TopicCodes(
+            list(vocabulary),
+            {side: np.asarray(codes[side], dtype=code_dtype) for side in TOPIC_COLUMNS},
+            {side: np.asarray(offsets[side], dtype=np.int32) for side in TOPIC_COLUMNS},
+        )
+    return df, topic_codes
@@ -3,37 +3,153 @@ import streamlit as st
 import pandas as pd
 import os
 import glob
+import time
+import threading
 import json
-import plotly.express as px
-from io import BytesIO
-from zipfile import ZipFile
+import numpy as np
+import hashlib
+from io import TextIOWrapper
+from zipfile import ZipFile, ZIP_DEFLATED
+from chart_render import paginate, binned_histogram, time_series, PAGE_SIZE, MAX_GROUPS
+from review_frame import load_reviews
+import topic_cube
 
 # --- Helper Functions ---
 def load_json_files(folder_path="scrap_out"):
     return glob.glob(os.path.join(folder_path, "*.json"))
 
-def load_reviews_from_json(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    hotel_info = {
-        "hotel_id": data.get("id"),
-        "hotel_name": data.get("name"),
-        "hotel_town": data.get("town")
-    }
-    reviews = data.get("scrap", {}).get("reviews", [])
-    for r in reviews:
-        r.update(hotel_info)
-    df = pd.DataFrame(reviews)
-    return df
+def load_topic_scores(file_path):
+    """Load the `.topics.npz` sidecar written by predict.py (None if missing)."""
+    scores_path = os.path.splitext(file_path)[0] + ".topics.npz"
+    if not os.path.exists(scores_path):
+        return None
+    with np.load(scores_path) as data:
+        return {
+            "topics": data["topics"],
+            "positive": data["positive"],
+            "negative": data["negative"],
+        }
+
+# Cached per file version: reruns with unchanged files skip the JSON parsing.
+# Only the analysis columns and topic codes are kept (see review_frame.py).
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_reviews_cached(file_path, mtime):
+    return load_reviews(file_path)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_review_details_cached(file_path, mtime):
+    """Every review field, loaded only when the full table is requested."""
+    return load_reviews(file_path, columns=None, with_topics=False)[0]
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_topic_scores_cached(file_path, mtime):
+    return load_topic_scores(file_path)
+
+def file_version(file_path):
+    scores_path = os.path.splitext(file_path)[0] + ".topics.npz"
+    return os.path.getmtime(file_path), os.path.getmtime(scores_path) if os.path.exists(scores_path) else None
+
+def count_topics_above_threshold(topic_scores, review_index, threshold):
+    """
+    Vectorized count, per topic, of reviews whose score is above `threshold`.
+    Returns (positive_counts, negative_counts) as topic -> count Series.
+    """
+    # Scores are quantized to 0..255; match the `score > threshold` rule of predict.py
+    level = int(np.floor(threshold * 255))
+    rows = np.asarray(review_index, dtype=np.int64)
+    topics = topic_scores["topics"]
+    pos = (topic_scores["positive"][rows] > level).sum(axis=0)
+    neg = (topic_scores["negative"][rows] > level).sum(axis=0)
+    return pd.Series(pos, index=topics), pd.Series(neg, index=topics)
 
-def filter_reviews(df, guest_types, room_names):
-    if guest_types:
-        df = df[df["guest_type"].isin(guest_types)]
-    if room_names and "room_name" in df.columns:
-        df = df[df["room_name"].isin(room_names)]
+def filter_reviews(df, filters):
+    """filters: {facet: [values]} (see topic_cube.FACETS); empty selections are ignored."""
+    for facet, values in filters.items():
+        column = topic_cube.FACETS.get(facet, facet)
+        if values and column in df.columns:
+            df = df[df[column].isin(values)]
     return df
 
-def get_topic_counts_stacked(df, as_percentage=False, top_n=10):
+# Sidebar label of each facet, in cascade order
+FACET_LABELS = {
+    "guest_type": "Guest Type",
+    "room_name": "Room Name",
+    "language": "Language",
+    "country": "Country",
+    "score_band": "Review score",
+}
+
+# Seconds between two background refreshes of the topic cube
+CUBE_REFRESH_INTERVAL = 60
+
+@st.cache_resource
+def start_cube_refresher(folder="scrap_out", interval=CUBE_REFRESH_INTERVAL):
+    """
+    Re-aggregates new or changed files in a daemon thread with its own cube
+    connection, so no page render waits for a refresh. Started once per process;
+    returns its status (time of the last pass, hotels refreshed so far).
+    """
+    status = {"last_refresh": None, "refreshed": 0}
+
+    def run():
+        conn = topic_cube.connect()
+        while True:
+            try:
+                status["refreshed"] += topic_cube.refresh_cube(conn, folder)
+            except Exception as e:
+                print(f"⚠️ Topic cube refresh failed: {e}")
+            status["last_refresh"] = time.time()
+            time.sleep(interval)
+
+    threading.Thread(target=run, name="topic-cube-refresher", daemon=True).start()
+    return status
+
+@st.cache_resource
+def get_cube():
+    """The topic cube as it is now; new or changed files are picked up in the background."""
+    return topic_cube.connect()
+
+def get_served_cube():
+    cube = get_cube()
+    if start_cube_refresher()["last_refresh"] is None:
+        st.sidebar.caption("Topic cube is being refreshed in the background: counts may be incomplete.")
+    return cube
+
+def frame_facet_counts(df, facet, selected=None):
+    """topic_cube.facet_counts computed on one hotel's loaded reviews, without the cube."""
+    df = filter_reviews(df, {f: values for f, values in (selected or {}).items() if f != facet})
+    column = topic_cube.FACETS[facet]
+    if column not in df.columns:
+        return pd.DataFrame({"value": [], "reviews": []})
+    values = df[column].astype(object).fillna("").astype(str)
+    counts = values[values != ""].value_counts().rename_axis("value").reset_index(name="reviews")
+    return counts.sort_values(["reviews", "value"], ascending=[False, True], ignore_index=True)
+
+def facet_filters(facet_counts, facets=FACET_LABELS):
+    """
+    Sidebar multiselects with review counts; facet_counts(facet, selected) gives the
+    counts from the facet index or from a loaded hotel. Each facet is narrowed by
+    the choices made above it (a guest type narrows the room list).
+    Returns {facet: [selected values]}.
+    """
+    selected = {}
+    for facet in facets:
+        counts = facet_counts(facet, selected)
+        reviews = dict(zip(counts["value"], counts["reviews"]))
+        selected[facet] = st.sidebar.multiselect(
+            FACET_LABELS[facet], options=list(reviews),
+            format_func=lambda value, reviews=reviews: f"{value} ({reviews[value]})",
+        )
+    return selected
+
+def get_topic_counts_stacked(df, as_percentage=False, top_n=10, topic_scores=None, threshold=None, topic_codes=None):
+    if topic_scores is not None and threshold is not None and "review_index" in df.columns:
+        return get_topic_counts_from_scores(df, topic_scores, threshold, as_percentage, top_n)
+    if topic_codes is not None and "review_index" in df.columns:
+        pos = topic_codes.counts(df["review_index"], "positive_topics")
+        neg = topic_codes.counts(df["review_index"], "negative_topics")
+        return summarize_topic_counts(pos, neg, len(df), as_percentage, top_n)
+
     df_filtered = df.copy()
     total_reviews = max(len(df_filtered), 1) if as_percentage else 1
     
@@ -75,9 +191,36 @@ def get_topic_counts_stacked(df, as_percentage=False, top_n=10):
     
     return summary
 
+def get_topic_counts_from_scores(df, topic_scores, threshold, as_percentage=False, top_n=10):
+    """Same output as get_topic_counts_stacked, thresholding the stored scores at query time."""
+    pos, neg = count_topics_above_threshold(topic_scores, df["review_index"], threshold)
+    return summarize_topic_counts(pos, neg, len(df), as_percentage, top_n)
+
+def summarize_topic_counts(pos, neg, n_reviews, as_percentage=False, top_n=10):
+    """Stacked summary (topic, sentiment, count) from per-topic count Series."""
+    total_reviews = max(n_reviews, 1) if as_percentage else 1
+    summary = pd.concat([
+        pd.DataFrame({"topic": pos.index, "sentiment": "Positive", "count": pos.values / total_reviews}),
+        pd.DataFrame({"topic": neg.index, "sentiment": "Negative", "count": -neg.values / total_reviews}),
+    ], ignore_index=True)
+    summary = summary[summary["count"] != 0]
+    if summary.empty:
+        return pd.DataFrame(columns=["topic", "sentiment", "count"])
+
+    summary = summary.groupby(["topic", "sentiment"])["count"].sum().reset_index()
+    total_counts = summary.groupby("topic")["count"].apply(lambda x: x.abs().sum())
+    top_topics = total_counts.nlargest(top_n).index
+    summary = summary[summary["topic"].isin(top_topics)]
+
+    if as_percentage:
+        summary["count"] = summary["count"] * 100  # convert to %
+
+    return summary
+
 def generate_stacked_bar_chart(topic_summary):
     if topic_summary.empty:
         return None
+    import plotly.express as px  # loaded on first chart only
     fig = px.bar(
         topic_summary,
         x="topic",
@@ -89,42 +232,157 @@ def generate_stacked_bar_chart(topic_summary):
     fig.update_layout(barmode="relative")
     return fig
 
-def bulk_export_topic_csvs(filtered_topic_dfs, filenames):
-    buffer = BytesIO()
-    with ZipFile(buffer, "w") as zip_file:
-        for df, name in zip(filtered_topic_dfs, filenames):
-            csv_bytes = df.to_csv(index=False).encode("utf-8")
-            zip_file.writestr(f"{name}_topic_counts.csv", csv_bytes)
-    buffer.seek(0)
-    return buffer
+# Topic count ZIPs kept on disk: the most recent ones, and none older than this
+EXPORT_KEEP = 5
+EXPORT_MAX_AGE_DAYS = 7
+
+def rotate_exports(out_dir, keep=EXPORT_KEEP, max_age_days=EXPORT_MAX_AGE_DAYS):
+    """Removes the ZIPs beyond the `keep` most recently used, or unused for `max_age_days`."""
+    exports = sorted(glob.glob(os.path.join(out_dir, "topic_counts_*.zip")), key=os.path.getmtime)
+    oldest = time.time() - max_age_days * 86400
+    for i, path in enumerate(exports):
+        if i < len(exports) - keep or os.path.getmtime(path) < oldest:
+            os.remove(path)
+
+def bulk_export_topic_csvs(file_paths, filters, as_ratio, top_n, threshold,
+                           out_dir=os.path.join("scrap_out", "exports")):
+    """
+    Writes one topic counts CSV per hotel straight into a ZIP on disk, one hotel
+    at a time, and returns its path. The ZIP is reused while the input files and
+    the filters are unchanged; old ZIPs are rotated out (rotate_exports).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    key = hashlib.sha1(json.dumps([
+        [(p, os.path.getmtime(p)) for p in file_paths],
+        {facet: sorted(values) for facet, values in sorted(filters.items())}, as_ratio, top_n, threshold,
+    ]).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(out_dir, f"topic_counts_{key}.zip")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    tmp = path + ".tmp"
+    try:
+        with ZipFile(tmp, "w", compression=ZIP_DEFLATED) as zip_file:
+            for file_path in file_paths:
+                df, topic_codes = load_reviews(file_path)
+                df_filtered = filter_reviews(df, filters)
+                topic_summary = get_topic_counts_stacked(
+                    df_filtered, as_percentage=as_ratio, top_n=top_n,
+                    topic_scores=load_topic_scores(file_path), threshold=threshold, topic_codes=topic_codes
+                )
+                name = os.path.splitext(os.path.basename(file_path))[0]
+                with zip_file.open(f"{name}_topic_counts.csv", "w") as stream:
+                    text = TextIOWrapper(stream, encoding="utf-8", newline="")
+                    topic_summary.to_csv(text, index=False)
+                    text.flush()
+                    text.detach()
+    except BaseException:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    rotate_exports(out_dir)
+    return path
+
+def render_portfolio_comparison():
+    """Cross-hotel comparison, served from the pre-aggregated topic cube (topic_cube.py)."""
+    import plotly.express as px
+
+    cube = get_served_cube()
+
+    group_by = st.sidebar.selectbox("Compare by", list(topic_cube.GROUPABLE), index=1)
+    towns = st.sidebar.multiselect("Towns", topic_cube.dimension_values(cube, "town"))
+    hotel_names = [
+        row[0] for row in cube.execute(
+            "SELECT DISTINCT name FROM cube_hotels" +
+            (f" WHERE town IN ({', '.join(['?'] * len(towns))})" if towns else "") + " ORDER BY 1",
+            towns
+        )
+    ]
+    hotels = st.sidebar.multiselect("Hotels (drill-down)", hotel_names)
+    hotel_ids = topic_cube.hotel_ids(cube, towns, hotels) if towns or hotels else None
+    selected = facet_filters(lambda facet, chosen: topic_cube.facet_counts(cube, facet, chosen, hotel_ids),
+                             facets=["guest_type", "room_name"])
+    guest_types, room_names = selected["guest_type"], selected["room_name"]
+    months = [m for m in topic_cube.dimension_values(cube, "month") if m]
+    month_from, month_to = st.sidebar.select_slider(
+        "Months", options=months, value=(months[0], months[-1])
+    ) if len(months) > 1 else (None, None)
+    # Mean score needs the full scores: only hotels with a .topics.npz file have them
+    scored = topic_cube.scored_hotel_ids(cube)
+    metric = st.sidebar.radio("Metric", ["Mention rate (%)", "Mentions"] + (["Mean score"] if scored else []))
+    sentiment = st.sidebar.radio("Sentiment", ["positive", "negative"], horizontal=True)
+    top_n = st.sidebar.slider("Top N Topics", min_value=1, max_value=50, value=15, step=1)
+
+    if metric == "Mean score":
+        # Unscored hotels would add reviews to the mean but nothing to the score sum
+        hotel_ids = [h for h in scored if hotel_ids is None or h in hotel_ids] or [None]
+    summary = topic_cube.query_cube(
+        cube, group_by,
+        filters={"h.town": towns, "h.name": hotels, "h.hotel_id": hotel_ids if metric == "Mean score" else None,
+                 "c.guest_type": guest_types, "c.room_name": room_names},
+        month_from=month_from, month_to=month_to,
+    )
+    summary = summary[summary["sentiment"] == sentiment]
+    if summary.empty:
+        st.info("No topics found for the selected filters.")
+        return
+
+    summary["value"] = {
+        "Mention rate (%)": summary["mention_rate"] * 100,
+        "Mentions": summary["mentions"],
+        "Mean score": summary["score_sum"] / summary["reviews"],
+    }[metric]
+    top_topics = summary.groupby("topic")["mentions"].sum().nlargest(top_n).index
+    summary = summary[summary["topic"].isin(top_topics)]
+
+    st.subheader(f"Topic comparison by {group_by.lower()} ({sentiment})")
+    st.caption(
+        f"Mentions use the fixed topic score threshold of the cube ({topic_cube.SCORE_THRESHOLD}); "
+        "the threshold slider of the hotel analysis does not apply here."
+        + (" Mean score only covers hotels with a .topics.npz score file." if metric == "Mean score" else "")
+    )
+    # The chart only shows the largest groups; the table below is paginated
+    reviews = summary.groupby("group")["reviews"].first().sort_values(ascending=False)
+    chart_groups = reviews.index[:MAX_GROUPS]
+    if len(reviews) > MAX_GROUPS:
+        st.caption(f"Chart limited to the {MAX_GROUPS} largest groups out of {len(reviews)}.")
+    fig = px.bar(summary[summary["group"].isin(chart_groups)], x="topic", y="value", color="group",
+                 barmode="group", labels={"value": metric, "group": group_by})
+    st.plotly_chart(fig, use_container_width=True)
+
+    pivot = summary.pivot_table(index="group", columns="topic", values="value", aggfunc="sum")
+    pivot = pivot.assign(reviews=reviews).sort_values("reviews", ascending=False)
+    n_pages = max((len(pivot) - 1) // PAGE_SIZE + 1, 1)
+    page = st.number_input(f"Page (1-{n_pages})", min_value=1, max_value=n_pages, value=1)
+    st.dataframe(paginate(pivot, page)[0])
 
 # --- Streamlit App ---
 st.set_page_config(page_title="Hotel Review Analyzer - Top N Topics", layout="wide")
 st.title("🏨 Hotel Review Analyzer (Guest + Room Name Filter, Top N Topics)")
 
+# --- View selection ---
+view = st.sidebar.radio("View", ["Hotel analysis", "Portfolio comparison"])
+if view == "Portfolio comparison":
+    render_portfolio_comparison()
+    st.stop()
+
 # --- File Selection ---
 json_files = load_json_files("scrap_out")
 selected_file = st.sidebar.selectbox("Select JSON file (or 'All')", ["All"] + json_files)
 
 # --- Load selected JSON for dynamic filters ---
 if selected_file != "All":
-    df_selected = load_reviews_from_json(selected_file)
+    df_selected, topic_codes = load_reviews_cached(selected_file, file_version(selected_file))
 else:
-    df_selected = pd.DataFrame()
+    df_selected, topic_codes = pd.DataFrame(), None
 
-# --- Dynamic Filters ---
-if not df_selected.empty:
-    guest_types = st.sidebar.multiselect(
-        "Guest Type",
-        options=df_selected["guest_type"].dropna().unique(),
-    )
-    room_names = st.sidebar.multiselect(
-        "Room Name",
-        options=df_selected["room_name"].dropna().unique() if "room_name" in df_selected.columns else [],
-    )
+# --- Dynamic Filters (this hotel's loaded reviews, or the facet index of every hotel for 'All') ---
+if selected_file == "All":
+    cube = get_served_cube()
+    filters = facet_filters(lambda facet, chosen: topic_cube.facet_counts(cube, facet, chosen))
 else:
-    guest_types = st.sidebar.multiselect("Guest Type", options=[])
-    room_names = st.sidebar.multiselect("Room Name", options=[])
+    filters = facet_filters(lambda facet, chosen: frame_facet_counts(df_selected, facet, chosen))
 
 # Option to display/export as ratio
 as_ratio = st.sidebar.checkbox("Export/Display bar chart as % ratio", value=False)
@@ -132,33 +390,61 @@ as_ratio = st.sidebar.checkbox("Export/Display bar chart as % ratio", value=Fals
 # --- Slider for top N topics ---
 top_n = st.sidebar.slider("Top N Topics", min_value=1, max_value=50, value=25, step=1)
 
+# --- Topic score threshold (applied on stored scores, no re-prediction) ---
+threshold = st.sidebar.slider(
+    "Topic score threshold", min_value=0.05, max_value=0.99, value=0.8, step=0.01,
+    help="Only used for hotels with a .topics.npz score file; others keep the lists saved at 0.8."
+)
+
 # --- Processing ---
 if selected_file == "All":
-    filtered_topic_dfs = []
-    file_names = []
-    for file_path in json_files:
-        df = load_reviews_from_json(file_path)
-        df_filtered = filter_reviews(df, guest_types, room_names)
-        topic_summary = get_topic_counts_stacked(df_filtered, as_percentage=as_ratio, top_n=top_n)
-        filtered_topic_dfs.append(topic_summary)
-        file_names.append(os.path.splitext(os.path.basename(file_path))[0])
-    
     st.subheader("Bulk Export")
     st.write("Apply filters to all JSON files and download a ZIP of topic counts CSVs")
+    # Summaries are only computed on request, one hotel at a time
     if st.button("📥 Download ZIP of Topic Counts CSVs"):
-        zip_buffer = bulk_export_topic_csvs(filtered_topic_dfs, file_names)
-        st.download_button("Download ZIP", zip_buffer, "topic_counts.zip", mime="application/zip")
+        with st.spinner("Building ZIP..."):
+            zip_path = bulk_export_topic_csvs(json_files, filters, as_ratio, top_n, threshold)
+        with open(zip_path, "rb") as f:
+            st.download_button("Download ZIP", f, "topic_counts.zip", mime="application/zip")
 else:
-    filtered_df = filter_reviews(df_selected, guest_types, room_names)
+    filtered_df = filter_reviews(df_selected, filters)
     st.subheader(f"Filtered Reviews for Hotel: {df_selected['hotel_name'].iloc[0] if not df_selected.empty else 'N/A'}")
     st.write(f"Total reviews after filtering: {len(filtered_df)}")
     
-    # --- Display filtered reviews table ---
+    # --- Display filtered reviews table (one page at a time) ---
     with st.expander("Show Filtered Reviews Table"):
-        st.dataframe(filtered_df)
-    
+        col_size, col_page = st.columns(2)
+        page_size = col_size.selectbox("Rows per page", [50, 100, 250, 500], index=1)
+        n_pages = max((len(filtered_df) - 1) // page_size + 1, 1)
+        page = col_page.number_input(f"Page (1-{n_pages})", min_value=1, max_value=n_pages, value=1)
+        page_df, _ = paginate(filtered_df, page, page_size)
+        if st.checkbox("Show all columns (loads review texts)"):
+            details = load_review_details_cached(selected_file, file_version(selected_file))
+            page_df = details.iloc[page_df["review_index"]]
+        st.dataframe(page_df)
+
+    # --- Score distribution and trend (aggregated before plotting) ---
+    with st.expander("Show Review Scores"):
+        if filtered_df.empty or "review_score" not in filtered_df.columns:
+            st.info("No review scores for the selected filters.")
+        else:
+            import plotly.express as px
+            histogram = binned_histogram(filtered_df["review_score"], bins=18, value_range=(1, 10))
+            st.plotly_chart(px.bar(histogram, x="bin", y="count", title="Review score distribution"),
+                            use_container_width=True)
+            freq = st.radio("Trend period", ["D", "W", "M"], index=1, horizontal=True,
+                            format_func={"D": "Day", "W": "Week", "M": "Month"}.get)
+            trend = time_series(filtered_df, "reviewed_date", "review_score", freq=freq)
+            st.plotly_chart(px.line(trend, x="date", y="mean", hover_data=["reviews"],
+                                    title=f"Mean review score ({len(trend)} points)"),
+                            use_container_width=True)
+
     # --- Stacked bar chart ---
-    topic_summary = get_topic_counts_stacked(filtered_df, as_percentage=as_ratio, top_n=top_n)
+    topic_summary = get_topic_counts_stacked(
+        filtered_df, as_percentage=as_ratio, top_n=top_n,
+        topic_scores=load_topic_scores_cached(selected_file, file_version(selected_file)), threshold=threshold,
+        topic_codes=topic_codes
+    )
     fig = generate_stacked_bar_chart(topic_summary)
     if fig:
         st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,11 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "app")
+BASELINE_DB = os.path.join(APP_DIR, "db", "booking_reviews.db")
+
+# App modules are imported as from app/ (utils.*, sqlite.*), analyzer modules from the root
+for path in (APP_DIR, ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,60 @@
+import numpy as np
+
+from utils.ann_index import IVFIndex, make_key
+
+
+def unit_vectors(rng, n, dim=16):
+    v = rng.normal(size=(n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def build(tmp_path, n_segments=3, per_segment=500):
+    rng = np.random.default_rng(0)
+    index = IVFIndex(str(tmp_path / "ann"), dim=16)
+    vectors = {}
+    for s in range(n_segments):
+        ids = np.arange(s * per_segment, (s + 1) * per_segment)
+        v = unit_vectors(rng, per_segment)
+        index.add(make_key(ids, 0), v, ids % 5, np.full(per_segment, 20240101), last_review_id=ids[-1])
+        vectors.update(zip(make_key(ids, 0).tolist(), v))
+    return index, vectors, rng
+
+
+def all_keys(index, rng):
+    return [k for k, _ in index.search(unit_vectors(rng, 1)[0], k=10 ** 6, nprobe=10 ** 6)]
+
+
+def test_compaction_keeps_every_vector_sorted_by_list(tmp_path):
+    index, vectors, rng = build(tmp_path)
+    index.train(n_lists=8, sample_size=300)
+
+    assert len(index.segments) == 1
+    seg = index.segments[0]
+    offsets = seg["offsets"]
+    for c in range(8):
+        assert (seg["assign"][offsets[c]:offsets[c + 1]] == c).all()
+    keys = np.asarray(seg["keys"])
+    assert sorted(keys.tolist()) == sorted(vectors)
+    stored = np.asarray(seg["vectors"]).astype(np.float32) / 127
+    expected = np.stack([vectors[k] for k in keys.tolist()])
+    assert np.abs(stored - expected).max() < 0.01
+
+
+def test_replaced_and_removed_vectors_are_hidden_then_dropped(tmp_path):
+    index, vectors, rng = build(tmp_path)
+    replaced, removed = int(make_key(3, 0)), int(make_key(4, 0))
+    new_vector = unit_vectors(rng, 1)
+    index.add([replaced], new_vector, [3], [20240101], stale_keys=[replaced, removed])
+
+    keys = all_keys(index, rng)
+    assert keys.count(replaced) == 1 and removed not in keys
+    assert index.search(new_vector[0], k=1)[0][0] == replaced
+
+    index.train(n_lists=8, sample_size=300)
+    assert len(index.tombstones) == 0
+    keys = all_keys(index, rng)
+    assert keys.count(replaced) == 1 and removed not in keys
+    assert len(keys) == len(vectors) - 1
+
+    reopened = IVFIndex(str(tmp_path / "ann"), dim=16)
+    assert len(reopened) == len(vectors) - 1
@@ -0,0 +1,103 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import BASELINE_DB
+from sqlite import backup
+from sqlite.SQLiteSingleton import SQLiteSingleton
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = str(tmp_path / "booking_reviews.db")
+    shutil.copy(BASELINE_DB, path)
+    return path
+
+
+def count_reviews(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_snapshots_have_unique_names_and_are_rotated(db_file, tmp_path):
+    backup_dir = str(tmp_path / "backups")
+    paths = [backup.snapshot(db_file, backup_dir, keep=2, pause=0, force=True) for _ in range(3)]
+    assert len(set(paths)) == 3
+    assert all(p.endswith(".db.gz") for p in paths)
+    assert backup.list_snapshots(db_file, backup_dir) == paths[1:]
+    assert not os.path.exists(paths[0])
+
+
+def test_snapshot_is_skipped_while_the_database_is_unchanged(db_file, tmp_path):
+    backup_dir = str(tmp_path / "backups")
+    first = backup.snapshot(db_file, backup_dir, pause=0)
+    assert backup.snapshot(db_file, backup_dir, pause=0) == first
+    assert backup.list_snapshots(db_file, backup_dir) == [first]
+
+    conn = sqlite3.connect(db_file)
+    conn.execute("DELETE FROM reviews WHERE id = (SELECT MIN(id) FROM reviews)")
+    conn.commit()
+    conn.close()
+    second = backup.snapshot(db_file, backup_dir, pause=0)
+    assert second != first
+    assert backup.list_snapshots(db_file, backup_dir) == [first, second]
+
+
+def test_list_snapshots_keeps_second_resolution_names(db_file, tmp_path):
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    for name in ("booking_reviews-20250101-120000.db.gz", "booking_reviews-20250102-120000-000001.db",
+                 "booking_reviews-20250103-120000.db.tmp", "other-20250101-120000.db"):
+        (backup_dir / name).write_bytes(b"")
+    assert [os.path.basename(p) for p in backup.list_snapshots(db_file, str(backup_dir))] == [
+        "booking_reviews-20250101-120000.db.gz", "booking_reviews-20250102-120000-000001.db"]
+
+
+def test_restore_brings_back_the_snapshot(db_file, tmp_path):
+    reviews = count_reviews(db_file)
+    path = backup.snapshot(db_file, str(tmp_path / "backups"), pause=0)
+
+    conn = sqlite3.connect(db_file)
+    conn.execute("DELETE FROM reviews")
+    conn.commit()
+    conn.close()
+    assert count_reviews(db_file) == 0
+
+    backup.restore(path, db_file)
+    assert count_reviews(db_file) == reviews
+
+
+def test_restore_invalidates_the_dimension_cache(db_file, tmp_path):
+    db = SQLiteSingleton(db_file)
+    try:
+        hotel_id = db.conn.execute("SELECT id FROM hotels LIMIT 1").fetchone()[0]
+        path = backup.snapshot(db_file, str(tmp_path / "backups"), pause=0)
+        db.insert_or_update_reviews(hotel_id, [{"review_url": "u1", "guest_type": "Nouveau type"}])
+
+        # The snapshot predates "Nouveau type": its cached id no longer exists after the restore
+        backup.restore(path, db_file)
+        db.insert_or_update_reviews(hotel_id, [{"review_url": "u2", "guest_type": "Nouveau type"}])
+        row = db.conn.execute("SELECT guest_type FROM reviews_full WHERE review_url = 'u2'").fetchone()
+        assert row == ("Nouveau type",)
+    finally:
+        db.close()
+
+
+def test_restore_then_single_review_write_uses_fresh_dimension_ids(db_file, tmp_path):
+    db = SQLiteSingleton(db_file)
+    try:
+        hotel_id = db.conn.execute("SELECT id FROM hotels LIMIT 1").fetchone()[0]
+        path = backup.snapshot(db_file, str(tmp_path / "backups"), pause=0)
+        db.insert_or_update_review(hotel_id, "u1", guest_type="Nouveau type")
+
+        backup.restore(path, db_file)
+        db.insert_or_update_review(hotel_id, "u2", guest_type="Nouveau type")
+        row = db.conn.execute("SELECT guest_type FROM reviews_full WHERE review_url = 'u2'").fetchone()
+        assert row == ("Nouveau type",)
+    finally:
+        db.close()
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from chart_render import downsample_series, lttb
+
+
+def test_lttb_keeps_the_ends_and_returns_sorted_unique_indices():
+    rng = np.random.default_rng(0)
+    x = np.arange(10_000)
+    y = rng.normal(size=len(x)).cumsum()
+    keep = lttb(x, y, 500)
+    assert len(keep) == 500
+    assert keep[0] == 0 and keep[-1] == len(x) - 1
+    assert (np.diff(keep) > 0).all()
+
+
+def test_lttb_keeps_peaks_and_dips():
+    x = np.arange(5000)
+    y = np.zeros(len(x))
+    y[1234], y[3456] = 50.0, -40.0
+    keep = lttb(x, y, 100)
+    assert 1234 in keep and 3456 in keep
+
+
+def test_lttb_returns_every_point_when_nothing_to_reduce():
+    x = np.arange(10)
+    assert (lttb(x, x, 10) == x).all()
+    assert (lttb(x, x, 50) == x).all()
+    assert (lttb(x, x, 2) == x).all()
+
+
+def test_downsample_series_on_dates():
+    df = pd.DataFrame({"date": pd.date_range("2024-01-01", periods=3000, freq="h"),
+                       "mean": np.sin(np.arange(3000) / 50)})
+    out = downsample_series(df.sample(frac=1, random_state=0), "date", "mean", max_points=200)
+    assert len(out) == 200
+    assert out["date"].is_monotonic_increasing
+    assert out["date"].iloc[0] == df["date"].iloc[0] and out["date"].iloc[-1] == df["date"].iloc[-1]
+    assert downsample_series(df.head(100), "date", "mean", max_points=200).equals(df.head(100))
@@ -0,0 +1,61 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import BASELINE_DB
+from sqlite import migrations
+from sqlite.migrations import REVIEW_COLUMNS, latest_version, migrate, verify
+
+
+@pytest.fixture(params=[True, False], ids=["drop-column", "rebuild"])
+def baseline(request, tmp_path, monkeypatch):
+    """Copy of the committed database, migrated with DROP COLUMN or with the table rebuild."""
+    monkeypatch.setattr(migrations, "DROP_COLUMN_SUPPORTED", request.param)
+    path = tmp_path / "booking_reviews.db"
+    shutil.copy(BASELINE_DB, path)
+    conn = sqlite3.connect(path)
+    original = conn.execute(f"SELECT {', '.join(REVIEW_COLUMNS)} FROM reviews ORDER BY id").fetchall()
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'reviews'").fetchone()[0]
+    yield conn, original, sequence
+    conn.close()
+
+
+def objects(conn, kind):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,))}
+
+
+def test_migrations_apply_in_order_and_only_once(baseline):
+    conn, _, _ = baseline
+    assert migrate(conn, log=lambda message: None) == list(range(1, latest_version() + 1))
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == latest_version()
+    assert [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY 1")] == \
+        list(range(1, latest_version() + 1))
+    assert verify(conn) == []
+    assert migrate(conn, log=lambda message: None) == []
+
+
+def test_review_dimensions_keep_every_value(baseline):
+    conn, original, sequence = baseline
+    migrate(conn, log=lambda message: None)
+
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(reviews)")}
+    for column in list(migrations.REVIEW_DIMENSIONS) + ["guest_country", "guest_country_code"]:
+        assert column not in columns
+    assert {"language_id", "guest_country_id"} <= columns
+    assert conn.execute(f"SELECT {', '.join(REVIEW_COLUMNS)} FROM reviews_full ORDER BY id").fetchall() == original
+
+    assert {"idx_reviews_hotel_date", "idx_reviews_language"} <= objects(conn, "index")
+    assert {"reviews_text_changed", "reviews_text_changed_embedding"} <= objects(conn, "trigger")
+    assert conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'reviews'").fetchone()[0] >= sequence
+
+
+def test_triggers_follow_the_migrated_reviews_table(baseline):
+    conn, original, _ = baseline
+    migrate(conn, log=lambda message: None)
+    review_id = original[0][0]
+    conn.execute("INSERT INTO review_topics (review_id, side, text_hash, model_version) VALUES (?, 'positive', 'x', 'v1')",
+                 (review_id,))
+    conn.execute("UPDATE reviews SET positive_text = 'Texte modifié' WHERE id = ?", (review_id,))
+    assert conn.execute("SELECT COUNT(*) FROM review_topics WHERE review_id = ?", (review_id,)).fetchone()[0] == 0
+    assert conn.execute("SELECT review_id FROM embedding_queue").fetchall() == [(review_id,)]
@@ -0,0 +1,124 @@
+import random
+
+from utils.pagination import PageCollector, Slice, plan_slices, uncovered
+
+CAP = 1000
+PAGE = 100
+FIELDS = {"languages": "languageFilter", "scoreFilter": "reviewScoreFilter"}
+
+
+class CappedServer:
+    """
+    ReviewList stand-in: filters, facet counts under the current filters, two
+    opposite sorts, and no review past position `cap` of any listing.
+    """
+
+    def __init__(self, reviews, cap=CAP):
+        self.reviews = reviews
+        self.cap = cap
+        self.requests = 0
+
+    def query(self, skip=0, limit=PAGE, sorter=None, filters=None):
+        self.requests += 1
+        rows = [r for r in self.reviews if all(r[field] == value for field, value in (filters or {}).items())]
+        if sorter in ("NEWEST_FIRST", "OLDEST_FIRST"):
+            rows.sort(key=lambda r: r["date"], reverse=sorter == "NEWEST_FIRST")
+        data = {
+            "reviewsCount": len(rows),
+            "sorters": [{"value": "MOST_RELEVANT"}, {"value": "NEWEST_FIRST"}, {"value": "OLDEST_FIRST"}],
+            "reviewCard": [{"reviewUrl": r["url"]} for r in rows[skip:min(skip + limit, self.cap)]],
+        }
+        for field, facet in FIELDS.items():
+            counts = {}
+            for r in rows:
+                counts[r[field]] = counts.get(r[field], 0) + 1
+            data[facet] = [{"value": "", "count": len(rows)}] + [{"value": v, "count": c} for v, c in counts.items()]
+        return data
+
+
+def make_reviews(n, languages=("fr", "en"), scores=("1", "2", "3", "4")):
+    rng = random.Random(0)
+    return [{"url": f"r{i}", "date": rng.random(), "languages": languages[i % len(languages)],
+             "scoreFilter": rng.choice(scores)} for i in range(n)]
+
+
+def collect(server, slices, collector):
+    for s in slices:
+        for skip in s.offsets(PAGE):
+            collector.add((s.index, skip), server.query(skip, PAGE, s.sorter, s.filters)["reviewCard"])
+
+
+def test_small_hotel_is_one_slice():
+    server = CappedServer(make_reviews(800))
+    slices = plan_slices(server.query(), "MOST_RELEVANT", cap=CAP)
+    assert [(s.sorter, s.filters, s.stop) for s in slices] == [("MOST_RELEVANT", {}, 800)]
+
+
+def test_second_sort_stops_at_the_cap():
+    # 2500 reviews in one language, no other facet: only 2000 are reachable
+    server = CappedServer(make_reviews(2500, languages=("fr",), scores=("4",)))
+    slices = plan_slices(server.query(), "MOST_RELEVANT", cap=CAP)
+    assert [(s.sorter, s.stop) for s in slices] == [("NEWEST_FIRST", CAP), ("OLDEST_FIRST", CAP)]
+
+
+def test_reviews_beyond_both_sorts_are_reported():
+    server = CappedServer(make_reviews(2500, languages=("fr",), scores=("4",)))
+    slices = plan_slices(server.query(), "MOST_RELEVANT", cap=CAP, probe=lambda filters: server.query(filters=filters))
+    assert uncovered(slices) == 500
+
+    # Everything reachable is collected, and nothing is asked again for the rest
+    collector = PageCollector(PAGE)
+    collect(server, slices, collector)
+    reachable = 2500 - uncovered(slices)
+    assert len(collector.review_urls) == reachable
+    assert collector.is_complete(reachable)
+    assert collector.missing(slices, reachable) == []
+
+
+def test_large_hotel_is_split_on_a_second_facet_and_fully_collected():
+    # Two languages and two score groups of 3500 reviews: each language is split again on the score
+    server = CappedServer(make_reviews(7000, scores=("3", "4")))
+    first = server.query()
+    slices = plan_slices(first, "MOST_RELEVANT", cap=CAP, probe=lambda filters: server.query(filters=filters))
+    assert all(s.stop <= CAP for s in slices)
+    assert all(set(s.filters) == {"languages", "scoreFilter"} for s in slices)
+    assert uncovered(slices) == 0
+
+    collector = PageCollector(PAGE)
+    collect(server, slices, collector)
+    assert collector.is_complete(7000)
+    assert collector.missing(slices, 7000) == []
+
+
+def test_without_probe_an_oversized_slice_is_read_by_its_two_ends():
+    server = CappedServer(make_reviews(7000, scores=("4",)))
+    slices = plan_slices(server.query(), "MOST_RELEVANT", cap=CAP)
+    assert [(s.filters, s.stop) for s in slices] == [({"languages": "fr"}, CAP), ({"languages": "fr"}, CAP),
+                                                     ({"languages": "en"}, CAP), ({"languages": "en"}, CAP)]
+
+
+def test_missing_reports_failed_absent_and_short_pages():
+    server = CappedServer(make_reviews(350))
+    slices = [Slice(0, "MOST_RELEVANT", None, 350)]
+    collector = PageCollector(PAGE)
+    collector.add((0, 0), server.query(0)["reviewCard"])
+    collector.add((0, 100), server.query(100)["reviewCard"][:40])
+    collector.fail((0, 200))
+    assert collector.missing(slices, 350) == [(0, 100), (0, 200), (0, 300)]
+
+    collect(server, slices, collector)
+    assert collector.missing(slices, 350) == []
+
+
+def test_missing_refetches_pages_shifted_by_a_new_review():
+    reviews = make_reviews(300)
+    server = CappedServer(reviews)
+    slices = [Slice(0, "MOST_RELEVANT", None, 300)]
+    collector = PageCollector(PAGE)
+    collector.add((0, 0), server.query(0)["reviewCard"])
+    # A new review arrives at the top: page 100 repeats the last review of page 0
+    reviews.insert(0, {"url": "new", "date": 1.0, "languages": "fr", "scoreFilter": "4"})
+    collector.add((0, 100), server.query(100)["reviewCard"])
+    collector.add((0, 200), server.query(200)["reviewCard"])
+    assert not collector.is_complete(300)
+    assert collector.missing(slices, 300) == [(0, 100), (0, 200)]
@@ -0,0 +1,52 @@
+import glob
+import json
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from review_frame import load_reviews
+
+SCRAP_OUT = sorted(glob.glob(os.path.join(ROOT, "scrap_out", "*.json")))[:3]
+
+
+def expected_counts(reviews, rows, side):
+    return Counter(topic for i in rows for topic in reviews[i].get(side) or ())
+
+
+def nonzero(series):
+    return {topic: count for topic, count in series.items() if count}
+
+
+@pytest.mark.parametrize("path", SCRAP_OUT, ids=os.path.basename)
+def test_topic_codes_count_the_json_topic_lists(path):
+    with open(path, encoding="utf-8") as f:
+        reviews = json.load(f)["scrap"]["reviews"]
+    df, codes = load_reviews(path)
+    assert len(df) == len(reviews)
+    assert (df["review_index"].to_numpy() == np.arange(len(reviews))).all()
+
+    rng = np.random.default_rng(0)
+    subsets = [np.arange(len(reviews)), np.sort(rng.choice(len(reviews), len(reviews) // 3, replace=False)),
+               np.array([], dtype=np.int64)]
+    for rows in subsets:
+        for side in ("positive_topics", "negative_topics"):
+            assert nonzero(codes.counts(rows, side)) == expected_counts(reviews, rows, side)
+
+
+def test_topic_codes_handle_missing_and_empty_lists(tmp_path):
+    reviews = [
+        {"review_url": "a", "positive_topics": ["Staff", "Location"], "negative_topics": []},
+        {"review_url": "b", "review_score": 9.0},
+        {"review_url": "c", "positive_topics": ["Location"], "negative_topics": ["Noise"]},
+    ]
+    path = tmp_path / "hotel.json"
+    path.write_text(json.dumps({"id": 1, "name": "Hotel", "scrap": {"reviews": reviews}}), encoding="utf-8")
+    df, codes = load_reviews(str(path))
+
+    assert nonzero(codes.counts([0, 1, 2], "positive_topics")) == {"Staff": 1, "Location": 2}
+    assert nonzero(codes.counts([1, 2], "negative_topics")) == {"Noise": 1}
+    assert nonzero(codes.counts([1], "positive_topics")) == {}
+    assert df["score_band"].astype(object).tolist()[1] == "9-10"
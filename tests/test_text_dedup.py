@@ -0,0 +1,75 @@
+from utils.text_dedup import (
+    MAX_DISTANCE, InferenceDeduper, NearDuplicateIndex, canonicalize, hamming, simhash
+)
+
+TEXT = ("La chambre était propre et spacieuse, le personnel très accueillant et souriant, "
+        "le petit déjeuner copieux et varié, la literie confortable et le quartier calme")
+# One word more
+TWIN = TEXT.replace("calme", "très calme")
+
+
+class FakeDb:
+    """The two queries InferenceDeduper makes on review_topics."""
+
+    def __init__(self, cached=None, signatures=()):
+        self.cached = cached or {}
+        self.signatures = list(signatures)
+
+    def get_text_signatures(self, model_version):
+        return self.signatures
+
+    def get_cached_prediction(self, digest, model_version):
+        return self.cached.get((digest, model_version))
+
+
+def test_canonicalize_ignores_case_accents_and_punctuation():
+    assert canonicalize("Rien.") == canonicalize("RIEN !") == canonicalize("rien") == "rien"
+    assert canonicalize("  Très   bien, l'hôtel ") == "tres bien l hotel"
+
+
+def test_simhash_is_none_for_short_texts():
+    assert simhash(canonicalize("Rien à signaler")) is None
+    assert simhash(canonicalize("La chambre était propre et calme")) is not None
+
+
+def test_near_duplicates_are_close_and_different_texts_are_not():
+    base = simhash(canonicalize(TEXT))
+    typo = simhash(canonicalize(TWIN))
+    other = simhash(canonicalize("Le petit déjeuner était froid et le parking beaucoup trop cher"))
+    assert hamming(base, typo) <= MAX_DISTANCE
+    assert hamming(base, other) > MAX_DISTANCE
+
+    index = NearDuplicateIndex()
+    index.add(base, "base")
+    assert index.find(typo) == "base"
+    assert index.find(other) is None
+
+
+def test_simhash_fits_a_signed_sqlite_integer():
+    for i in range(50):
+        signature = simhash(canonicalize(f"{TEXT} numéro {i} avec vue sur la mer"))
+        assert -(1 << 63) <= signature < 1 << 63
+
+
+def test_deduper_reuses_batch_database_and_near_duplicate_predictions():
+    dedup = InferenceDeduper(FakeDb(), "v1")
+    digest, signature = dedup.key(TEXT)
+    assert dedup.lookup(digest, signature) is None
+    dedup.reserve(digest, signature)
+    dedup.remember(digest, b"\x01")
+
+    # Same canonical text in the batch
+    assert dedup.key(TEXT.upper() + " !") == (digest, signature)
+    assert dedup.lookup(digest, signature) == digest
+    # Near-duplicate: the representative's prediction is copied
+    twin_digest, twin_signature = dedup.key(TWIN)
+    assert twin_digest != digest
+    assert dedup.lookup(twin_digest, twin_signature) == digest
+    assert dedup.blob(digest) == b"\x01"
+
+    # Already predicted in the database, for this model version only
+    stored = InferenceDeduper(FakeDb(cached={(digest, "v1"): b"\x02"}, signatures=[(signature, digest)]), "v1")
+    assert stored.lookup(digest, signature) == digest
+    assert stored.blob(digest) == b"\x02"
+    assert stored.lookup(twin_digest, twin_signature) == digest
+    assert InferenceDeduper(FakeDb(cached={(digest, "v1"): b"\x02"}), "v2").lookup(digest, signature) is None
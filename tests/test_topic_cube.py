@@ -0,0 +1,38 @@
+import json
+
+import topic_cube
+
+
+def write_hotel(folder, name, hotel_id, reviews=3):
+    data = {"id": hotel_id, "name": name, "town": "Annecy", "scrap": {"reviews": [
+        {"review_url": f"{name}-{i}", "reviewed_date": "2025-01-0{}".format(i + 1), "guest_type": "Couple",
+         "room_name": "Double", "review_score": 8.0, "language": "fr", "guest_country": "France",
+         "positive_topics": ["Staff"], "negative_topics": []}
+        for i in range(reviews)
+    ]}}
+    (folder / f"{name}.json").write_text(json.dumps(data), encoding="utf-8")
+
+
+def test_refresh_is_incremental(tmp_path):
+    write_hotel(tmp_path, "a", 1)
+    write_hotel(tmp_path, "b", 2)
+    conn = topic_cube.connect(str(tmp_path / "cube.db"))
+    assert topic_cube.refresh_cube(conn, str(tmp_path)) == 2
+    assert topic_cube.scored_hotel_ids(conn) == []
+    assert topic_cube.refresh_cube(conn, str(tmp_path)) == 0
+
+
+def test_files_sharing_a_hotel_id_are_not_reaggregated_in_a_loop(tmp_path, capsys):
+    write_hotel(tmp_path, "a", 1, reviews=3)
+    write_hotel(tmp_path, "b", 1, reviews=5)
+    conn = topic_cube.connect(str(tmp_path / "cube.db"))
+    assert topic_cube.refresh_cube(conn, str(tmp_path)) == 1
+    assert topic_cube.refresh_cube(conn, str(tmp_path)) == 0
+    assert capsys.readouterr().out.count("already aggregated") == 1
+    assert conn.execute("SELECT source_file FROM cube_hotels").fetchall() == [(str(tmp_path / "a.json"),)]
+    assert conn.execute("SELECT SUM(reviews) FROM cube_reviews").fetchone()[0] == 3
+
+    # Once the first file is gone, the other one takes over
+    (tmp_path / "a.json").unlink()
+    assert topic_cube.refresh_cube(conn, str(tmp_path)) == 1
+    assert conn.execute("SELECT SUM(reviews) FROM cube_reviews").fetchone()[0] == 5
@@ -0,0 +1,340 @@
+"""
+Pre-aggregated topic cube over the analyzer's JSON files (scrap_out/).
+
+Facts are stored in SQLite, one row per
+(hotel, guest_type, room_name, month, topic, sentiment) with the number of
+mentions and the score sum, plus review totals per (hotel, guest_type,
+room_name, month) for ratios. Town and name live in the `cube_hotels`
+dimension, so roll-ups (town, portfolio) and drill-downs (hotel) are plain
+GROUP BY queries on the cube, never on raw reviews.
+
+The same refresh keeps a facet index (`cube_facets`): review counts per
+(hotel, guest_type, room_name, language, country, score band), so sidebar
+options and their counts, per hotel or global, cascaded on the choices already
+made, are one small GROUP BY.
+
+The refresh is incremental: a hotel is re-aggregated only when its JSON file
+or its `.topics.npz` sidecar changed since the last refresh.
+
+    python topic_cube.py [--folder scrap_out] [--cube scrap_out/topic_cube.db] [--full]
+"""
+import os
+import glob
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from review_frame import score_band
+
+CUBE_PATH = os.path.join("scrap_out", "topic_cube.db")
+# Same default as predict.py for the `*_topics` lists
+SCORE_THRESHOLD = 0.8
+CELL_DIMENSIONS = ["guest_type", "room_name", "month"]
+# Facet -> review field; cascaded in this order in the analyzer sidebar
+FACETS = {
+    "guest_type": "guest_type",
+    "room_name": "room_name",
+    "language": "language",
+    "country": "guest_country",
+    "score_band": "score_band",
+}
+GROUPABLE = {
+    "Portfolio": [],
+    "Town": ["h.town"],
+    "Hotel": ["h.town", "h.name"],
+    "Guest type": ["c.guest_type"],
+    "Room name": ["c.room_name"],
+    "Month": ["c.month"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cube_hotels (
+    hotel_id INTEGER PRIMARY KEY,
+    name TEXT,
+    town TEXT,
+    source_file TEXT UNIQUE,
+    source_mtime REAL,
+    scores_mtime REAL,
+    refreshed_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS cube_reviews (
+    hotel_id INTEGER NOT NULL,
+    guest_type TEXT NOT NULL,
+    room_name TEXT NOT NULL,
+    month TEXT NOT NULL,
+    reviews INTEGER NOT NULL,
+    review_score_sum REAL
+);
+CREATE TABLE IF NOT EXISTS cube_topics (
+    hotel_id INTEGER NOT NULL,
+    guest_type TEXT NOT NULL,
+    room_name TEXT NOT NULL,
+    month TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    sentiment TEXT NOT NULL,
+    mentions INTEGER NOT NULL,
+    score_sum REAL
+);
+CREATE TABLE IF NOT EXISTS cube_facets (
+    hotel_id INTEGER NOT NULL,
+    guest_type TEXT NOT NULL,
+    room_name TEXT NOT NULL,
+    language TEXT NOT NULL,
+    country TEXT NOT NULL,
+    score_band TEXT NOT NULL,
+    reviews INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cube_facets_hotel ON cube_facets(hotel_id);
+CREATE INDEX IF NOT EXISTS idx_cube_reviews_hotel ON cube_reviews(hotel_id);
+CREATE INDEX IF NOT EXISTS idx_cube_topics_hotel ON cube_topics(hotel_id, topic);
+CREATE INDEX IF NOT EXISTS idx_cube_topics_topic ON cube_topics(topic, sentiment);
+"""
+
+
+def connect(path=CUBE_PATH):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    # WAL: the analyzer keeps reading while the background refresh writes
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def _scores_path(file_path):
+    return os.path.splitext(file_path)[0] + ".topics.npz"
+
+
+def aggregate_file(file_path):
+    """Returns (hotel, reviews_cells, topic_cells, facet_cells) for one JSON file."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    hotel = {"hotel_id": data.get("id"), "name": data.get("name"), "town": data.get("town")}
+    reviews = data.get("scrap", {}).get("reviews", [])
+    df = pd.DataFrame(reviews, columns=["reviewed_date", "guest_type", "room_name", "review_score",
+                                        "language", "guest_country", "positive_topics", "negative_topics"])
+    df["month"] = df["reviewed_date"].fillna("").astype(str).str[:7]
+    df["guest_type"] = df["guest_type"].fillna("")
+    df["room_name"] = df["room_name"].fillna("")
+
+    facets = pd.DataFrame({
+        facet: (score_band(df["review_score"]) if facet == "score_band" else df[column]).astype(object).fillna("")
+        for facet, column in FACETS.items()
+    })
+    facet_cells = facets.groupby(list(FACETS)).size().rename("reviews").reset_index()
+
+    reviews_cells = (
+        df.groupby(CELL_DIMENSIONS)
+        .agg(reviews=("month", "size"), review_score_sum=("review_score", "sum"))
+        .reset_index()
+    )
+
+    scores_path = _scores_path(file_path)
+    parts = []
+    if os.path.exists(scores_path):
+        # Full scores: mentions at the default threshold, plus score sums
+        with np.load(scores_path) as scores:
+            topics = scores["topics"]
+            level = int(np.floor(SCORE_THRESHOLD * 255))
+            for sentiment in ("positive", "negative"):
+                matrix = scores[sentiment][:len(df)]
+                mentions = pd.DataFrame(matrix > level, columns=topics).groupby([df[d] for d in CELL_DIMENSIONS]).sum()
+                sums = pd.DataFrame(matrix / 255.0, columns=topics).groupby([df[d] for d in CELL_DIMENSIONS]).sum()
+                cells = pd.concat(
+                    [mentions.stack().rename("mentions"), sums.stack().rename("score_sum")], axis=1
+                ).reset_index()
+                cells.columns = CELL_DIMENSIONS + ["topic", "mentions", "score_sum"]
+                cells["sentiment"] = sentiment
+                parts.append(cells[cells["mentions"] > 0])
+    else:
+        # Only the thresholded lists are available
+        for sentiment in ("positive", "negative"):
+            exploded = df[CELL_DIMENSIONS + [f"{sentiment}_topics"]].explode(f"{sentiment}_topics").dropna()
+            exploded = exploded.rename(columns={f"{sentiment}_topics": "topic"})
+            cells = exploded.groupby(CELL_DIMENSIONS + ["topic"]).size().rename("mentions").reset_index()
+            cells["score_sum"] = None
+            cells["sentiment"] = sentiment
+            parts.append(cells)
+
+    topic_cells = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    return hotel, reviews_cells, topic_cells, facet_cells
+
+
+def _delete_hotel(conn, hotel_id):
+    for table in ("cube_topics", "cube_reviews", "cube_facets", "cube_hotels"):
+        conn.execute(f"DELETE FROM {table} WHERE hotel_id = ?", (hotel_id,))
+
+
+# File -> (source_mtime, scores_mtime, owner file) of files skipped because another file holds their hotel_id
+_collisions = {}
+
+def refresh_cube(conn, folder="scrap_out", full=False, progress=None):
+    """
+    Re-aggregates new or changed files and drops removed ones. Returns the number of hotels refreshed.
+    A hotel is aggregated from one file only: another file with the same hotel_id is
+    skipped with a single warning, and only re-read when it changes or the other file goes away.
+    """
+    files = sorted(glob.glob(os.path.join(folder, "*.json")))
+    known = {row[0]: row[1:] for row in conn.execute(
+        "SELECT source_file, hotel_id, source_mtime, scores_mtime FROM cube_hotels"
+    )}
+
+    # Cube built before the facet index: aggregate every hotel once more
+    if known and conn.execute("SELECT 1 FROM cube_facets LIMIT 1").fetchone() is None:
+        full = True
+
+    for source_file in set(known) - set(files):
+        _delete_hotel(conn, known[source_file][0])
+
+    refreshed = 0
+    for i, file_path in enumerate(files):
+        source_mtime, scores_mtime = _mtime(file_path), _mtime(_scores_path(file_path))
+        if not full and (source_mtime, scores_mtime) == known.get(file_path, (None,))[1:]:
+            continue
+        collision = _collisions.get(file_path)
+        if collision and collision[:2] == (source_mtime, scores_mtime) and collision[2] in files:
+            continue
+        try:
+            hotel, reviews_cells, topic_cells, facet_cells = aggregate_file(file_path)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"⚠️ Skipping {file_path}: {e}")
+            continue
+
+        owner = conn.execute("SELECT source_file FROM cube_hotels WHERE hotel_id = ?", (hotel["hotel_id"],)).fetchone()
+        if owner and owner[0] != file_path and owner[0] in files:
+            if file_path not in _collisions:
+                print(f"⚠️ Skipping {file_path}: hotel {hotel['hotel_id']} is already aggregated from {owner[0]}")
+            _collisions[file_path] = (source_mtime, scores_mtime, owner[0])
+            continue
+        _collisions.pop(file_path, None)
+
+        if file_path in known:
+            _delete_hotel(conn, known[file_path][0])
+        _delete_hotel(conn, hotel["hotel_id"])
+        conn.execute(
+            "INSERT INTO cube_hotels (hotel_id, name, town, source_file, source_mtime, scores_mtime) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (hotel["hotel_id"], hotel["name"], hotel["town"], file_path, source_mtime, scores_mtime)
+        )
+        reviews_cells.insert(0, "hotel_id", hotel["hotel_id"])
+        reviews_cells.to_sql("cube_reviews", conn, if_exists="append", index=False)
+        facet_cells.insert(0, "hotel_id", hotel["hotel_id"])
+        facet_cells.to_sql("cube_facets", conn, if_exists="append", index=False)
+        if not topic_cells.empty:
+            topic_cells.insert(0, "hotel_id", hotel["hotel_id"])
+            topic_cells.to_sql("cube_topics", conn, if_exists="append", index=False)
+        conn.commit()
+        refreshed += 1
+        if progress:
+            progress(i + 1, len(files))
+
+    conn.commit()
+    return refreshed
+
+
+def _where(filters):
+    """filters: {column: [values]} on cube_hotels (h.) or cell dimensions (c.)."""
+    clauses, params = [], []
+    for column, values in (filters or {}).items():
+        if values:
+            clauses.append(f"{column} IN ({', '.join(['?'] * len(values))})")
+            params += list(values)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def query_cube(conn, group_by="Town", filters=None, month_from=None, month_to=None):
+    """
+    Roll-up of the cube along `group_by` (a key of GROUPABLE).
+    Returns one row per (group, topic, sentiment) with mentions, score_sum,
+    reviews (total of the group) and mention_rate = mentions / reviews.
+    """
+    filters = dict(filters or {})
+    where, params = _where(filters)
+    if month_from:
+        where += (" AND " if where else " WHERE ") + "c.month >= ?"
+        params.append(month_from)
+    if month_to:
+        where += (" AND " if where else " WHERE ") + "c.month <= ?"
+        params.append(month_to)
+
+    columns = GROUPABLE[group_by]
+    select = "".join(f"{c} AS g{i}, " for i, c in enumerate(columns))
+    group = "".join(f"g{i}, " for i in range(len(columns)))
+    join = "FROM {table} c JOIN cube_hotels h ON h.hotel_id = c.hotel_id"
+
+    topics = pd.read_sql_query(
+        f"SELECT {select}c.topic, c.sentiment, SUM(c.mentions) AS mentions, SUM(c.score_sum) AS score_sum "
+        f"{join.format(table='cube_topics')}{where} GROUP BY {group}c.topic, c.sentiment",
+        conn, params=params
+    )
+    totals = pd.read_sql_query(
+        f"SELECT {select}SUM(c.reviews) AS reviews, SUM(c.review_score_sum) AS review_score_sum "
+        f"{join.format(table='cube_reviews')}{where}" + (f" GROUP BY {group.rstrip(', ')}" if columns else ""),
+        conn, params=params
+    )
+
+    keys = [f"g{i}" for i in range(len(columns))]
+    result = topics.merge(totals, on=keys, how="left") if keys else topics.assign(**totals.iloc[0].to_dict())
+    result["group"] = result[keys].astype(str).agg(" - ".join, axis=1) if keys else "Portfolio"
+    result["mention_rate"] = result["mentions"] / result["reviews"].where(result["reviews"] > 0)
+    return result.drop(columns=keys)
+
+
+def facet_counts(conn, facet, selected=None, hotel_ids=None):
+    """
+    Distinct values of `facet` with their review counts, most frequent first.
+    `selected` ({facet: [values]}) narrows the counts to the choices already made
+    (cascaded faceting); `hotel_ids` restricts to some hotels (None = global).
+    Empty values (field missing in the reviews) are left out.
+    """
+    filters = {f: values for f, values in (selected or {}).items() if f != facet}
+    if hotel_ids is not None:
+        filters["hotel_id"] = list(hotel_ids) or [None]
+    where, params = _where(filters)
+    where += (" AND " if where else " WHERE ") + f"{facet} != ''"
+    return pd.read_sql_query(
+        f"SELECT {facet} AS value, SUM(reviews) AS reviews FROM cube_facets{where} "
+        "GROUP BY value ORDER BY reviews DESC, value",
+        conn, params=params
+    )
+
+
+def hotel_ids(conn, towns=None, names=None):
+    """Hotels of the cube in these towns / with these names (empty = no constraint)."""
+    where, params = _where({"town": towns, "name": names})
+    return [row[0] for row in conn.execute(f"SELECT hotel_id FROM cube_hotels{where}", params)]
+
+
+def scored_hotel_ids(conn):
+    """Hotels aggregated from a `.topics.npz` score file (the only ones with a score_sum)."""
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT hotel_id FROM cube_topics WHERE score_sum IS NOT NULL ORDER BY 1"
+    )]
+
+
+def hotel_id_of(conn, file_path):
+    row = conn.execute("SELECT hotel_id FROM cube_hotels WHERE source_file = ?", (file_path,)).fetchone()
+    return row[0] if row else None
+
+
+def dimension_values(conn, column):
+    """Distinct values of a cube dimension, for the comparison view filters."""
+    table = "cube_hotels" if column in ("town", "name") else "cube_reviews"
+    return [row[0] for row in conn.execute(f"SELECT DISTINCT {column} FROM {table} ORDER BY 1")]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh the pre-aggregated topic cube.")
+    parser.add_argument("--folder", default="scrap_out")
+    parser.add_argument("--cube", default=CUBE_PATH)
+    parser.add_argument("--full", action="store_true", help="re-aggregate every file")
+    args = parser.parse_args()
+
+    conn = connect(args.cube)
+    n = refresh_cube(conn, args.folder, full=args.full)
+    print(f"✅ {n} hotels refreshed in {args.cube}.")
@@ -1,45 +1,73 @@
+import copy
 import json
+import os
+import sys
 import requests
 import datetime
 import time
 import random
 from tqdm import tqdm
-import pandas as pd
 import re
+from functools import lru_cache
+import argparse
+from multiprocessing import Pool
+
+# The rate limiter is shared with the app (app/utils)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+from utils.rate_limiter import RateLimiter
 
 def wait():
     time.sleep(random.uniform(1, 3))
 
 
+# GraphQL requests per second, over all worker processes
+MAX_RPS = 0.5
+
+# Pace of the review pages of this process (see init_rate_limiter)
+_limiter = None
+
+def init_rate_limiter(rate):
+    """Each process gets its share of the global rate: max_rps / workers."""
+    global _limiter
+    _limiter = RateLimiter(rate)
+
+def throttle():
+    if _limiter is None:
+        init_rate_limiter(MAX_RPS)
+    _limiter.wait()
+
+
 GRAPHQL_ENDPOINT = "https://www.booking.com/dml/graphql?lang=fr"
 
 MAX_LIMIT = 25
 
-with open('payload.json', 'r', encoding='utf-8') as file:
-    payload = json.load(file)
+@lru_cache(maxsize=None)
+def load_json(filename):
+    """Read payload.json / header.json on first use instead of at import time."""
+    with open(filename, 'r', encoding='utf-8') as file:
+        return json.load(file)
 
-with open('header.json', 'r', encoding='utf-8') as file:
-    GRAPHQL_HEADER = json.load(file)
+def firefox_options():
+    from selenium.webdriver.firefox.options import Options
 
-from selenium import webdriver
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.firefox.options import Options
-from webdriver_manager.firefox import GeckoDriverManager
-
-options = Options()
-options.set_preference("dom.webdriver.enabled", False)  # Try to hide Selenium
-options.set_preference("useAutomationExtension", False)
-options.set_preference("general.useragent.override", 
-                       "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                       "(KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36")  # Fake user-agent
-options.add_argument("--headless")  # VERY IMPORTANT on Pi without GUI
+    options = Options()
+    options.set_preference("dom.webdriver.enabled", False)  # Try to hide Selenium
+    options.set_preference("useAutomationExtension", False)
+    options.set_preference("general.useragent.override", 
+                           "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                           "(KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36")  # Fake user-agent
+    options.add_argument("--headless")  # VERY IMPORTANT on Pi without GUI
+    return options
 
 
 def get_hotel_id(url, timeout=10):
-    driver = webdriver.Firefox(service=Service("driver/geckodriver"), options=options)
+    from selenium import webdriver
+    from selenium.webdriver.firefox.service import Service
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    driver = webdriver.Firefox(service=Service("driver/geckodriver"), options=firefox_options())
 
     # Open the page
     driver.get(url)
@@ -66,7 +94,7 @@ def get_hotel_id(url, timeout=10):
     return hotel_id
 
 def post_graphql(payload):
-    response = requests.post(GRAPHQL_ENDPOINT, headers=GRAPHQL_HEADER, json=payload)
+    response = requests.post(GRAPHQL_ENDPOINT, headers=load_json('header.json'), json=payload)
     return response.json()
 
 def extract_review_info(card):
@@ -107,51 +135,64 @@ def extract_review_info(card):
     
     return info
 
-def scrap(hotel_id):
+def page_payload(hotel_id, skip):
+    """Deep copy of payload.json: the cached template is never mutated."""
+    payload = copy.deepcopy(load_json('payload.json'))
+    payload['variables']['input']['hotelId'] = hotel_id
+    payload['variables']['input']['skip'] = skip
+    payload['variables']['input']['limit'] = MAX_LIMIT
+    return payload
+
+def scrap(hotel_id, max_rounds=3):
+    """
+    Offsets are planned from reviewsCount after the first call; pages are keyed
+    by skip and reviews deduplicated on review_url, then short or missing pages
+    are fetched again until the count matches (at most `max_rounds` extra passes).
+    """
     D = {'meta': {}, 'reviews': []}
-    payload_hotel = payload.copy()
-    payload_hotel['variables']['input']['hotelId'] = hotel_id
 
     # First call
-    response = post_graphql(payload_hotel)
+    response = post_graphql(page_payload(hotel_id, 0))
     scores = response['data']['reviewListFrontend']['ratingScores']
     for s in scores:
         D['meta'][s['name']] = s['value']
-    
-    cards = response['data']['reviewListFrontend']['reviewCard']
 
-    for card in cards:
-        D['reviews'].append(extract_review_info(card))
-
-    
+    pages = {0: response['data']['reviewListFrontend']['reviewCard']}
     review_count = response['data']['reviewListFrontend']['reviewsCount']
+    offsets = list(range(MAX_LIMIT, review_count, MAX_LIMIT))
 
-    skip = MAX_LIMIT
-# Create a tqdm progress bar
     with tqdm(total=review_count) as pbar:
-        pbar.update(len(cards))
-        while skip < review_count:
-            # Optional wait to avoid rate limits
-            wait()
-
-            # Determine the end index for this batch
-            end = min(skip + MAX_LIMIT, review_count)
-
-            # Update payload for this batch
-            payload_hotel['variables']['input']['skip'] = skip
-            response = post_graphql(payload_hotel)
-            cards = response['data']['reviewListFrontend']['reviewCard']
-
-            # Process reviews
-            for card in cards: # Skip first dupicated
-                D['reviews'].append(extract_review_info(card))
-
-            # Update the progress bar
-            pbar.update(len(cards))
-
-            # Update skip for the next batch
-            skip = end
-
+        pbar.update(len(pages[0]))
+        for _ in range(max_rounds + 1):
+            for skip in offsets:
+                # Shared rate limit: max_rps over all workers
+                throttle()
+                try:
+                    cards = post_graphql(page_payload(hotel_id, skip))['data']['reviewListFrontend']['reviewCard']
+                except Exception as e:
+                    print(f"Page skip={skip} failed: {e}")
+                    continue
+                pbar.update(len(cards) - len(pages.get(skip, [])))
+                pages[skip] = cards
+
+            # Missing or short pages are fetched again
+            offsets = [skip for skip in range(0, review_count, MAX_LIMIT)
+                       if len(pages.get(skip, [])) < min(MAX_LIMIT, review_count - skip)]
+            if not offsets:
+                break
+
+    # Keep the first occurrence of every review (offsets may shift while scraping)
+    seen = set()
+    for skip in sorted(pages):
+        for card in pages[skip]:
+            url = card.get('reviewUrl')
+            if url and url in seen:
+                continue
+            seen.add(url)
+            D['reviews'].append(extract_review_info(card))
+
+    if len(D['reviews']) < review_count:
+        print(f"Hotel {hotel_id}: {len(D['reviews'])}/{review_count} reviews collected")
     return D
 
 def save_to_file(D, filename="reviews.json"):
@@ -164,6 +205,7 @@ def read_hotels_csv(filename="hotels_with_urls.csv"):
     """
     Read the CSV file containing hotel info and URLs.
     """
+    import pandas as pd
     try:
         df = pd.read_csv(filename, encoding="utf-8")
         print(f"Loaded {len(df)} hotels from '{filename}'")
@@ -180,35 +222,59 @@ def sanitize_filename(s):
     s = s.replace(" ", "_").lower()
     return s
 
-def main():
+def scrap_hotel_row(row):
+    """
+    Scrape one hotel (id, name, town, url) and return (filename, D), or None.
+    Top-level so it can run in a worker process.
+    """
+    id_, name, town, url = row
+    D = {
+        'id': id_,
+        'name': name,
+        'town': town,
+        'url': url,
+        'booking_id': -1,
+        'scrap': {}
+    }
+
+    # Scrape the reviews
+    try:
+        hotel_id = get_hotel_id(url)
+        if not hotel_id: return None
+        D['booking_id'] = hotel_id
+        D_reviews = scrap(hotel_id)
+        D['scrap'] = D_reviews
+
+        # Create filename based on id, name, town
+        filename = f"{id_}_{sanitize_filename(name)}_{sanitize_filename(town)}.json"
+        return filename, D
+    except Exception as e:
+        print(e)
+        return None
+
+def main(workers=1, max_rps=MAX_RPS):
     df = read_hotels_csv()
     tuples_list = list(df[["id", "name", "town", "url"]].itertuples(index=False, name=None))
 
-
-    for id_, name, town, url in tqdm(tuples_list):
-        D = {
-            'id': id_,
-            'name': name,
-            'town': town,
-            'url': url,
-            'booking_id': -1,
-            'scrap': {}
-        }
-
-        # Scrape the reviews
-        try:
-            hotel_id = get_hotel_id(url)
-            if not hotel_id: continue
-            D['booking_id'] = hotel_id
-            D_reviews = scrap(hotel_id)
-            D['scrap'] = D_reviews
-
-            # Create filename based on id, name, town
-            filename = f"{id_}_{sanitize_filename(name)}_{sanitize_filename(town)}.json"
-
-            save_to_file(D, 'scrap/'+filename)
-        except Exception as e:
-            print(e)
+    if workers <= 1:
+        init_rate_limiter(max_rps)
+        results = map(scrap_hotel_row, tuples_list)
+        for result in tqdm(results, total=len(tuples_list)):
+            if result:
+                save_to_file(result[1], 'scrap/' + result[0])
+        return
+
+    # Hotels are sharded across worker processes, each with max_rps / workers;
+    # only this process writes files
+    with Pool(processes=workers, initializer=init_rate_limiter, initargs=(max_rps / workers,)) as pool:
+        results = pool.imap_unordered(scrap_hotel_row, tuples_list)
+        for result in tqdm(results, total=len(tuples_list)):
+            if result:
+                save_to_file(result[1], 'scrap/' + result[0])
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape Booking.com reviews for every hotel of the CSV.")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--max-rps", type=float, default=MAX_RPS, help="GraphQL requests per second, all workers")
+    args = parser.parse_args()
+    main(workers=args.workers, max_rps=args.max_rps)
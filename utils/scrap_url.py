@@ -9,26 +9,33 @@ def wait():
 
 ENDPOINT = "https://www.booking.com/searchresults.fr.html?ss="
 
-from selenium import webdriver
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.firefox.options import Options
-from webdriver_manager.firefox import GeckoDriverManager
-
-options = Options()
-options.set_preference("dom.webdriver.enabled", False)  # Try to hide Selenium
-options.set_preference("useAutomationExtension", False)
-options.set_preference("general.useragent.override", 
-                       "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                       "(KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36")  # Fake user-agent
-
-
-driver = webdriver.Firefox(service=Service(GeckoDriverManager().install()), options=options)
+_driver = None
+
+def get_driver():
+    """Start Firefox on first use only (importing this module stays cheap)."""
+    global _driver
+    if _driver is None:
+        from selenium import webdriver
+        from selenium.webdriver.firefox.service import Service
+        from selenium.webdriver.firefox.options import Options
+        from webdriver_manager.firefox import GeckoDriverManager
+
+        options = Options()
+        options.set_preference("dom.webdriver.enabled", False)  # Try to hide Selenium
+        options.set_preference("useAutomationExtension", False)
+        options.set_preference("general.useragent.override", 
+                               "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                               "(KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36")  # Fake user-agent
+        _driver = webdriver.Firefox(service=Service(GeckoDriverManager().install()), options=options)
+    return _driver
 
 
 def get_hotel_url(hotel, town):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    driver = get_driver()
     query = build_query(hotel, town)
     driver.get(query)
 
@@ -89,7 +96,7 @@ def main():
             "url": url
         })
 
-    driver.quit()
+    get_driver().quit()
     # Save results to CSV
     results_df = pd.DataFrame(results)
     results_df.to_csv("hotels_with_urls.csv", index=False, encoding="utf-8")